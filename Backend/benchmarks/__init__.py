@@ -0,0 +1,8 @@
+"""
+离线性能基准测试
+在Backend目录下运行: python -m benchmarks.<模块名>
+
+- bench_price_normalizer: 价格解析/过滤
+- bench_ai_pipeline: AI增强搜索链路（夹具 + 上游替身 + 本地假网关，结果与JSON基线对比）
+- record_fixtures: 从真实数据源录制夹具（需要网络）
+"""
@@ -0,0 +1,249 @@
+"""
+AI增强搜索链路基准测试（离线）
+使用夹具数据、上游替身和本地假网关，测量：
+- _optimize_kiwi_flight_data / _convert_flight_to_dict / _clean_data_for_ai
+- create_final_analysis_prompt（json、compact两种格式）
+- Trip.com响应清洗（_clean_trip_flight_data）
+- search_flights_ai_enhanced 完整编排（缓存未命中）
+结果写入JSON，并与基线对比（中位数变慢超过阈值视为回归）
+
+运行:
+    python -m benchmarks.bench_ai_pipeline                      # 运行并与基线对比
+    python -m benchmarks.bench_ai_pipeline --update-baseline    # 运行并更新基线
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List
+from loguru import logger
+
+from benchmarks.fixtures import load_fixture
+from benchmarks.stubs import FakeAIGateway, StubProviders
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCH_DIR, 'results', 'ai_pipeline.json')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baselines', 'ai_pipeline.json')
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """耗时样本（秒）→ 统计结果（毫秒）"""
+    ordered = sorted(samples)
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        'runs': len(ordered),
+        'min_ms': round(ordered[0] * 1000, 3),
+        'median_ms': round(statistics.median(ordered) * 1000, 3),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p95_ms': round(ordered[p95_index] * 1000, 3)
+    }
+
+
+def measure(func: Callable[[], Any], iterations: int, warmup: int = 1) -> Dict[str, Any]:
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(iterations):
+        started_at = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started_at)
+    return summarize(samples)
+
+
+def run_micro_benchmarks(service, fixtures: Dict[str, Any], iterations: int) -> Dict[str, Dict[str, Any]]:
+    from fastapi_app.prompts.flight_processor_prompts_v2 import create_final_analysis_prompt
+    from fastapi_app.services.flight_service import get_monitor_flight_service
+
+    google_flights = fixtures['google']
+    kiwi_raw = fixtures['kiwi']
+    kiwi_flights = [service._optimize_kiwi_flight_data(flight.copy()) for flight in kiwi_raw]
+    # 线上Kiwi记录带有原始数据备份，清理时需要跳过
+    kiwi_with_original = [
+        dict(flight, _original_data=raw.get('_original_data'))
+        for flight, raw in zip(kiwi_flights, kiwi_raw)
+    ]
+    cleaned_google = service._clean_data_for_ai(google_flights, 'google')
+    cleaned_kiwi = service._clean_data_for_ai(kiwi_with_original, 'kiwi')
+    monitor_service = get_monitor_flight_service()
+
+    def build_prompt(data_format: str) -> Callable[[], str]:
+        return lambda: create_final_analysis_prompt(
+            cleaned_google, cleaned_kiwi, [], 'zh', 'HKG', 'LAX', '', data_format
+        )
+
+    cases = {
+        'optimize_kiwi_flight_data': lambda: [service._optimize_kiwi_flight_data(flight.copy()) for flight in kiwi_raw],
+        'convert_flight_to_dict': lambda: [service._convert_flight_to_dict(flight) for flight in google_flights + kiwi_flights],
+        'clean_data_for_ai.google': lambda: service._clean_data_for_ai(google_flights, 'google'),
+        'clean_data_for_ai.kiwi': lambda: service._clean_data_for_ai(kiwi_with_original, 'kiwi'),
+        'create_final_analysis_prompt.json': build_prompt('json'),
+        'create_final_analysis_prompt.compact': build_prompt('compact'),
+        'clean_trip_flight_data': lambda: monitor_service._clean_trip_flight_data(fixtures['trip'])
+    }
+
+    results = {}
+    for name, func in cases.items():
+        results[name] = measure(func, iterations)
+        print(f"  {name:<40}{results[name]['median_ms']:>10.2f} ms")
+
+    results['create_final_analysis_prompt.json']['prompt_chars'] = len(build_prompt('json')())
+    results['create_final_analysis_prompt.compact']['prompt_chars'] = len(build_prompt('compact')())
+    return results
+
+
+async def run_orchestration(service, runs: int, gateway: FakeAIGateway, providers: StubProviders) -> Dict[str, Any]:
+    """完整编排：每次使用不同日期，确保数据源缓存和请求合并均未命中"""
+    samples = []
+    successes = 0
+    base_date = date.today() + timedelta(days=60)
+    for run in range(runs):
+        depart_date = (base_date + timedelta(days=run)).isoformat()
+        started_at = time.perf_counter()
+        result = await service.search_flights_ai_enhanced(
+            departure_code='HKG',
+            destination_code='LAX',
+            depart_date=depart_date,
+            language='zh',
+            currency='CNY'
+        )
+        samples.append(time.perf_counter() - started_at)
+        successes += 1 if result.get('success') else 0
+        print(f"  search_flights_ai_enhanced #{run + 1}: {samples[-1]:.2f}s, success={result.get('success')}")
+
+    summary = summarize(samples)
+    summary.update({
+        'successes': successes,
+        'gateway_requests': len(gateway.requests),
+        'max_prompt_chars': max((request['prompt_chars'] for request in gateway.requests), default=0),
+        'provider_calls': dict(providers.calls)
+    })
+    return summary
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """与基线对比中位数，返回回归项说明"""
+    regressions = []
+    baseline_benchmarks = baseline.get('benchmarks', {})
+    print(f"\n{'基准':<40}{'基线(ms)':>12}{'本次(ms)':>12}{'变化':>10}")
+    for name, current in results['benchmarks'].items():
+        previous = baseline_benchmarks.get(name)
+        if not previous or not previous.get('median_ms'):
+            print(f"{name:<40}{'-':>12}{current['median_ms']:>12.2f}{'新增':>10}")
+            continue
+        ratio = current['median_ms'] / previous['median_ms']
+        flag = ' ⚠️' if ratio > 1 + threshold else ''
+        print(f"{name:<40}{previous['median_ms']:>12.2f}{current['median_ms']:>12.2f}{(ratio - 1) * 100:>+9.1f}%{flag}")
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: {previous['median_ms']:.2f}ms → {current['median_ms']:.2f}ms")
+    return regressions
+
+
+def write_json(path: str, data: Dict[str, Any]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+async def main_async(args) -> int:
+    if not args.verbose:
+        # 服务日志会显著影响微基准耗时
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+
+    from fastapi_app.config import settings
+
+    # 离线运行：不读写报告缓存、不持久化航线图
+    settings.AI_REPORT_CACHE_ENABLED = False
+    settings.ROUTE_GRAPH_PATH = ''
+
+    from fastapi_app.services import ai_gateway_client as gateway_module
+    from fastapi_app.services.ai_flight_service import AIFlightService
+    from fastapi_app.services.executor_pools import shutdown_executor_pools
+
+    fixtures = {name: load_fixture(name) for name in ('google', 'kiwi', 'trip')}
+    service = AIFlightService()
+
+    print(f"夹具: google={len(fixtures['google'])}, kiwi={len(fixtures['kiwi'])}, trip={len(fixtures['trip'].get('routes', []))}")
+    print("微基准:")
+    benchmarks = run_micro_benchmarks(service, fixtures, args.iterations)
+
+    if args.orchestration_runs > 0:
+        print("完整编排:")
+        providers = StubProviders(fixtures['google'], fixtures['kiwi'], latency=args.provider_latency).install(service)
+        with FakeAIGateway(latency=args.gateway_latency, report_chars=args.report_chars) as gateway:
+            gateway_module._ai_gateway_client = gateway_module.AIGatewayClient(base_url=gateway.base_url, api_key='benchmark')
+            try:
+                benchmarks['search_flights_ai_enhanced'] = await run_orchestration(
+                    service, args.orchestration_runs, gateway, providers
+                )
+            finally:
+                await gateway_module._ai_gateway_client.close()
+                gateway_module._ai_gateway_client = None
+                providers.uninstall()
+                shutdown_executor_pools()
+
+    results = {
+        'meta': {
+            'created_at': datetime.now().isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'fixtures': {
+                'google': len(fixtures['google']),
+                'kiwi': len(fixtures['kiwi']),
+                'trip': len(fixtures['trip'].get('routes', []))
+            },
+            'iterations': args.iterations,
+            'provider_latency': args.provider_latency,
+            'gateway_latency': args.gateway_latency
+        },
+        'benchmarks': benchmarks
+    }
+
+    write_json(args.output, results)
+    print(f"\n结果已写入: {args.output}")
+
+    if args.update_baseline:
+        write_json(args.baseline, results)
+        print(f"基线已更新: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"未找到基线文件（{args.baseline}），使用 --update-baseline 生成")
+        return 0
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n⚠️ 发现{len(regressions)}项回归（阈值{args.threshold:.0%}）:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        return 1 if args.fail_on_regression else 0
+    print("\n✅ 未发现回归")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI增强搜索链路基准测试（离线）")
+    parser.add_argument('--iterations', type=int, default=20, help="微基准重复次数")
+    parser.add_argument('--orchestration-runs', type=int, default=3, help="完整编排运行次数（0表示跳过）")
+    parser.add_argument('--provider-latency', type=float, default=0.05, help="上游替身延迟（秒）")
+    parser.add_argument('--gateway-latency', type=float, default=0.5, help="假网关响应延迟（秒）")
+    parser.add_argument('--report-chars', type=int, default=6000, help="假网关返回的报告长度（字符）")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="结果输出路径")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="基线文件路径")
+    parser.add_argument('--threshold', type=float, default=0.2, help="回归阈值（中位数变慢比例）")
+    parser.add_argument('--update-baseline', action='store_true', help="将本次结果写为基线")
+    parser.add_argument('--fail-on-regression', action='store_true', help="存在回归时返回非0退出码")
+    parser.add_argument('--verbose', action='store_true', help="输出服务INFO日志")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == '__main__':
+    main()
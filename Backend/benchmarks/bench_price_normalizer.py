@@ -0,0 +1,124 @@
+"""
+价格解析/过滤基准测试
+对比逐条循环解析（旧实现）与 fastapi_app.utils.price 共用解析的耗时
+共用解析统一了各数据源的价格规则（千分位逗号、对象属性、{'amount': ...}），第一个字段是有效价格时直接解析，
+只有缺失或无效时才探测其余字段；阈值过滤+排序复用同一次解析结果
+
+运行: python -m benchmarks.bench_price_normalizer [--flights 10000] [--repeat 5]
+"""
+import argparse
+import random
+import re
+import time
+from types import SimpleNamespace
+
+from fastapi_app.utils.price import extract_prices, filter_by_price, sort_by_price
+
+
+def build_fixtures(count: int, seed: int = 42) -> list:
+    """生成Google对象、Kiwi字典、Trip.com字典混合的航班数据"""
+    rng = random.Random(seed)
+    flights = []
+    for index in range(count):
+        price = round(rng.uniform(300, 8000), 2)
+        kind = index % 4
+        if kind == 0:
+            # smart-flights返回的对象
+            flights.append(SimpleNamespace(price=price, legs=[], stops=rng.randint(0, 2)))
+        elif kind == 1:
+            # Kiwi字典
+            flights.append({'id': f"kiwi_{index}", 'price': price, 'currency': 'CNY'})
+        elif kind == 2:
+            # Trip.com字典
+            flights.append({'航班号': f"MU{index}", 'price': price, '价格': price})
+        else:
+            # 字符串价格及缺失价格
+            flights.append({'id': f"ai_{index}", 'price': f"¥{price:,.2f}" if rng.random() > 0.05 else None})
+    return flights
+
+
+# 与AIFlightService._filter_valid_price_flights相同的字段
+VALID_PRICE_FIELDS = ('price', 'total_price', 'cost')
+
+
+def legacy_filter(flights: list) -> list:
+    """旧实现（_filter_valid_price_flights）：逐条探测字段并在循环内用正则清理字符串"""
+    valid_flights = []
+    for flight in flights:
+        if isinstance(flight, dict):
+            price = flight.get('price') or flight.get('total_price') or flight.get('cost')
+        else:
+            price = getattr(flight, 'price', None) or getattr(flight, 'total_price', None) or getattr(flight, 'cost', None)
+        if price is None:
+            continue
+        if isinstance(price, str):
+            price_str = re.sub(r'[^\d.]', '', price)
+            price = float(price_str) if price_str else 0.0
+        if float(price) > 0:
+            valid_flights.append(flight)
+    return valid_flights
+
+
+def legacy_threshold_sort(flights: list, threshold: float) -> list:
+    """旧实现：逐条比较阈值后按lambda排序"""
+    def price_of(flight):
+        if isinstance(flight, dict):
+            value = flight.get('价格') or flight.get('price')
+        else:
+            value = getattr(flight, 'price', None)
+        if isinstance(value, str):
+            value = float(re.sub(r'[^\d.]', '', value) or 0)
+        return value if value else float('inf')
+
+    matched = [flight for flight in flights if price_of(flight) <= threshold]
+    return sorted(matched, key=price_of)
+
+
+def shared_filter(flights: list) -> list:
+    return filter_by_price(flights, min_price=0, fields=VALID_PRICE_FIELDS)
+
+
+def shared_threshold_sort(flights: list, threshold: float) -> list:
+    # 价格只解析一次，过滤和排序复用同一个列表
+    prices = extract_prices(flights)
+    matched_prices = [price for price in prices if price <= threshold]
+    matched = filter_by_price(flights, max_price=threshold, prices=prices)
+    return sort_by_price(matched, prices=matched_prices)
+
+
+def timeit(func, *args, repeat: int = 5) -> float:
+    """返回多次运行中的最短耗时（毫秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - started_at)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="价格解析/过滤基准测试")
+    parser.add_argument('--flights', type=int, default=10000, help="航班数量")
+    parser.add_argument('--repeat', type=int, default=5, help="重复次数（取最短耗时）")
+    parser.add_argument('--threshold', type=float, default=2000.0, help="价格阈值")
+    args = parser.parse_args()
+
+    flights = build_fixtures(args.flights)
+    assert len(legacy_filter(flights)) == len(shared_filter(flights))
+
+    rows = [
+        ('有效价格过滤', timeit(legacy_filter, flights, repeat=args.repeat),
+         timeit(shared_filter, flights, repeat=args.repeat)),
+        ('阈值过滤+排序', timeit(legacy_threshold_sort, flights, args.threshold, repeat=args.repeat),
+         timeit(shared_threshold_sort, flights, args.threshold, repeat=args.repeat)),
+    ]
+
+    print(f"航班数: {args.flights:,}")
+    print(f"{'场景':<12}{'旧实现(ms)':>12}{'新实现(ms)':>12}{'加速比':>8}")
+    for name, legacy_ms, shared_ms in rows:
+        speedup = legacy_ms / shared_ms if shared_ms > 0 else 0
+        print(f"{name:<12}{legacy_ms:>12.2f}{shared_ms:>12.2f}{speedup:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""
+基准测试航班数据夹具
+优先加载 benchmarks/fixtures/ 下录制的真实数据源返回（见 record_fixtures.py），
+没有录制文件时按固定随机种子生成与真实返回结构、数量一致的数据：
+- google: smart-flights FlightResult 经 to_plain_data 转换后的字典（单程 top_n=135）
+- kiwi: KiwiFlightsAPI 返回的原始航班字典（普通 + 隐藏城市，附带 _original_data）
+- trip: Trip.com fuzzySearch 接口的原始响应（routes 列表）
+"""
+import gzip
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# 默认数据量（与线上单次搜索的返回规模一致）
+DEFAULT_SIZES = {
+    'google': 135,
+    'kiwi': 320,
+    'trip': 200
+}
+
+_CARRIERS = ['CX', 'UO', 'HX', 'CA', 'MU', 'CZ', 'HU', 'ZH', 'NH', 'JL', 'KE', 'SQ']
+_HUBS = ['PEK', 'PVG', 'CAN', 'CTU', 'XIY', 'KMG', 'TPE', 'ICN', 'NRT', 'BKK', 'SIN']
+_CITY_NAMES = {
+    'PEK': '北京', 'PVG': '上海', 'CAN': '广州', 'CTU': '成都', 'XIY': '西安', 'KMG': '昆明',
+    'TPE': '台北', 'ICN': '首尔', 'NRT': '东京', 'BKK': '曼谷', 'SIN': '新加坡', 'HKG': '香港',
+    'SZX': '深圳', 'LAX': '洛杉矶', 'LHR': '伦敦', 'SYD': '悉尼'
+}
+
+
+def fixture_path(name: str) -> str:
+    return os.path.join(FIXTURE_DIR, f"{name}.json.gz")
+
+
+def save_fixture(name: str, data: Any) -> str:
+    """保存夹具（gzip压缩的JSON）"""
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    path = fixture_path(name)
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+    return path
+
+
+def load_fixture(name: str, size: int = None, seed: int = 42) -> Any:
+    """加载录制的夹具，不存在时生成"""
+    path = fixture_path(name)
+    if os.path.exists(path):
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    return GENERATORS[name](size or DEFAULT_SIZES[name], seed)
+
+
+def _leg(rng: random.Random, origin: str, destination: str, departure: datetime) -> Dict[str, Any]:
+    duration = rng.randint(70, 420)
+    carrier = rng.choice(_CARRIERS)
+    return {
+        'airline': carrier,
+        'flight_number': f"{carrier}{rng.randint(100, 9999)}",
+        'departure_airport': origin,
+        'arrival_airport': destination,
+        'departure_datetime': departure.isoformat(),
+        'arrival_datetime': (departure + timedelta(minutes=duration)).isoformat(),
+        'duration': duration
+    }
+
+
+def generate_google_flights(count: int, seed: int = 42, origin: str = 'HKG', destination: str = 'LAX') -> List[Dict[str, Any]]:
+    """smart-flights返回结构（to_plain_data之后）"""
+    rng = random.Random(seed)
+    base = datetime(2026, 11, 20)
+    flights = []
+    for _ in range(count):
+        stops = rng.choice([0, 1, 1, 1, 2])
+        airports = [origin] + rng.sample(_HUBS, stops) + [destination]
+        departure = base + timedelta(minutes=rng.randint(0, 23 * 60))
+        legs = []
+        for leg_origin, leg_destination in zip(airports, airports[1:]):
+            leg = _leg(rng, leg_origin, leg_destination, departure)
+            legs.append(leg)
+            departure = datetime.fromisoformat(leg['arrival_datetime']) + timedelta(minutes=rng.randint(60, 300))
+        flights.append({
+            'price': float(rng.randint(1800, 16000)),
+            'duration': sum(leg['duration'] for leg in legs),
+            'stops': stops,
+            'legs': legs
+        })
+    return flights
+
+
+def generate_kiwi_flights(count: int, seed: int = 42, origin: str = 'HKG', destination: str = 'LAX') -> List[Dict[str, Any]]:
+    """KiwiFlightsAPI返回的原始航班字典（_optimize_kiwi_flight_data之前）"""
+    rng = random.Random(seed + 1)
+    base = datetime(2026, 11, 20)
+    flights = []
+    for index in range(count):
+        is_hidden_city = index >= count // 2
+        hubs = rng.sample(_HUBS, rng.choice([1, 1, 2]))
+        hidden_destination = rng.choice(['SYD', 'LHR', 'SZX']) if is_hidden_city else ''
+        airports = [origin] + hubs + [destination] + ([hidden_destination] if hidden_destination else [])
+
+        departure = base + timedelta(minutes=rng.randint(0, 23 * 60))
+        segments = []
+        for segment_origin, segment_destination in zip(airports, airports[1:]):
+            leg = _leg(rng, segment_origin, segment_destination, departure)
+            segments.append({
+                'from': segment_origin,
+                'to': segment_destination,
+                'carrier': leg['airline'],
+                'flight_number': leg['flight_number'][2:],
+                'departure_time': leg['departure_datetime'],
+                'arrival_time': leg['arrival_datetime']
+            })
+            departure = datetime.fromisoformat(leg['arrival_datetime']) + timedelta(minutes=rng.randint(60, 300))
+
+        duration_minutes = int((datetime.fromisoformat(segments[-1]['arrival_time']) - datetime.fromisoformat(segments[0]['departure_time'])).total_seconds() // 60)
+        price = float(rng.randint(1500, 14000))
+        flight = {
+            'id': ''.join(rng.choice('0123456789abcdef') for _ in range(180)),
+            'price': price,
+            'price_eur': round(price / 7.8, 2),
+            'currency': 'CNY',
+            'currency_symbol': '¥',
+            'departure_time': segments[0]['departure_time'],
+            'arrival_time': segments[-1]['arrival_time'],
+            'duration': duration_minutes * 60,
+            'duration_minutes': duration_minutes,
+            'departure_airport': origin,
+            'departure_airport_name': _CITY_NAMES.get(origin, origin),
+            'arrival_airport': destination,
+            'arrival_airport_name': _CITY_NAMES.get(destination, destination),
+            'carrier_code': segments[0]['carrier'],
+            'carrier_name': segments[0]['carrier'],
+            'flight_number': segments[0]['flight_number'],
+            'is_hidden_city': is_hidden_city,
+            'is_throwaway': is_hidden_city,
+            'hidden_destination_code': hidden_destination,
+            'hidden_destination_name': _CITY_NAMES.get(hidden_destination, ''),
+            'segment_count': len(segments),
+            'route_segments': segments,
+            'trip_type': 'oneway'
+        }
+        # 原始接口数据备份（线上约2-4KB/条）
+        flight['_original_data'] = {
+            'itinerary': {'sector': {'sectorSegments': [{'segment': dict(segment, code=rng.random()) for segment in segments}]}},
+            'bookingOptions': [{'token': ''.join(rng.choice('ABCDEFGH0123456789') for _ in range(600))}],
+            'provider': {'name': 'Kiwi.com', 'hasHighProbabilityOfPriceChange': False}
+        }
+        flights.append(flight)
+    return flights
+
+
+def generate_trip_response(count: int, seed: int = 42) -> Dict[str, Any]:
+    """Trip.com fuzzySearch接口原始响应"""
+    rng = random.Random(seed + 2)
+    codes = list(_CITY_NAMES)
+    routes = []
+    for index in range(count):
+        code = codes[index % len(codes)] if index < len(codes) else f"{chr(65 + index % 26)}{chr(65 + index // 26 % 26)}X"
+        price = rng.randint(300, 6000)
+        routes.append({
+            'arriveCity': {
+                'name': _CITY_NAMES.get(code, code),
+                'code': code,
+                'countryName': '中国',
+                'provinceName': '',
+                'imageUrl': f"https://dimg04.c-ctrip.com/images/{rng.randint(10**8, 10**9)}.jpg",
+                'lat': round(rng.uniform(-40, 60), 4),
+                'lon': round(rng.uniform(-120, 150), 4),
+                'gmtutcVariation': rng.choice([8, 9, 7, 0]),
+                'themeCodes': rng.sample(['SHOPPING', 'FOOD', 'NATURAL_SCENERY', 'CULTURE', 'SANDY_BEACH'], 2)
+            },
+            'pl': [{
+                'price': price,
+                'prePrice': price + rng.randint(-300, 300),
+                'currency': 'CNY',
+                'decRate': round(rng.random(), 2),
+                'departDate': '2026-11-20',
+                'returnDate': '2026-11-25',
+                'jumpUrl': f"/flights/hongkong-to-{code.lower()}/airfares-hkg-{code.lower()}?dcity=hkg&acity={code.lower()}"
+            }],
+            'hot': rng.randint(0, 100),
+            'recType': rng.randint(0, 3),
+            'tags': [{'name': f"景点{rng.randint(1, 50)}"} for _ in range(3)],
+            'isIntl': code not in ('PEK', 'PVG', 'CAN', 'CTU', 'XIY', 'KMG', 'SZX'),
+            'duration': rng.randint(60, 900)
+        })
+    return {'routes': routes}
+
+
+GENERATORS = {
+    'google': generate_google_flights,
+    'kiwi': generate_kiwi_flights,
+    'trip': generate_trip_response
+}
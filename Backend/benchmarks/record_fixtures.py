@@ -0,0 +1,63 @@
+"""
+录制基准测试夹具（需要网络和smart-flights）
+调用真实数据源，将原始返回保存到 benchmarks/fixtures/，之后的基准测试离线复用
+
+运行: python -m benchmarks.record_fixtures --from HKG --to LAX --date 2026-11-20
+"""
+import argparse
+import asyncio
+
+from benchmarks.fixtures import save_fixture
+
+
+async def record(departure_code: str, destination_code: str, depart_date: str):
+    from fastapi_app.services.ai_flight_service import get_ai_flight_service
+    from fastapi_app.services.flight_service import get_monitor_flight_service
+    from fastapi_app.services.provider_cache import to_plain_data
+
+    ai_service = get_ai_flight_service()
+
+    google_flights = ai_service._sync_search_google(departure_code, destination_code, depart_date)
+    print(f"google: {len(google_flights)} 条 → {save_fixture('google', to_plain_data(google_flights))}")
+
+    # Kiwi原始航班（_optimize_kiwi_flight_data之前）
+    from fli.api.kiwi_flights import KiwiFlightsAPI
+    api = KiwiFlightsAPI()
+    kiwi_flights = []
+    for hidden_city_only in (False, True):
+        response = await api.search_oneway_hidden_city(
+            origin=departure_code,
+            destination=destination_code,
+            departure_date=depart_date,
+            adults=1,
+            limit=25,
+            cabin_class="ECONOMY",
+            hidden_city_only=hidden_city_only
+        )
+        if isinstance(response, dict) and response.get('success'):
+            kiwi_flights.extend(response.get('flights', []))
+    print(f"kiwi: {len(kiwi_flights)} 条 → {save_fixture('kiwi', kiwi_flights)}")
+
+    # Trip.com原始响应
+    monitor_service = get_monitor_flight_service()
+    payload = monitor_service._update_trip_payload(departure_code, None, None, None)
+    response_data = monitor_service._sync_trip_request(
+        "https://hk.trip.com/restapi/soa2/19728/fuzzySearch",
+        monitor_service._get_trip_headers(),
+        payload
+    )
+    routes = (response_data or {}).get('routes', [])
+    print(f"trip: {len(routes)} 条 → {save_fixture('trip', response_data or {'routes': []})}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="录制基准测试夹具")
+    parser.add_argument('--from', dest='departure_code', default='HKG', help="出发机场代码")
+    parser.add_argument('--to', dest='destination_code', default='LAX', help="目的地机场代码")
+    parser.add_argument('--date', dest='depart_date', required=True, help="出发日期(YYYY-MM-DD)")
+    args = parser.parse_args()
+    asyncio.run(record(args.departure_code, args.destination_code, args.depart_date))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+基准测试用的上游替身
+- StubProviders: 用夹具数据替换smart-flights、Kiwi、指定中转搜索的网络调用（保留服务内部的处理逻辑）
+- FakeAIGateway: 本地OpenAI兼容网关（chat/completions，支持stream），延迟可配置
+"""
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+
+# AI推荐隐藏目的地的默认回复
+DEFAULT_SUGGESTIONS = "PEK,PVG,CAN,CTU,XIY,KMG,TPE,ICN,NRT,BKK"
+
+
+class StubProviders:
+    """替换AIFlightService中访问上游的方法，模拟上游延迟"""
+
+    def __init__(
+        self,
+        google_flights: List[Dict[str, Any]],
+        kiwi_flights: List[Dict[str, Any]],
+        latency: float = 0.0,
+        layover_results: int = 10
+    ):
+        self.google_flights = google_flights
+        self.kiwi_flights = kiwi_flights
+        self.latency = latency
+        self.layover_results = layover_results
+        self.calls = {'google': 0, 'kiwi': 0, 'layover': 0}
+        self._restore: List[Callable[[], None]] = []
+
+    def install(self, service):
+        """安装到服务实例（uninstall恢复）"""
+        providers = self
+
+        def sync_search_google(*args, **kwargs):
+            providers.calls['google'] += 1
+            time.sleep(providers.latency)
+            return providers.google_flights
+
+        def sync_search_with_layover(departure_code, final_destination, layover_airport, *args, **kwargs):
+            providers.calls['layover'] += 1
+            time.sleep(providers.latency)
+            return providers.google_flights[:providers.layover_results]
+
+        class StubKiwiFlightsAPI:
+            async def search_oneway_hidden_city(self, hidden_city_only: bool = False, **kwargs):
+                providers.calls['kiwi'] += 1
+                await asyncio.sleep(providers.latency)
+                half = len(providers.kiwi_flights) // 2
+                flights = providers.kiwi_flights[half:] if hidden_city_only else providers.kiwi_flights[:half]
+                return {'success': True, 'flights': flights}
+
+        service._sync_search_google = sync_search_google
+        service._sync_search_with_layover = sync_search_with_layover
+        self._restore.append(lambda: service.__dict__.pop('_sync_search_google', None))
+        self._restore.append(lambda: service.__dict__.pop('_sync_search_with_layover', None))
+
+        # _search_kiwi_async在函数内导入KiwiFlightsAPI，替换模块属性即可
+        module_name = 'fli.api.kiwi_flights'
+        module = sys.modules.get(module_name)
+        if module is None:
+            try:
+                import fli.api.kiwi_flights as module
+            except ImportError:
+                module = types.ModuleType(module_name)
+                sys.modules[module_name] = module
+        original = getattr(module, 'KiwiFlightsAPI', None)
+        module.KiwiFlightsAPI = StubKiwiFlightsAPI
+        self._restore.append(lambda: setattr(module, 'KiwiFlightsAPI', original))
+        return self
+
+    def uninstall(self):
+        while self._restore:
+            self._restore.pop()()
+
+
+class FakeAIGateway:
+    """本地OpenAI兼容网关"""
+
+    def __init__(
+        self,
+        latency: float = 1.0,
+        jitter: float = 0.0,
+        report_chars: int = 6000,
+        chunk_chars: int = 200,
+        responder: Optional[Callable[[Dict[str, Any]], str]] = None,
+        host: str = '127.0.0.1',
+        port: int = 0
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.report_chars = report_chars
+        self.chunk_chars = chunk_chars
+        self.responder = responder or self.default_responder
+        self.requests: List[Dict[str, Any]] = []
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def default_responder(self, payload: Dict[str, Any]) -> str:
+        prompt = payload['messages'][-1]['content']
+        if 'IATA city codes' in prompt:
+            return DEFAULT_SUGGESTIONS
+        line = "| CX880 | HKG → LAX | 12:35 → 09:10 | ¥4,280 | 直飞 |\n"
+        header = "## 航班分析报告\n\n| 航班 | 航线 | 时间 | 价格 | 备注 |\n|---|---|---|---|---|\n"
+        return header + line * max(1, (self.report_chars - len(header)) // len(line))
+
+    def start(self) -> "FakeAIGateway":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _make_handler(self):
+        gateway = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                gateway.requests.append({
+                    'model': payload.get('model'),
+                    'stream': bool(payload.get('stream')),
+                    'prompt_chars': sum(len(m.get('content', '')) for m in payload.get('messages', []))
+                })
+                time.sleep(max(0.0, gateway.latency + random.uniform(-gateway.jitter, gateway.jitter)))
+                content = gateway.responder(payload)
+
+                if payload.get('stream'):
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.send_header('Connection', 'close')
+                    self.end_headers()
+                    for start in range(0, len(content), gateway.chunk_chars):
+                        chunk = {'choices': [{'delta': {'content': content[start:start + gateway.chunk_chars]}}]}
+                        self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.close_connection = True
+                    return
+
+                body = json.dumps({
+                    'id': 'chatcmpl-bench',
+                    'object': 'chat.completion',
+                    'model': payload.get('model'),
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}]
+                }, ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
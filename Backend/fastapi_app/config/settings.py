@@ -50,6 +50,115 @@ REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
 # AI 服务配置
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-pro")
+# OpenAI兼容AI网关（航班分析使用）
+AI_API_KEY = os.getenv("AI_API_KEY")
+AI_API_BASE_URL = os.getenv("AI_API_BASE_URL", "http://154.19.184.12:3000/v1")
+# AI网关连接池：连接上限、Keep-Alive保持时长（秒）、DNS缓存时长（秒）
+AI_GATEWAY_POOL_LIMIT = int(os.getenv("AI_GATEWAY_POOL_LIMIT", 20))
+AI_GATEWAY_KEEPALIVE_TIMEOUT = int(os.getenv("AI_GATEWAY_KEEPALIVE_TIMEOUT", 60))
+AI_GATEWAY_DNS_TTL = int(os.getenv("AI_GATEWAY_DNS_TTL", 300))
+
+# AI增强搜索性能配置
+# 相同参数并发搜索合并（single-flight）：Redis租约时长、结果交接保留时长、跨worker等待轮询间隔
+AI_SEARCH_COALESCE_LEASE_TTL = int(os.getenv("AI_SEARCH_COALESCE_LEASE_TTL", 600))
+AI_SEARCH_COALESCE_RESULT_TTL = int(os.getenv("AI_SEARCH_COALESCE_RESULT_TTL", 60))
+AI_SEARCH_COALESCE_POLL_INTERVAL = float(os.getenv("AI_SEARCH_COALESCE_POLL_INTERVAL", 1.0))
+# 数据源原始结果缓存（stale-while-revalidate）：新鲜期、陈旧期（秒）、进程内降级缓存条目上限
+PROVIDER_CACHE_FRESH_TTL = int(os.getenv("PROVIDER_CACHE_FRESH_TTL", 600))
+PROVIDER_CACHE_STALE_TTL = int(os.getenv("PROVIDER_CACHE_STALE_TTL", 3600))
+PROVIDER_CACHE_LOCAL_MAX_ENTRIES = int(os.getenv("PROVIDER_CACHE_LOCAL_MAX_ENTRIES", 256))
+# 隐藏城市中转搜索：并发上限、单个候选城市超时（秒）
+HIDDEN_CITY_SEARCH_CONCURRENCY = int(os.getenv("HIDDEN_CITY_SEARCH_CONCURRENCY", 4))
+HIDDEN_CITY_SEARCH_TIMEOUT = float(os.getenv("HIDDEN_CITY_SEARCH_TIMEOUT", 45))
+# AI推荐隐藏目的地按航线缓存：新鲜期（默认1天）、陈旧期（默认7天）
+HIDDEN_CITY_SUGGESTION_FRESH_TTL = int(os.getenv("HIDDEN_CITY_SUGGESTION_FRESH_TTL", 86400))
+HIDDEN_CITY_SUGGESTION_STALE_TTL = int(os.getenv("HIDDEN_CITY_SUGGESTION_STALE_TTL", 604800))
+# 发送给AI的航班数据格式：json（嵌套字典）或 compact（列式紧凑编码），可按请求覆盖
+AI_PROMPT_DATA_FORMAT = os.getenv("AI_PROMPT_DATA_FORMAT", "json")
+# AI分析报告缓存：是否启用、最短缓存时长（秒，最长为原始数据新鲜期）、进程内降级缓存条目上限
+AI_REPORT_CACHE_ENABLED = os.getenv("AI_REPORT_CACHE_ENABLED", "true").lower() == "true"
+AI_REPORT_CACHE_MIN_TTL = int(os.getenv("AI_REPORT_CACHE_MIN_TTL", 60))
+AI_REPORT_CACHE_LOCAL_MAX_ENTRIES = int(os.getenv("AI_REPORT_CACHE_LOCAL_MAX_ENTRIES", 64))
+# AI模型对冲请求：是否启用、触发百分位、历史样本不足时的默认等待（秒）、等待上下限（秒）、最少样本数
+AI_HEDGE_ENABLED = os.getenv("AI_HEDGE_ENABLED", "true").lower() == "true"
+AI_HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", 90))
+AI_HEDGE_DEFAULT_DELAY = float(os.getenv("AI_HEDGE_DEFAULT_DELAY", 90))
+AI_HEDGE_MIN_DELAY = float(os.getenv("AI_HEDGE_MIN_DELAY", 20))
+AI_HEDGE_MAX_DELAY = float(os.getenv("AI_HEDGE_MAX_DELAY", 180))
+AI_HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", 10))
+# 提示词超过该字符数时直接使用快速模型（0表示不启用）
+AI_FAST_MODEL_PROMPT_THRESHOLD = int(os.getenv("AI_FAST_MODEL_PROMPT_THRESHOLD", 150000))
+# 发送给AI前合并各数据源重复行程（按航空公司、航班号、出发时间）
+AI_DEDUP_ENABLED = os.getenv("AI_DEDUP_ENABLED", "true").lower() == "true"
+# 发送给AI前的本地预排序：是否启用、保留得分前K的航班、每个数据源至少保留的航班数（帕累托前沿航班始终保留）
+AI_PRERANK_ENABLED = os.getenv("AI_PRERANK_ENABLED", "true").lower() == "true"
+AI_PRERANK_TOP_K = int(os.getenv("AI_PRERANK_TOP_K", 40))
+AI_PRERANK_MIN_PER_SOURCE = int(os.getenv("AI_PRERANK_MIN_PER_SOURCE", 5))
+# 数据清理日志的大小估算抽样条数（0表示不估算）
+AI_CLEAN_SIZE_SAMPLE = int(os.getenv("AI_CLEAN_SIZE_SAMPLE", 20))
+# 灵活日期价格矩阵：出发日期最大浮动天数、最多日期组合数、并发查询数、单个日期组合超时（秒）
+FLEXIBLE_DATE_MAX_WINDOW = int(os.getenv("FLEXIBLE_DATE_MAX_WINDOW", 7))
+FLEXIBLE_DATE_MAX_CELLS = int(os.getenv("FLEXIBLE_DATE_MAX_CELLS", 45))
+FLEXIBLE_DATE_CONCURRENCY = int(os.getenv("FLEXIBLE_DATE_CONCURRENCY", 4))
+FLEXIBLE_DATE_CELL_TIMEOUT = float(os.getenv("FLEXIBLE_DATE_CELL_TIMEOUT", 60))
+# 批量多航线搜索：单次请求最多航线数、所有批量请求共享的航线并发上限
+BATCH_SEARCH_MAX_ROUTES = int(os.getenv("BATCH_SEARCH_MAX_ROUTES", 20))
+BATCH_SEARCH_CONCURRENCY = int(os.getenv("BATCH_SEARCH_CONCURRENCY", 4))
+# 本地航线图（隐藏城市候选）：是否启用、持久化文件路径（留空不持久化，多个worker合并写入同一文件）、每记录多少条行程保存一次、少于该候选数时改用AI推荐、记录边价格的币种
+ROUTE_GRAPH_ENABLED = os.getenv("ROUTE_GRAPH_ENABLED", "true").lower() == "true"
+ROUTE_GRAPH_PATH = os.getenv("ROUTE_GRAPH_PATH", "data/route_graph.npz")
+ROUTE_GRAPH_SAVE_EVERY = int(os.getenv("ROUTE_GRAPH_SAVE_EVERY", 500))
+ROUTE_GRAPH_MIN_CANDIDATES = int(os.getenv("ROUTE_GRAPH_MIN_CANDIDATES", 5))
+ROUTE_GRAPH_CURRENCY = os.getenv("ROUTE_GRAPH_CURRENCY", "CNY")
+# 搜索分阶段耗时追踪：是否启用、内存中保留的trace数、每个阶段保留的耗时样本数（用于计算p95）
+SEARCH_TRACE_ENABLED = os.getenv("SEARCH_TRACE_ENABLED", "true").lower() == "true"
+SEARCH_TRACE_HISTORY = int(os.getenv("SEARCH_TRACE_HISTORY", 200))
+SEARCH_TRACE_STAGE_SAMPLES = int(os.getenv("SEARCH_TRACE_STAGE_SAMPLES", 1000))
+# 异步搜索分阶段结果：是否启用、每个数据源阶段保存的最便宜航班数、预览排序条数
+PARTIAL_RESULTS_ENABLED = os.getenv("PARTIAL_RESULTS_ENABLED", "true").lower() == "true"
+PARTIAL_RESULTS_MAX_FLIGHTS = int(os.getenv("PARTIAL_RESULTS_MAX_FLIGHTS", 30))
+PARTIAL_RESULTS_PREVIEW_SIZE = int(os.getenv("PARTIAL_RESULTS_PREVIEW_SIZE", 10))
+# 超大提示词分片分析（map-reduce）：是否启用、触发的请求数据量（字节，即AI请求日志中的Payload大小）、单个分片目标token数、最多分片数、每个分片提取的候选航班数
+AI_MAP_REDUCE_ENABLED = os.getenv("AI_MAP_REDUCE_ENABLED", "true").lower() == "true"
+AI_MAP_REDUCE_PAYLOAD_THRESHOLD = int(os.getenv("AI_MAP_REDUCE_PAYLOAD_THRESHOLD", 200000))
+AI_MAP_REDUCE_SHARD_TOKENS = int(os.getenv("AI_MAP_REDUCE_SHARD_TOKENS", 24000))
+AI_MAP_REDUCE_MAX_SHARDS = int(os.getenv("AI_MAP_REDUCE_MAX_SHARDS", 8))
+AI_MAP_REDUCE_SHARD_CANDIDATES = int(os.getenv("AI_MAP_REDUCE_SHARD_CANDIDATES", 10))
+# Google Flights扩展搜索自适应条数（先小条数探测，结果足够即停止，否则直接请求最大条数）：是否启用、探测条数
+GOOGLE_ADAPTIVE_FETCH_ENABLED = os.getenv("GOOGLE_ADAPTIVE_FETCH_ENABLED", "true").lower() == "true"
+GOOGLE_ADAPTIVE_INITIAL_TOP_N = int(os.getenv("GOOGLE_ADAPTIVE_INITIAL_TOP_N", 30))
+# 常规搜索：最大条数（单程/往返）、价格带（相对最低价的比例）、价格带内去重行程达到该数量即停止（单程/往返）
+GOOGLE_SEARCH_MAX_TOP_N_ONEWAY = int(os.getenv("GOOGLE_SEARCH_MAX_TOP_N_ONEWAY", 135))
+GOOGLE_SEARCH_MAX_TOP_N_ROUNDTRIP = int(os.getenv("GOOGLE_SEARCH_MAX_TOP_N_ROUNDTRIP", 50))
+GOOGLE_SEARCH_PRICE_BAND = float(os.getenv("GOOGLE_SEARCH_PRICE_BAND", 0.3))
+GOOGLE_SEARCH_TARGET_ONEWAY = int(os.getenv("GOOGLE_SEARCH_TARGET_ONEWAY", 40))
+GOOGLE_SEARCH_TARGET_ROUNDTRIP = int(os.getenv("GOOGLE_SEARCH_TARGET_ROUNDTRIP", 20))
+# 指定中转搜索：最大条数、经过目标中转机场的航班达到该数量即停止
+LAYOVER_SEARCH_MAX_TOP_N = int(os.getenv("LAYOVER_SEARCH_MAX_TOP_N", 100))
+LAYOVER_SEARCH_TARGET_MATCHES = int(os.getenv("LAYOVER_SEARCH_TARGET_MATCHES", 10))
+
+# 价格监控配置
+# 监控周期内相同出发地和日期的任务共享一次Trip.com查询：最多同时查询的分组数
+MONITOR_SNAPSHOT_CONCURRENCY = int(os.getenv("MONITOR_SNAPSHOT_CONCURRENCY", 4))
+
+# 上游服务熔断配置
+# 滑动窗口内错误率阈值、窗口时长（秒）、触发熔断的最少请求数、熔断持续时间（秒）
+CIRCUIT_BREAKER_FAILURE_RATE = float(os.getenv("CIRCUIT_BREAKER_FAILURE_RATE", 0.5))
+CIRCUIT_BREAKER_WINDOW_SECONDS = float(os.getenv("CIRCUIT_BREAKER_WINDOW_SECONDS", 60))
+CIRCUIT_BREAKER_MIN_CALLS = int(os.getenv("CIRCUIT_BREAKER_MIN_CALLS", 5))
+CIRCUIT_BREAKER_OPEN_SECONDS = float(os.getenv("CIRCUIT_BREAKER_OPEN_SECONDS", 30))
+
+# 阻塞调用线程池配置（每类工作负载独立线程池）：线程数、进行中任务上限（0表示不限制）
+EXECUTOR_GOOGLE_FLIGHTS_WORKERS = int(os.getenv("EXECUTOR_GOOGLE_FLIGHTS_WORKERS", 8))
+EXECUTOR_GOOGLE_FLIGHTS_MAX_PENDING = int(os.getenv("EXECUTOR_GOOGLE_FLIGHTS_MAX_PENDING", 32))
+EXECUTOR_HIDDEN_CITY_WORKERS = int(os.getenv("EXECUTOR_HIDDEN_CITY_WORKERS", 8))
+EXECUTOR_HIDDEN_CITY_MAX_PENDING = int(os.getenv("EXECUTOR_HIDDEN_CITY_MAX_PENDING", 40))
+EXECUTOR_TRIP_COM_WORKERS = int(os.getenv("EXECUTOR_TRIP_COM_WORKERS", 4))
+EXECUTOR_TRIP_COM_MAX_PENDING = int(os.getenv("EXECUTOR_TRIP_COM_MAX_PENDING", 16))
+EXECUTOR_EMAIL_WORKERS = int(os.getenv("EXECUTOR_EMAIL_WORKERS", 2))
+EXECUTOR_EMAIL_MAX_PENDING = int(os.getenv("EXECUTOR_EMAIL_MAX_PENDING", 100))
+EXECUTOR_GEMINI_WORKERS = int(os.getenv("EXECUTOR_GEMINI_WORKERS", 4))
+EXECUTOR_GEMINI_MAX_PENDING = int(os.getenv("EXECUTOR_GEMINI_MAX_PENDING", 16))
 
 # 高德地图配置
 AMAP_API_KEY = os.getenv("AMAP_API_KEY")
@@ -143,6 +252,91 @@ class Settings:
         # AI配置
         self.GEMINI_API_KEY = GEMINI_API_KEY
         self.GEMINI_MODEL = GEMINI_MODEL
+        self.AI_API_KEY = AI_API_KEY
+        self.AI_API_BASE_URL = AI_API_BASE_URL
+        self.AI_GATEWAY_POOL_LIMIT = AI_GATEWAY_POOL_LIMIT
+        self.AI_GATEWAY_KEEPALIVE_TIMEOUT = AI_GATEWAY_KEEPALIVE_TIMEOUT
+        self.AI_GATEWAY_DNS_TTL = AI_GATEWAY_DNS_TTL
+
+        # AI增强搜索性能配置
+        self.AI_SEARCH_COALESCE_LEASE_TTL = AI_SEARCH_COALESCE_LEASE_TTL
+        self.AI_SEARCH_COALESCE_RESULT_TTL = AI_SEARCH_COALESCE_RESULT_TTL
+        self.AI_SEARCH_COALESCE_POLL_INTERVAL = AI_SEARCH_COALESCE_POLL_INTERVAL
+        self.PROVIDER_CACHE_FRESH_TTL = PROVIDER_CACHE_FRESH_TTL
+        self.PROVIDER_CACHE_STALE_TTL = PROVIDER_CACHE_STALE_TTL
+        self.PROVIDER_CACHE_LOCAL_MAX_ENTRIES = PROVIDER_CACHE_LOCAL_MAX_ENTRIES
+        self.HIDDEN_CITY_SEARCH_CONCURRENCY = HIDDEN_CITY_SEARCH_CONCURRENCY
+        self.HIDDEN_CITY_SEARCH_TIMEOUT = HIDDEN_CITY_SEARCH_TIMEOUT
+        self.HIDDEN_CITY_SUGGESTION_FRESH_TTL = HIDDEN_CITY_SUGGESTION_FRESH_TTL
+        self.HIDDEN_CITY_SUGGESTION_STALE_TTL = HIDDEN_CITY_SUGGESTION_STALE_TTL
+        self.AI_PROMPT_DATA_FORMAT = AI_PROMPT_DATA_FORMAT
+        self.AI_REPORT_CACHE_ENABLED = AI_REPORT_CACHE_ENABLED
+        self.AI_REPORT_CACHE_MIN_TTL = AI_REPORT_CACHE_MIN_TTL
+        self.AI_REPORT_CACHE_LOCAL_MAX_ENTRIES = AI_REPORT_CACHE_LOCAL_MAX_ENTRIES
+        self.AI_HEDGE_ENABLED = AI_HEDGE_ENABLED
+        self.AI_HEDGE_PERCENTILE = AI_HEDGE_PERCENTILE
+        self.AI_HEDGE_DEFAULT_DELAY = AI_HEDGE_DEFAULT_DELAY
+        self.AI_HEDGE_MIN_DELAY = AI_HEDGE_MIN_DELAY
+        self.AI_HEDGE_MAX_DELAY = AI_HEDGE_MAX_DELAY
+        self.AI_HEDGE_MIN_SAMPLES = AI_HEDGE_MIN_SAMPLES
+        self.AI_FAST_MODEL_PROMPT_THRESHOLD = AI_FAST_MODEL_PROMPT_THRESHOLD
+        self.AI_DEDUP_ENABLED = AI_DEDUP_ENABLED
+        self.AI_PRERANK_ENABLED = AI_PRERANK_ENABLED
+        self.AI_PRERANK_TOP_K = AI_PRERANK_TOP_K
+        self.AI_PRERANK_MIN_PER_SOURCE = AI_PRERANK_MIN_PER_SOURCE
+        self.AI_CLEAN_SIZE_SAMPLE = AI_CLEAN_SIZE_SAMPLE
+        self.FLEXIBLE_DATE_MAX_WINDOW = FLEXIBLE_DATE_MAX_WINDOW
+        self.FLEXIBLE_DATE_MAX_CELLS = FLEXIBLE_DATE_MAX_CELLS
+        self.FLEXIBLE_DATE_CONCURRENCY = FLEXIBLE_DATE_CONCURRENCY
+        self.FLEXIBLE_DATE_CELL_TIMEOUT = FLEXIBLE_DATE_CELL_TIMEOUT
+        self.BATCH_SEARCH_MAX_ROUTES = BATCH_SEARCH_MAX_ROUTES
+        self.BATCH_SEARCH_CONCURRENCY = BATCH_SEARCH_CONCURRENCY
+        self.ROUTE_GRAPH_ENABLED = ROUTE_GRAPH_ENABLED
+        self.ROUTE_GRAPH_PATH = ROUTE_GRAPH_PATH
+        self.ROUTE_GRAPH_SAVE_EVERY = ROUTE_GRAPH_SAVE_EVERY
+        self.ROUTE_GRAPH_MIN_CANDIDATES = ROUTE_GRAPH_MIN_CANDIDATES
+        self.ROUTE_GRAPH_CURRENCY = ROUTE_GRAPH_CURRENCY
+        self.SEARCH_TRACE_ENABLED = SEARCH_TRACE_ENABLED
+        self.SEARCH_TRACE_HISTORY = SEARCH_TRACE_HISTORY
+        self.SEARCH_TRACE_STAGE_SAMPLES = SEARCH_TRACE_STAGE_SAMPLES
+        self.PARTIAL_RESULTS_ENABLED = PARTIAL_RESULTS_ENABLED
+        self.PARTIAL_RESULTS_MAX_FLIGHTS = PARTIAL_RESULTS_MAX_FLIGHTS
+        self.PARTIAL_RESULTS_PREVIEW_SIZE = PARTIAL_RESULTS_PREVIEW_SIZE
+        self.AI_MAP_REDUCE_ENABLED = AI_MAP_REDUCE_ENABLED
+        self.AI_MAP_REDUCE_PAYLOAD_THRESHOLD = AI_MAP_REDUCE_PAYLOAD_THRESHOLD
+        self.AI_MAP_REDUCE_SHARD_TOKENS = AI_MAP_REDUCE_SHARD_TOKENS
+        self.AI_MAP_REDUCE_MAX_SHARDS = AI_MAP_REDUCE_MAX_SHARDS
+        self.AI_MAP_REDUCE_SHARD_CANDIDATES = AI_MAP_REDUCE_SHARD_CANDIDATES
+        self.GOOGLE_ADAPTIVE_FETCH_ENABLED = GOOGLE_ADAPTIVE_FETCH_ENABLED
+        self.GOOGLE_ADAPTIVE_INITIAL_TOP_N = GOOGLE_ADAPTIVE_INITIAL_TOP_N
+        self.GOOGLE_SEARCH_MAX_TOP_N_ONEWAY = GOOGLE_SEARCH_MAX_TOP_N_ONEWAY
+        self.GOOGLE_SEARCH_MAX_TOP_N_ROUNDTRIP = GOOGLE_SEARCH_MAX_TOP_N_ROUNDTRIP
+        self.GOOGLE_SEARCH_PRICE_BAND = GOOGLE_SEARCH_PRICE_BAND
+        self.GOOGLE_SEARCH_TARGET_ONEWAY = GOOGLE_SEARCH_TARGET_ONEWAY
+        self.GOOGLE_SEARCH_TARGET_ROUNDTRIP = GOOGLE_SEARCH_TARGET_ROUNDTRIP
+        self.LAYOVER_SEARCH_MAX_TOP_N = LAYOVER_SEARCH_MAX_TOP_N
+        self.LAYOVER_SEARCH_TARGET_MATCHES = LAYOVER_SEARCH_TARGET_MATCHES
+
+        # 价格监控配置
+        self.MONITOR_SNAPSHOT_CONCURRENCY = MONITOR_SNAPSHOT_CONCURRENCY
+
+        # 上游服务熔断配置
+        self.CIRCUIT_BREAKER_FAILURE_RATE = CIRCUIT_BREAKER_FAILURE_RATE
+        self.CIRCUIT_BREAKER_WINDOW_SECONDS = CIRCUIT_BREAKER_WINDOW_SECONDS
+        self.CIRCUIT_BREAKER_MIN_CALLS = CIRCUIT_BREAKER_MIN_CALLS
+        self.CIRCUIT_BREAKER_OPEN_SECONDS = CIRCUIT_BREAKER_OPEN_SECONDS
+
+        # 阻塞调用线程池配置
+        self.EXECUTOR_GOOGLE_FLIGHTS_WORKERS = EXECUTOR_GOOGLE_FLIGHTS_WORKERS
+        self.EXECUTOR_GOOGLE_FLIGHTS_MAX_PENDING = EXECUTOR_GOOGLE_FLIGHTS_MAX_PENDING
+        self.EXECUTOR_HIDDEN_CITY_WORKERS = EXECUTOR_HIDDEN_CITY_WORKERS
+        self.EXECUTOR_HIDDEN_CITY_MAX_PENDING = EXECUTOR_HIDDEN_CITY_MAX_PENDING
+        self.EXECUTOR_TRIP_COM_WORKERS = EXECUTOR_TRIP_COM_WORKERS
+        self.EXECUTOR_TRIP_COM_MAX_PENDING = EXECUTOR_TRIP_COM_MAX_PENDING
+        self.EXECUTOR_EMAIL_WORKERS = EXECUTOR_EMAIL_WORKERS
+        self.EXECUTOR_EMAIL_MAX_PENDING = EXECUTOR_EMAIL_MAX_PENDING
+        self.EXECUTOR_GEMINI_WORKERS = EXECUTOR_GEMINI_WORKERS
+        self.EXECUTOR_GEMINI_MAX_PENDING = EXECUTOR_GEMINI_MAX_PENDING
 
         # JWT配置
         self.JWT_SECRET_KEY = JWT_SECRET_KEY
@@ -205,8 +205,8 @@ class ResponseOptimizationMiddleware(BaseHTTPMiddleware):
         """优化响应"""
         response = await call_next(request)
         
-        # 添加缓存头
-        if request.method == "GET" and response.status_code == 200:
+        # 添加缓存头（接口已自行设置时不覆盖，例如SSE流式响应的no-cache）
+        if request.method == "GET" and response.status_code == 200 and "Cache-Control" not in response.headers:
             # 静态资源缓存
             if any(request.url.path.endswith(ext) for ext in ['.js', '.css', '.png', '.jpg', '.ico']):
                 response.headers["Cache-Control"] = "public, max-age=86400"  # 1天
@@ -88,6 +88,59 @@ class FlightSearchRequest(BaseModel):
         return TripType.ROUND_TRIP if self.return_date else TripType.ONE_WAY
 
 
+class BatchSearchMode(str, Enum):
+    """批量搜索模式"""
+    PLAIN = "plain"
+    AI_ENHANCED = "ai_enhanced"
+
+
+class BatchRouteItem(BaseModel):
+    """批量搜索中的单条航线"""
+    departure_code: str = Field(..., min_length=3, max_length=3, description="出发机场代码")
+    destination_code: str = Field(..., min_length=3, max_length=3, description="目的地机场代码")
+    depart_date: str = Field(..., description="出发日期(YYYY-MM-DD)")
+    return_date: Optional[str] = Field(None, description="返程日期(YYYY-MM-DD)")
+
+    @validator('departure_code', 'destination_code')
+    def validate_airport_codes(cls, v):
+        """验证机场代码格式"""
+        if not v.isalpha() or len(v) != 3:
+            raise ValueError('机场代码必须是3位字母')
+        return v.upper()
+
+    @validator('destination_code')
+    def validate_different_airports(cls, v, values):
+        """验证出发地和目的地不能相同"""
+        if v == values.get('departure_code'):
+            raise ValueError('出发地和目的地不能相同')
+        return v
+
+    @validator('depart_date', 'return_date')
+    def validate_dates(cls, v):
+        """验证日期格式"""
+        if v is None:
+            return v
+        try:
+            datetime.strptime(v, '%Y-%m-%d')
+            return v
+        except ValueError:
+            raise ValueError('日期格式必须是YYYY-MM-DD')
+
+
+class BatchFlightSearchRequest(BaseModel):
+    """批量多航线搜索请求"""
+    routes: List[BatchRouteItem] = Field(..., min_length=1, description="航线列表")
+    mode: BatchSearchMode = Field(default=BatchSearchMode.PLAIN, description="搜索模式")
+    passengers: PassengerInfo = Field(default_factory=PassengerInfo, description="乘客信息")
+    seat_class: SeatClass = Field(default=SeatClass.ECONOMY, description="座位等级")
+    max_stops: MaxStops = Field(default=MaxStops.ANY, description="最大中转次数")
+    sort_by: SortBy = Field(default=SortBy.CHEAPEST, description="排序方式")
+    language: str = Field(default="zh", description="语言设置 (zh/en)")
+    currency: str = Field(default="CNY", description="货币设置 (CNY/USD)")
+    user_preferences: str = Field(default="", description="用户偏好和要求（仅AI增强模式）")
+    data_format: Optional[str] = Field(None, description="发送给AI的航班数据格式 (json/compact)", pattern="^(json|compact)$")
+
+
 class FlightLeg(BaseModel):
     """航段信息"""
     airline_code: str = Field(..., description="航空公司代码")
@@ -220,6 +220,157 @@ def get_consolidated_instructions_prompt(language: str = "zh") -> str:
   4. **Important Reminders**: Include risks of hidden city fares and general travel tips (visas, airport arrival time).
 """
 
+# 紧凑编码中需要字典化的字段（机场/航空公司名称在航班间大量重复）
+_DICTIONARY_FIELD_KEYWORDS = ('airport', 'airline', 'carrier', 'origin', 'destination')
+
+
+def _is_dictionary_field(field_name: str) -> bool:
+    name = field_name.lower()
+    return any(keyword in name for keyword in _DICTIONARY_FIELD_KEYWORDS)
+
+
+def encode_flights_compact(all_flights: list) -> tuple:
+    """
+    将航班列表编码为紧凑的列式格式
+
+    - 第一行为字段名表头，之后每个航班一行值（JSON数组），不再重复键名
+    - 嵌套的记录列表（如legs、route_segments）在表头中声明子字段，值为二维数组
+    - 机场/航空公司名称字典化为 A0、A1... 编号（3位代码本身较短，保持原样）
+    - 空值统一为null
+
+    Returns:
+        tuple: (编码后的文本, 编码报告)；与JSON格式的大小对比由调用方按实际发送的数据块计算
+    """
+    import json
+
+    def compact_json(value) -> str:
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str)
+
+    flights = [flight for flight in all_flights if isinstance(flight, dict)]
+
+    # 1. 收集表头：顶层字段按首次出现顺序，嵌套记录列表收集子字段
+    columns = []
+    nested_columns = {}
+    for flight in flights:
+        for key, value in flight.items():
+            if key not in columns:
+                columns.append(key)
+            if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+                sub_columns = nested_columns.setdefault(key, [])
+                for item in value:
+                    for sub_key in item:
+                        if sub_key not in sub_columns:
+                            sub_columns.append(sub_key)
+
+    # 2. 字典编码机场/航空公司名称
+    dictionary = {}
+
+    def encode_value(field_name: str, value):
+        if isinstance(value, str) and len(value) > 3 and _is_dictionary_field(field_name):
+            if value not in dictionary:
+                dictionary[value] = f"A{len(dictionary)}"
+            return dictionary[value]
+        if isinstance(value, dict):
+            return {k: encode_value(k, v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [encode_value(field_name, item) for item in value]
+        return value
+
+    rows = []
+    for flight in flights:
+        row = []
+        for column in columns:
+            value = flight.get(column)
+            if column in nested_columns and isinstance(value, list):
+                value = [
+                    [encode_value(sub_column, item.get(sub_column)) for sub_column in nested_columns[column]]
+                    if isinstance(item, dict) else encode_value(column, item)
+                    for item in value
+                ]
+            else:
+                value = encode_value(column, value)
+            row.append(value)
+        rows.append(compact_json(row))
+
+    header = [
+        f"{column}[{','.join(nested_columns[column])}]" if column in nested_columns else column
+        for column in columns
+    ]
+
+    lines = []
+    if dictionary:
+        lines.append("dict:" + compact_json({code: value for value, code in dictionary.items()}))
+    lines.append("fields:" + compact_json(header))
+    lines.extend(rows)
+    encoded = "\n".join(lines)
+
+    report = {
+        'flights': len(flights),
+        'columns': len(columns),
+        'dictionary_entries': len(dictionary),
+        'encoded_size': len(encoded)
+    }
+    return encoded, report
+
+
+def _json_data_section(total_flights: int, all_flights: list) -> str:
+    """JSON格式（默认）的航班数据块"""
+    return f"""
+## ✈️ 待分析的航班数据
+- **总计**: {total_flights} 个航班
+- **数据来源**: 多个航班搜索引擎整合
+- **搜索类型**: 包含常规航班、隐藏城市航班和智能推荐航班
+
+```json
+{{
+    "flights": {all_flights}
+}}
+```
+"""
+
+
+def _compact_data_section(total_flights: int, encoded_flights: str, language: str) -> str:
+    """紧凑列式编码的航班数据块"""
+    format_note = _compact_format_note(language)
+    return f"""
+## ✈️ 待分析的航班数据
+- **总计**: {total_flights} 个航班
+- **数据来源**: 多个航班搜索引擎整合
+- **搜索类型**: 包含常规航班、隐藏城市航班和智能推荐航班
+- **数据格式**: {format_note}
+
+```text
+{encoded_flights}
+```
+"""
+
+
+def _build_preference_section(language: str, departure_code: str, destination_code: str, user_preferences: str) -> str:
+    """用户偏好部分（没有偏好时为空）"""
+    if not user_preferences.strip():
+        return ""
+    if language == "zh":
+        return f"""
+## 🎯 本次任务的具体要求
+- **航线**: {departure_code} → {destination_code}
+- **用户偏好**: "{user_preferences}"
+- **核心任务**: 请严格依据上述偏好，对下方提供的航班数据进行筛选和分析。
+"""
+    return f"""
+## 🎯 Specifics for This Task
+- **Route**: {departure_code} → {destination_code}
+- **User Preferences**: "{user_preferences}"
+- **Core Task**: Strictly filter and analyze the flight data provided below according to these preferences.
+"""
+
+
+def _compact_format_note(language: str) -> str:
+    """紧凑列式编码的格式说明"""
+    if language == "zh":
+        return "数据采用紧凑列式编码：`fields` 行为字段名表头，之后每行是一个航班的值（顺序与表头一致）；带 `[...]` 的字段是嵌套记录列表，其子字段顺序见方括号；`dict` 行中 A0、A1… 为机场/航空公司名称的编号。"
+    return "The data uses a compact columnar encoding: the `fields` line is the header, and every following line holds one flight's values in header order. Fields written as `name[...]` are nested record lists whose sub-field order is given in brackets. In the `dict` line, A0, A1, ... stand for airport/airline names."
+
+
 def create_final_analysis_prompt(
     google_flights_data: list,
     kiwi_data: list,
@@ -227,32 +378,20 @@ def create_final_analysis_prompt(
     language: str,
     departure_code: str,
     destination_code: str,
-    user_preferences: str = ""
+    user_preferences: str = "",
+    data_format: str = "json"
 ) -> str:
     """
     组装最终的、完整的提示词。
     它调用基础指令函数，并附加动态的航班数据和用户偏好。
+
+    data_format: 'json'（默认，嵌套字典）或 'compact'（列式紧凑编码，显著减少提示词大小）
     """
     # 1. 获取静态的基础指令
     base_instructions = get_consolidated_instructions_prompt(language)
 
     # 2. 准备动态的用户偏好部分
-    preference_section = ""
-    if user_preferences.strip():
-        if language == "zh":
-            preference_section = f"""
-## 🎯 本次任务的具体要求
-- **航线**: {departure_code} → {destination_code}
-- **用户偏好**: "{user_preferences}"
-- **核心任务**: 请严格依据上述偏好，对下方提供的航班数据进行筛选和分析。
-"""
-        else:
-            preference_section = f"""
-## 🎯 Specifics for This Task
-- **Route**: {departure_code} → {destination_code}
-- **User Preferences**: "{user_preferences}"
-- **Core Task**: Strictly filter and analyze the flight data provided below according to these preferences.
-"""
+    preference_section = _build_preference_section(language, departure_code, destination_code, user_preferences)
 
     # 3. 准备动态的航班数据部分（完全隐藏数据源信息）
     # 将所有航班数据合并为统一格式，不区分来源
@@ -263,7 +402,7 @@ def create_final_analysis_prompt(
         for flight in google_flights_data:
             flight_data = flight if isinstance(flight, dict) else flight.__dict__ if hasattr(flight, '__dict__') else str(flight)
             if isinstance(flight_data, dict):
-                flight_data['search_type'] = 'regular'
+                flight_data.setdefault('search_type', 'regular')
             all_flights.append(flight_data)
 
     # 添加隐藏城市航班数据
@@ -271,7 +410,7 @@ def create_final_analysis_prompt(
         for flight in kiwi_data:
             flight_data = flight if isinstance(flight, dict) else flight.__dict__ if hasattr(flight, '__dict__') else str(flight)
             if isinstance(flight_data, dict):
-                flight_data['search_type'] = 'hidden_city'
+                flight_data.setdefault('search_type', 'hidden_city')
             all_flights.append(flight_data)
 
     # 添加AI推荐航班数据
@@ -279,22 +418,16 @@ def create_final_analysis_prompt(
         for flight in ai_data:
             flight_data = flight if isinstance(flight, dict) else flight.__dict__ if hasattr(flight, '__dict__') else str(flight)
             if isinstance(flight_data, dict):
-                flight_data['search_type'] = 'ai_recommended'
+                flight_data.setdefault('search_type', 'ai_recommended')
             all_flights.append(flight_data)
 
     total_flights = len(all_flights)
-    data_section = f"""
-## ✈️ 待分析的航班数据
-- **总计**: {total_flights} 个航班
-- **数据来源**: 多个航班搜索引擎整合
-- **搜索类型**: 包含常规航班、隐藏城市航班和智能推荐航班
-
-```json
-{{
-    "flights": {all_flights}
-}}
-```
-"""
+    encoding_report = None
+    if data_format == "compact" and all_flights:
+        encoded_flights, encoding_report = encode_flights_compact(all_flights)
+        data_section = _compact_data_section(total_flights, encoded_flights, language)
+    else:
+        data_section = _json_data_section(total_flights, all_flights)
 
     # 【增强日志】记录发送给AI的数据概览（隐藏具体数据源信息）
     import logging
@@ -302,6 +435,15 @@ def create_final_analysis_prompt(
     logger = logging.getLogger(__name__)
     logger.info(f"🔍 [提示词构建] 数据统计: 常规搜索({len(google_flights_data)}), 隐藏城市搜索({len(kiwi_data)}), AI推荐({len(ai_data)})")
     logger.info(f"📊 [提示词构建] 合并后总计: {total_flights} 个航班")
+    if encoding_report and logger.isEnabledFor(logging.INFO):
+        # 对比实际发送的数据块：JSON格式数据块只在需要输出该日志时才生成
+        json_size = len(_json_data_section(total_flights, all_flights))
+        compact_size = len(data_section)
+        reduction_percent = round((1 - compact_size / json_size) * 100, 1) if json_size > 0 else 0
+        logger.info(
+            f"📊 [提示词构建] 紧凑编码数据块: {json_size:,} → {compact_size:,} 字符 "
+            f"(减少{reduction_percent}%, 字典{encoding_report['dictionary_entries']}项)"
+        )
 
     # 测试合并后数据的JSON序列化
     if all_flights:
@@ -325,6 +467,165 @@ def create_final_analysis_prompt(
 
     return final_prompt
 
+# 分片分析（map-reduce）：数据源 → 航班类型标记（与create_final_analysis_prompt一致）
+_SOURCE_SEARCH_TYPES = {'google': 'regular', 'kiwi': 'hidden_city', 'ai': 'ai_recommended'}
+
+_SEARCH_TYPE_LABELS = {
+    'zh': {'regular': '常规航班', 'hidden_city': '隐藏城市航班', 'ai_recommended': '智能推荐航班'},
+    'en': {'regular': 'Regular flights', 'hidden_city': 'Hidden city flights', 'ai_recommended': 'Recommended flights'}
+}
+
+
+def _shard_heading(shard: dict, shard_count: int, language: str) -> str:
+    """分片标题：序号、航班类型、价格区间、航班数"""
+    search_type = _SOURCE_SEARCH_TYPES.get(shard['source'], 'regular')
+    label = _SEARCH_TYPE_LABELS['zh' if language == "zh" else 'en'][search_type]
+    flight_count = len(shard['flights'])
+    if shard.get('price_min') is not None:
+        price_range = f"{shard['price_min']:,.0f} – {shard['price_max']:,.0f}"
+    else:
+        price_range = "-"
+    if language == "zh":
+        return f"分片 {shard['index']}/{shard_count}：{label}（价格 {price_range}，{flight_count}个航班）"
+    return f"Shard {shard['index']}/{shard_count}: {label} (price {price_range}, {flight_count} flights)"
+
+
+def get_shard_instructions_prompt(language: str = "zh", max_candidates: int = 10) -> str:
+    """分片预分析的系统提示词：只提取候选航班和统计概况，不生成完整报告"""
+    if language == "zh":
+        return f"""你是'旅航AI'（FlightAI）的数据预分析模块。本次航班数据量过大，已按航班类型和价格区间拆分为多个分片，你只负责其中一个分片。你的输出会与其他分片的结果一起交给报告生成模块，因此不要生成完整报告。
+
+## 任务
+1. 合并分片内的重复航班（相同航班号、时间、航线），保留信息最全的一条。
+2. 结合用户偏好，挑选最多{max_candidates}个最有价值的候选航班，需覆盖：最便宜、总时长最短、直飞（如有）、最符合用户偏好的航班。
+3. 统计分片概况。
+
+## 输出格式（Markdown，只输出以下三部分）
+### 分片概况
+- 航班数、价格区间、总时长区间、直飞/中转数量
+### 候选航班
+表格列：`航班号 | 价格 | 舱位 | 出发时间 | 到达时间 | 总时长 | 完整路径 | 中转次数 | 类型 | 航空公司 | 入选理由`
+- 价格、时间、路径必须与原始数据完全一致，不得编造
+- 隐藏城市航班必须写出完整路径和机票实际终点
+### 数据备注
+- 数据缺失、异常、隐藏城市风险等需要报告生成模块注意的事项（没有则写"无"）
+"""
+    return f"""You are the data pre-analysis module of 'FlightAI'. The flight data for this search is too large and has been split into shards by flight type and price band; you handle exactly one shard. Your output is combined with the other shards' results by the report module, so do not write a full report.
+
+## Tasks
+1. Merge duplicate flights in the shard (same flight number, times and route), keeping the most complete record.
+2. Considering the user's preferences, select at most {max_candidates} of the most valuable candidate flights, covering: the cheapest, the shortest total duration, direct flights (if any) and the best match for the preferences.
+3. Summarize the shard.
+
+## Output Format (Markdown, only these three parts)
+### Shard Overview
+- Number of flights, price range, duration range, direct vs. connecting counts
+### Candidate Flights
+Table columns: `Flight No. | Price | Cabin | Departs | Arrives | Duration | Complete Route | Stops | Type | Airline | Reason`
+- Prices, times and routes must match the source data exactly; never invent data
+- Hidden city flights must show the complete route and the actual ticketed destination
+### Data Notes
+- Missing or abnormal data, hidden city risks and anything else the report module should know (write "None" if nothing)
+"""
+
+
+def create_shard_analysis_prompt(
+    shard: dict,
+    shard_count: int,
+    language: str,
+    departure_code: str,
+    destination_code: str,
+    user_preferences: str = "",
+    data_format: str = "json"
+) -> str:
+    """
+    组装单个分片的预分析提示词
+
+    shard: AnalysisSharder生成的分片（source、flights、price_min、price_max、index）
+    """
+    search_type = _SOURCE_SEARCH_TYPES.get(shard['source'], 'regular')
+    flights = [dict(flight, search_type=flight.get('search_type', search_type)) for flight in shard['flights']]
+
+    if data_format == "compact" and flights:
+        encoded_flights, _ = encode_flights_compact(flights)
+        data_block = f"{_compact_format_note(language)}\n\n```text\n{encoded_flights}\n```"
+    else:
+        data_block = f"```json\n{{\n    \"flights\": {flights}\n}}\n```"
+
+    preferences = user_preferences.strip()
+    if language == "zh":
+        return f"""## 🧩 {_shard_heading(shard, shard_count, language)}
+- **航线**: {departure_code} → {destination_code}
+- **用户偏好**: {f'"{preferences}"' if preferences else '无'}
+
+{data_block}
+
+---
+请按输出格式给出本分片的预分析结果。
+"""
+    return f"""## 🧩 {_shard_heading(shard, shard_count, language)}
+- **Route**: {departure_code} → {destination_code}
+- **User Preferences**: {f'"{preferences}"' if preferences else 'None'}
+
+{data_block}
+
+---
+Please return this shard's pre-analysis in the required output format.
+"""
+
+
+def create_merge_report_prompt(
+    shard_summaries: list,
+    language: str,
+    departure_code: str,
+    destination_code: str,
+    user_preferences: str = "",
+    total_flights: int = 0,
+    failed_shards: int = 0
+) -> str:
+    """
+    组装合并提示词：基于各分片的预分析结果生成完整的五板块报告
+
+    shard_summaries: [(分片, 预分析Markdown), ...]，按分片序号排列
+    """
+    base_instructions = get_consolidated_instructions_prompt(language)
+    preference_section = _build_preference_section(language, departure_code, destination_code, user_preferences)
+    shard_count = len(shard_summaries) + failed_shards
+
+    sections = "\n\n".join(
+        f"### {_shard_heading(shard, shard_count, language)}\n{summary.strip()}"
+        for shard, summary in shard_summaries
+    )
+
+    if language == "zh":
+        failed_note = f"\n- **注意**: 有{failed_shards}个分片预分析失败，请在报告中说明部分航班未纳入分析。" if failed_shards else ""
+        data_section = f"""
+## ✈️ 待分析的航班数据（分片预分析结果）
+- **总计**: {total_flights} 个航班，已按航班类型和价格区间拆分为 {shard_count} 个分片分别预分析
+- **说明**: 以下是各分片筛选出的候选航班和统计概况。请只使用这些候选航班生成报告，数据洞察中的价格、时长区间以各分片概况为准。{failed_note}
+
+{sections}
+"""
+        closing = "**AI, 请立即开始分析，并严格按照以上所有规范，生成完整的五板块Markdown报告。**"
+    else:
+        failed_note = f"\n- **Note**: {failed_shards} shard(s) failed pre-analysis; mention in the report that some flights were not covered." if failed_shards else ""
+        data_section = f"""
+## ✈️ Flight Data to Analyze (Shard Pre-analysis Results)
+- **Total**: {total_flights} flights, split into {shard_count} shards by flight type and price band and pre-analyzed separately
+- **Notes**: Below are the candidate flights and overviews selected from each shard. Build the report only from these candidates; use the shard overviews for price and duration ranges in the data insights.{failed_note}
+
+{sections}
+"""
+        closing = "**AI, start the analysis now and generate the complete five-section Markdown report, strictly following all the rules above.**"
+
+    return f"""{base_instructions}
+{preference_section}
+{data_section}
+
+---
+{closing}
+"""
+
 # 保留旧函数以兼容现有代码，但标记为已弃用
 def get_flight_processor_system_prompt(language: str = "zh") -> str:
     """获取航班数据处理的系统提示词 (已弃用，请使用 get_consolidated_instructions_prompt)"""
@@ -440,6 +440,92 @@ async def get_monitor_status(
         )
 
 
+@router.get("/ai-search-stats", response_model=APIResponse)
+async def get_ai_search_stats(
+    current_user: UserInfo = Depends(require_system_admin_permission)
+):
+    """
+    获取AI增强搜索运行指标（请求合并、数据源缓存、AI网关连接池）
+    """
+    try:
+        from ..services.ai_flight_service import get_ai_flight_service
+
+        return APIResponse(
+            success=True,
+            message="获取AI搜索指标成功",
+            data=get_ai_flight_service().get_stats()
+        )
+
+    except Exception as e:
+        logger.error(f"获取AI搜索指标失败: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="获取AI搜索指标失败"
+        )
+
+
+@router.get("/search-traces", response_model=APIResponse)
+async def get_search_traces(
+    limit: int = Query(20, ge=1, le=200),
+    current_user: UserInfo = Depends(require_system_admin_permission)
+):
+    """
+    获取AI增强搜索分阶段耗时：各阶段p50/p95/p99（按p95降序）和最近的搜索trace
+    """
+    try:
+        from ..services.search_tracing import get_search_tracer
+
+        tracer = get_search_tracer()
+        return APIResponse(
+            success=True,
+            message="获取搜索耗时记录成功",
+            data={
+                'stages': tracer.get_stage_stats(),
+                'recent': tracer.recent(limit),
+                'stats': tracer.get_stats()
+            }
+        )
+
+    except Exception as e:
+        logger.error(f"获取搜索耗时记录失败: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="获取搜索耗时记录失败"
+        )
+
+
+@router.get("/search-traces/{trace_id}", response_model=APIResponse)
+async def get_search_trace(
+    trace_id: str,
+    current_user: UserInfo = Depends(require_system_admin_permission)
+):
+    """
+    获取单次搜索的全部阶段（trace_id或异步任务ID）
+    """
+    try:
+        from ..services.search_tracing import get_search_tracer
+        from ..services.async_task_service import async_task_service
+
+        trace = get_search_tracer().get_trace(trace_id)
+        if trace is None:
+            # 异步任务的trace保存在任务记录中，可跨worker查询
+            await async_task_service.initialize()
+            trace = await async_task_service.get_task_trace(trace_id)
+        if trace is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="未找到搜索耗时记录")
+
+        return APIResponse(success=True, message="获取搜索耗时记录成功", data=trace)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"获取搜索耗时记录失败: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="获取搜索耗时记录失败"
+        )
+
+
 @router.post("/users/batch-action", response_model=APIResponse)
 async def batch_user_action(
     action_data: Dict[str, Any],
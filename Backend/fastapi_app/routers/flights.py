@@ -2,7 +2,10 @@
 FastAPI航班路由
 """
 import asyncio
+import json
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
 from loguru import logger
 from typing import Optional, Dict, Any
 from pydantic import BaseModel
@@ -11,12 +14,15 @@ from fastapi_app.models.travel import APIResponse
 from fastapi_app.models.auth import UserInfo
 from fastapi_app.models.flights import (
     FlightSearchRequest, FlightSearchResponse, MonitorDataResponse,
-    SeatClass, MaxStops, SortBy
+    SeatClass, MaxStops, SortBy, BatchFlightSearchRequest
 )
+from fastapi_app.config import settings
 from fastapi_app.dependencies.auth import get_current_active_user
-from fastapi_app.services.ai_flight_service import AIFlightService
+from fastapi_app.services.ai_flight_service import get_ai_flight_service
 from fastapi_app.services.flight_service import get_flight_service
+from fastapi_app.services.circuit_breaker import get_circuit_breaker_states
 from fastapi_app.services.async_task_service import async_task_service, TaskStatus
+from fastapi_app.services.search_tracing import get_search_tracer
 
 # 创建路由器
 router = APIRouter()
@@ -25,12 +31,19 @@ router = APIRouter()
 @router.get("/health", response_model=APIResponse)
 async def health_check():
     """
-    健康检查接口
+    健康检查接口（包含各上游数据源的熔断状态）
     """
+    providers = get_circuit_breaker_states()
+    degraded = [name for name, state in providers.items() if state['state'] != 'closed']
     return APIResponse(
         success=True,
-        message="航班服务正常",
-        data={"status": "healthy", "service": "flights"}
+        message="航班服务部分上游不可用" if degraded else "航班服务正常",
+        data={
+            "status": "degraded" if degraded else "healthy",
+            "service": "flights",
+            "degraded_providers": degraded,
+            "providers": providers
+        }
     )
 
 
@@ -352,6 +365,159 @@ async def search_flights(
         }
 
 
+@router.get("/search/flexible-dates")
+async def search_flights_flexible_dates(
+    departure_code: str = Query(..., description="出发机场代码", min_length=3, max_length=3),
+    destination_code: str = Query(..., description="目的地机场代码", min_length=3, max_length=3),
+    depart_date: str = Query(..., description="出发日期(YYYY-MM-DD)"),
+    return_date: Optional[str] = Query(None, description="返程日期(YYYY-MM-DD)"),
+    date_window: int = Query(3, description="出发日期前后浮动天数", ge=0, le=7),
+    return_offsets: Optional[str] = Query(None, description="往返时返程天数偏移，逗号分隔（如 -1,0,1），默认保持行程天数"),
+    adults: int = Query(1, description="成人数量", ge=1, le=9),
+    children: int = Query(0, description="儿童数量", ge=0, le=8),
+    infants_in_seat: int = Query(0, description="婴儿占座数量", ge=0, le=8),
+    infants_on_lap: int = Query(0, description="婴儿怀抱数量", ge=0, le=8),
+    seat_class: SeatClass = Query(SeatClass.ECONOMY, description="座位等级"),
+    max_stops: MaxStops = Query(MaxStops.ANY, description="最大中转次数"),
+    sort_by: SortBy = Query(SortBy.CHEAPEST, description="排序方式"),
+    language: str = Query("zh", description="语言设置 (zh/en)"),
+    currency: str = Query("CNY", description="货币设置 (CNY/USD)"),
+    current_user: UserInfo = Depends(get_current_active_user)
+):
+    """
+    灵活日期价格矩阵
+
+    并发查询相邻日期的最低价（复用数据源缓存，不执行AI分析），
+    用户选定日期后再调用 /search/ai-enhanced 获取完整分析
+    """
+    try:
+        logger.info(f"📅 用户 {current_user.username} 查询灵活日期价格: {departure_code} -> {destination_code}, {depart_date} ±{date_window}天")
+
+        # 验证出发地和目的地不能相同
+        if departure_code.upper() == destination_code.upper():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail='出发地和目的地不能相同'
+            )
+
+        try:
+            offsets = [int(offset) for offset in return_offsets.split(',') if offset.strip()] if return_offsets else None
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail='返程天数偏移必须是逗号分隔的整数'
+            )
+
+        flight_service = get_ai_flight_service()
+        result = await flight_service.search_flexible_dates(
+            departure_code=departure_code.upper(),
+            destination_code=destination_code.upper(),
+            depart_date=depart_date,
+            return_date=return_date,
+            date_window=date_window,
+            return_offsets=offsets,
+            adults=adults,
+            seat_class=seat_class.value,
+            children=children,
+            infants_in_seat=infants_in_seat,
+            infants_on_lap=infants_on_lap,
+            max_stops=max_stops.value,
+            sort_by=sort_by.value,
+            language=language,
+            currency=currency
+        )
+
+        return result
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"灵活日期价格查询失败: {e}")
+        return {
+            'success': False,
+            'error': str(e),
+            'message': str(e),
+            'depart_dates': [],
+            'return_offsets': [],
+            'prices': [],
+            'return_dates': [],
+            'cheapest': None
+        }
+
+
+@router.post("/search/batch")
+async def search_flights_batch(
+    request: BatchFlightSearchRequest,
+    current_user: UserInfo = Depends(get_current_active_user)
+):
+    """
+    批量多航线搜索（NDJSON流）
+
+    一次请求比较多个出发地/目的地/日期，按完成顺序每行返回一条航线结果：
+    - {"type": "route", "index": 序号, "route": 航线, "success": 是否成功, "result": 搜索结果}
+    - 最后一行: {"type": "done", "total": 航线数, "succeeded": 成功数}
+
+    mode=plain 返回Google Flights常规搜索结果，mode=ai_enhanced 返回与 /search/ai-enhanced 一致的结果
+    """
+    if len(request.routes) > settings.BATCH_SEARCH_MAX_ROUTES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'单次最多搜索{settings.BATCH_SEARCH_MAX_ROUTES}条航线'
+        )
+
+    logger.info(f"📦 用户 {current_user.username} 开始批量搜索: {len(request.routes)}条航线, 模式: {request.mode.value}")
+
+    flight_service = get_ai_flight_service()
+    routes = [route.dict() for route in request.routes]
+
+    def format_line(data: Dict[str, Any]) -> str:
+        return json.dumps(data, ensure_ascii=False, default=str) + "\n"
+
+    async def line_generator():
+        succeeded = 0
+        try:
+            async for item in flight_service.search_routes_batch(
+                routes,
+                mode=request.mode.value,
+                adults=request.passengers.adults,
+                seat_class=request.seat_class.value,
+                children=request.passengers.children,
+                infants_in_seat=request.passengers.infants_in_seat,
+                infants_on_lap=request.passengers.infants_on_lap,
+                max_stops=request.max_stops.value,
+                sort_by=request.sort_by.value,
+                language=request.language,
+                currency=request.currency,
+                user_preferences=request.user_preferences,
+                data_format=request.data_format
+            ):
+                succeeded += 1 if item['success'] else 0
+                yield format_line({'type': 'route', **item})
+        except asyncio.CancelledError:
+            # 客户端断开连接
+            logger.warning(f"批量搜索客户端已断开: {current_user.username}")
+            raise
+        except Exception as e:
+            logger.error(f"批量搜索失败: {e}")
+            yield format_line({'type': 'error', 'error': str(e)})
+
+        yield format_line({'type': 'done', 'total': len(routes), 'succeeded': succeeded})
+
+    return StreamingResponse(
+        line_generator(),
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # 禁用Nginx缓冲，确保每条结果实时送达
+        }
+    )
+
+
 @router.get("/search/comprehensive")
 async def search_flights_comprehensive(
     departure_code: str = Query(..., description="出发机场代码", min_length=3, max_length=3),
@@ -548,6 +714,7 @@ async def search_flights_ai_enhanced(
     language: str = Query("zh", description="语言设置 (zh/en)"),
     currency: str = Query("CNY", description="货币设置 (CNY/USD)"),
     user_preferences: str = Query("", description="用户偏好和要求（如：我想要最便宜的航班、希望直飞、早上出发等）"),
+    data_format: Optional[str] = Query(None, description="发送给AI的航班数据格式 (json/compact)，默认使用服务端配置", pattern="^(json|compact)$"),
     current_user: UserInfo = Depends(get_current_active_user)
 ):
     """
@@ -586,7 +753,7 @@ async def search_flights_ai_enhanced(
             )
 
         # 获取AI增强航班搜索服务
-        flight_service = AIFlightService()
+        flight_service = get_ai_flight_service()
 
         # 执行简化的AI增强搜索
         result = await flight_service.search_flights_ai_enhanced(
@@ -603,7 +770,8 @@ async def search_flights_ai_enhanced(
             sort_by=sort_by.value,
             language=language,
             currency=currency,
-            user_preferences=user_preferences
+            user_preferences=user_preferences,
+            data_format=data_format
         )
 
         logger.info(f"AI增强搜索完成: 成功={result['success']}, 总结果数={result.get('total_count', 0)}")
@@ -644,6 +812,149 @@ async def search_flights_ai_enhanced(
         }
 
 
+@router.get("/search/ai-enhanced/stream")
+async def search_flights_ai_enhanced_stream(
+    departure_code: str = Query(..., description="出发机场代码", min_length=3, max_length=3),
+    destination_code: str = Query(..., description="目的地机场代码", min_length=3, max_length=3),
+    depart_date: str = Query(..., description="出发日期(YYYY-MM-DD)"),
+    return_date: Optional[str] = Query(None, description="返程日期(YYYY-MM-DD)"),
+    adults: int = Query(1, description="成人数量", ge=1, le=9),
+    children: int = Query(0, description="儿童数量", ge=0, le=8),
+    infants_in_seat: int = Query(0, description="婴儿占座数量", ge=0, le=8),
+    infants_on_lap: int = Query(0, description="婴儿怀抱数量", ge=0, le=8),
+    seat_class: SeatClass = Query(SeatClass.ECONOMY, description="座位等级"),
+    max_stops: MaxStops = Query(MaxStops.ANY, description="最大中转次数"),
+    sort_by: SortBy = Query(SortBy.CHEAPEST, description="排序方式"),
+    language: str = Query("zh", description="语言设置 (zh/en)"),
+    currency: str = Query("CNY", description="货币设置 (CNY/USD)"),
+    user_preferences: str = Query("", description="用户偏好和要求"),
+    data_format: Optional[str] = Query(None, description="发送给AI的航班数据格式 (json/compact)，默认使用服务端配置", pattern="^(json|compact)$"),
+    current_user: UserInfo = Depends(get_current_active_user)
+):
+    """
+    流式AI增强航班搜索（Server-Sent Events）
+
+    事件类型：
+    - task: 任务ID（流式片段同时追加到异步任务结果中，断线后可通过任务接口查询）
+    - stage: 搜索阶段变化
+    - chunk: AI分析报告的Markdown片段
+    - done: 最终结果（与 /search/ai-enhanced 返回结构一致）
+    - error: 错误信息
+    """
+    if departure_code.upper() == destination_code.upper():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='出发地和目的地不能相同'
+        )
+
+    logger.info(f"🤖 用户 {current_user.username} 开始流式AI增强航班搜索: {departure_code} -> {destination_code}, {depart_date}")
+
+    # 初始化异步任务服务
+    await async_task_service.initialize()
+
+    search_params = {
+        "departure_code": departure_code.upper(),
+        "destination_code": destination_code.upper(),
+        "depart_date": depart_date,
+        "return_date": return_date,
+        "adults": adults,
+        "children": children,
+        "infants_in_seat": infants_in_seat,
+        "infants_on_lap": infants_on_lap,
+        "seat_class": seat_class.value,
+        "max_stops": max_stops.value,
+        "sort_by": sort_by.value,
+        "language": language,
+        "currency": currency,
+        "user_preferences": user_preferences,
+        "data_format": data_format
+    }
+
+    task_id = await async_task_service.create_task(
+        task_type="ai_flight_search_stream",
+        search_params=search_params,
+        user_id=current_user.id
+    )
+
+    def format_sse(event: str, data: Dict[str, Any]) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+    async def event_generator():
+        yield format_sse("task", {"task_id": task_id})
+
+        await async_task_service.update_task_status(
+            task_id,
+            TaskStatus.PROCESSING,
+            progress=0.1,
+            message="开始AI增强搜索..."
+        )
+
+        flight_service = get_ai_flight_service()
+        finished = False
+        trace_id = None
+        try:
+            async for item in flight_service.search_flights_ai_enhanced_stream(**search_params):
+                event = item['event']
+                data = item['data']
+
+                if event == 'stage':
+                    await async_task_service.update_task_status(
+                        task_id,
+                        TaskStatus.PROCESSING,
+                        progress=0.2 if data.get('stage') == 'collecting' else 0.6,
+                        message=data.get('message')
+                    )
+                elif event == 'chunk':
+                    await async_task_service.append_task_result_chunk(task_id, data['content'])
+                elif event == 'done':
+                    finished = True
+                    trace_id = data.get('trace_id')
+                    await async_task_service.save_task_result(task_id, data)
+                    await async_task_service.update_task_status(
+                        task_id,
+                        TaskStatus.COMPLETED,
+                        progress=1.0,
+                        message="AI搜索完成"
+                    )
+                elif event == 'error':
+                    finished = True
+                    await async_task_service.update_task_status(
+                        task_id,
+                        TaskStatus.FAILED,
+                        progress=0,
+                        message="搜索失败",
+                        error=data.get('error')
+                    )
+
+                yield format_sse(event, data)
+
+            # 生成器结束后trace才完成记录
+            await _save_search_trace(task_id, trace_id)
+
+        except asyncio.CancelledError:
+            # 客户端断开连接
+            logger.warning(f"流式AI搜索客户端已断开: {task_id}")
+            raise
+        finally:
+            if not finished:
+                await async_task_service.update_task_status(
+                    task_id,
+                    TaskStatus.FAILED,
+                    progress=0,
+                    message="搜索中断",
+                    error="stream interrupted"
+                )
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # 禁用Nginx缓冲，确保片段实时送达
+        }
+    )
+
+
 # ==================== 异步搜索接口 ====================
 
 class AsyncTaskResponse(BaseModel):
@@ -681,6 +992,7 @@ async def start_ai_enhanced_search_async(
     language: str = Query("zh", description="语言设置 (zh/en)"),
     currency: str = Query("CNY", description="货币设置 (CNY/USD)"),
     user_preferences: str = Query("", description="用户偏好和要求"),
+    data_format: Optional[str] = Query(None, description="发送给AI的航班数据格式 (json/compact)，默认使用服务端配置", pattern="^(json|compact)$"),
     current_user: UserInfo = Depends(get_current_active_user)
 ):
     """
@@ -709,7 +1021,8 @@ async def start_ai_enhanced_search_async(
             "sort_by": sort_by.value,
             "language": language,
             "currency": currency,
-            "user_preferences": user_preferences
+            "user_preferences": user_preferences,
+            "data_format": data_format
         }
 
         # 创建异步任务
@@ -825,15 +1138,27 @@ async def get_task_result(
 
         # 检查任务状态
         if task_info["status"] != TaskStatus.COMPLETED:
+            data = {
+                "task_id": task_id,
+                "status": task_info["status"],
+                "progress": task_info.get("progress", 0),
+                "message": task_info.get("message", "")
+            }
+
+            # 流式任务返回已生成的部分报告
+            partial_report = await async_task_service.get_task_partial_result(task_id)
+            if partial_report:
+                data["partial_report"] = partial_report
+
+            # 已完成数据源阶段的航班和预览排序
+            stage_results = await async_task_service.get_task_stage_results(task_id)
+            if stage_results:
+                data["stage_results"] = stage_results
+
             return APIResponse(
                 success=False,
                 message=f"任务尚未完成，当前状态: {task_info['status']}",
-                data={
-                    "task_id": task_id,
-                    "status": task_info["status"],
-                    "progress": task_info.get("progress", 0),
-                    "message": task_info.get("message", "")
-                }
+                data=data
             )
 
         # 获取任务结果
@@ -863,6 +1188,60 @@ async def get_task_result(
 
 # ==================== 后台任务执行函数 ====================
 
+async def _save_search_trace(task_id: str, trace_id: Optional[str]):
+    """将本worker记录的搜索trace附加到任务（合并到其他worker执行的搜索没有本地trace）"""
+    trace = get_search_tracer().get_trace(trace_id) if trace_id else None
+    if trace:
+        await async_task_service.save_task_trace(task_id, trace)
+
+
+# 数据源阶段完成时的任务提示
+_STAGE_MESSAGES = {
+    'google': '常规搜索完成',
+    'kiwi': '隐藏城市搜索完成',
+    'ai_hidden': 'AI推荐隐藏城市搜索完成'
+}
+
+
+def _build_stage_callback(task_id: str, flight_service, total_stages: int):
+    """
+    数据源阶段完成回调：立即写入清理后的航班和预览排序，并按阶段更新进度
+
+    轮询客户端在AI报告生成前即可展示最便宜的航班
+    """
+    stage_results = {
+        'completed_stages': [],
+        'counts': {},
+        'flights': {},
+        'preview': []
+    }
+    # 阶段可能同时完成，串行写入任务记录
+    lock = asyncio.Lock()
+
+    async def on_stage_complete(stage: str, flights: list):
+        async with lock:
+            stage_results['flights'][stage] = flight_service.clean_partial_stage(stage, flights)
+            stage_results['counts'][stage] = len(flights or [])
+            stage_results['completed_stages'].append(stage)
+            stage_results['preview'] = flight_service.build_partial_preview(stage_results['flights'])
+            stage_results['updated_at'] = datetime.now().isoformat()
+            await async_task_service.save_task_stage_results(task_id, stage_results)
+
+            completed = len(stage_results['completed_stages'])
+            if completed < total_stages:
+                message = f"{_STAGE_MESSAGES.get(stage, stage)}（{len(flights or [])}条），正在收集其他数据..."
+            else:
+                message = "航班数据收集完成，正在生成AI分析报告..."
+            await async_task_service.update_task_status(
+                task_id,
+                TaskStatus.PROCESSING,
+                progress=round(0.2 + 0.4 * completed / total_stages, 2),
+                message=message
+            )
+
+    return on_stage_complete
+
+
 async def _execute_ai_search_background(task_id: str, search_params: Dict[str, Any]):
     """
     后台执行AI增强搜索
@@ -878,8 +1257,8 @@ async def _execute_ai_search_background(task_id: str, search_params: Dict[str, A
             message="开始AI增强搜索..."
         )
 
-        # 创建AI搜索服务实例
-        flight_service = AIFlightService()
+        # 获取AI搜索服务实例
+        flight_service = get_ai_flight_service()
 
         # 更新进度
         await async_task_service.update_task_status(
@@ -889,6 +1268,12 @@ async def _execute_ai_search_background(task_id: str, search_params: Dict[str, A
             message="正在收集航班数据..."
         )
 
+        # 数据源阶段完成即写入分阶段结果（往返只有Google和Kiwi两个阶段）
+        on_stage_complete = None
+        if settings.PARTIAL_RESULTS_ENABLED:
+            total_stages = 2 if search_params.get("return_date") else 3
+            on_stage_complete = _build_stage_callback(task_id, flight_service, total_stages)
+
         # 执行AI增强搜索
         result = await flight_service.search_flights_ai_enhanced(
             departure_code=search_params["departure_code"],
@@ -904,11 +1289,14 @@ async def _execute_ai_search_background(task_id: str, search_params: Dict[str, A
             sort_by=search_params["sort_by"],
             language=search_params["language"],
             currency=search_params["currency"],
-            user_preferences=search_params["user_preferences"]
+            user_preferences=search_params["user_preferences"],
+            data_format=search_params.get("data_format"),
+            on_stage_complete=on_stage_complete
         )
 
-        # 保存搜索结果
+        # 保存搜索结果和分阶段耗时
         await async_task_service.save_task_result(task_id, result)
+        await _save_search_trace(task_id, result.get('trace_id'))
 
         # 更新任务状态为完成
         await async_task_service.update_task_status(
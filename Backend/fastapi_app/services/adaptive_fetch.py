@@ -0,0 +1,219 @@
+"""
+smart-flights扩展搜索自适应条数
+search_extended只有top_n参数（没有分页游标），再次请求会重新执行整个上游搜索，因此最多请求两次：
+1. 先用较小的top_n探测，达到调用方的目标（价格带内的去重行程数、经过中转机场的航班数等）即停止
+2. 返回数量少于请求数量说明上游已没有更多结果，直接停止
+3. 未达到目标时直接请求最大top_n（与原固定top_n的结果一致），不再逐步扩大
+4. 记住探测未达到目标的航线，下次直接请求最大top_n，避免重复的额外请求
+在google_flights/hidden_city线程池中并发调用，航线记录和统计由锁保护（上游请求在锁外执行）
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+from loguru import logger
+
+from fastapi_app.config import settings
+from fastapi_app.utils.price import extract_prices
+
+
+# 记录探测未达到目标的航线数量上限
+_MAX_REMEMBERED_ROUTES = 1024
+
+
+def _itinerary_key(result: Any) -> Optional[Tuple]:
+    """行程键：每个航段的 (航空公司, 航班号, 出发时间)；没有航段信息时返回None"""
+    legs = result.get('legs') if isinstance(result, dict) else getattr(result, 'legs', None)
+    if not legs:
+        return None
+
+    key = []
+    for leg in legs:
+        if isinstance(leg, dict):
+            key.append((str(leg.get('airline')), str(leg.get('flight_number')), str(leg.get('departure_datetime'))))
+        else:
+            key.append((
+                str(getattr(leg, 'airline', None)),
+                str(getattr(leg, 'flight_number', None)),
+                str(getattr(leg, 'departure_datetime', None))
+            ))
+    return tuple(key)
+
+
+# 停止条件：结果列表 → 目标完成比例（>=1表示已达到目标）
+Progress = Callable[[list], float]
+
+
+def price_band_target(target: int, band: float) -> Progress:
+    """
+    停止条件：价格不高于最低价 × (1 + band) 的去重行程达到target个
+
+    无法识别价格的结果不计入（只会导致取满最大条数，与原行为一致）
+    """
+    def progress(results: list) -> float:
+        prices = extract_prices(results)
+        valid = [price for price in prices if price == price]
+        if not valid:
+            return 0.0
+        ceiling = min(valid) * (1 + band)
+
+        seen = set()
+        count = 0
+        for result, price in zip(results, prices):
+            if not price == price or price > ceiling:
+                continue
+            key = _itinerary_key(result)
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            count += 1
+            if count >= target:
+                break
+        return count / target if target > 0 else 1.0
+
+    return progress
+
+
+def match_count_target(target: int, matches: Callable[[Any], bool]) -> Progress:
+    """停止条件：满足matches的结果达到target个"""
+    def progress(results: list) -> float:
+        count = 0
+        for result in results:
+            if matches(result):
+                count += 1
+                if count >= target:
+                    break
+        return count / target if target > 0 else 1.0
+
+    return progress
+
+
+class AdaptiveFetcher:
+    """先小条数探测、不足时直接请求最大条数的扩展搜索"""
+
+    def __init__(self, enabled: bool = True, initial_top_n: int = 30):
+        self.enabled = enabled
+        self.initial_top_n = max(1, initial_top_n)
+
+        # 航线记录和统计在多个工作线程间共享
+        self._lock = threading.Lock()
+
+        # 探测未达到目标的航线 (label, max_top_n)，下次跳过探测
+        self._full_routes: "OrderedDict[Tuple[str, int], None]" = OrderedDict()
+
+        self.stats = {
+            'fetches': 0,
+            'requests': 0,
+            'extra_requests': 0,
+            'early_stops': 0,
+            'exhausted': 0,
+            'full_fetches': 0,
+            'probe_skips': 0,
+            'results_avoided': 0
+        }
+        logger.info(f"AdaptiveFetcher初始化成功: enabled={enabled}, 探测{self.initial_top_n}条")
+
+    def fetch(
+        self,
+        search: Callable[[int], Optional[list]],
+        max_top_n: int,
+        stop_when: Optional[Progress] = None,
+        label: str = ""
+    ) -> Tuple[list, Dict[str, Any]]:
+        """
+        执行扩展搜索
+
+        Args:
+            search: 按top_n执行一次search_extended
+            max_top_n: 最大top_n（未满足停止条件时与原固定top_n一致）
+            stop_when: 停止条件（返回目标完成比例），为None或未启用自适应时直接请求max_top_n
+            label: 航线标识（用于日志和记住需要完整请求的航线）
+
+        Returns:
+            (结果列表, 报告)
+        """
+        route = (label, max_top_n)
+        with self._lock:
+            self.stats['fetches'] += 1
+            if not self.enabled or stop_when is None or self.initial_top_n >= max_top_n:
+                skip_reason = 'disabled'
+            elif label and route in self._full_routes:
+                # 该航线上次探测未达到目标，直接请求最大条数
+                self._full_routes.move_to_end(route)
+                self.stats['probe_skips'] += 1
+                skip_reason = 'remembered'
+            else:
+                skip_reason = None
+                self.stats['requests'] += 1
+
+        if skip_reason:
+            return self._fetch_full(search, max_top_n, 1, skip_reason)
+
+        results = search(self.initial_top_n) or []
+
+        if len(results) < self.initial_top_n:
+            stopped = 'exhausted'
+        elif stop_when(results) >= 1:
+            stopped = 'target_reached'
+        else:
+            # 没有分页游标，再次请求会重新执行整个搜索：不逐步扩大，直接请求最大条数
+            stopped = None
+
+        with self._lock:
+            if stopped == 'exhausted':
+                self.stats['exhausted'] += 1
+            elif stopped == 'target_reached':
+                self.stats['early_stops'] += 1
+                self.stats['results_avoided'] += max_top_n - self.initial_top_n
+            else:
+                self.stats['extra_requests'] += 1
+                if label:
+                    self._remember_full_route(route)
+
+        if stopped is None:
+            return self._fetch_full(search, max_top_n, 2, 'max_top_n')
+
+        logger.debug(f"📄 [自适应条数] {label} 探测后停止({stopped}): top_n={self.initial_top_n}, {len(results)}个结果")
+        return results, {'requests': 1, 'top_n': self.initial_top_n, 'stopped': stopped}
+
+    def _fetch_full(self, search: Callable[[int], Optional[list]], max_top_n: int, requests: int, stopped: str):
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['full_fetches'] += 1
+        results = search(max_top_n) or []
+        return results, {'requests': requests, 'top_n': max_top_n, 'stopped': stopped}
+
+    def _remember_full_route(self, route: Tuple[str, int]):
+        """记住需要完整请求的航线（调用方需持有锁）"""
+        self._full_routes[route] = None
+        self._full_routes.move_to_end(route)
+        while len(self._full_routes) > _MAX_REMEMBERED_ROUTES:
+            self._full_routes.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取自适应条数统计信息"""
+        with self._lock:
+            stats = dict(self.stats)
+            remembered_routes = len(self._full_routes)
+        fetches = stats['fetches']
+        return {
+            **stats,
+            'remembered_routes': remembered_routes,
+            'early_stop_rate': stats['early_stops'] / fetches if fetches > 0 else 0,
+            'extra_request_rate': stats['extra_requests'] / fetches if fetches > 0 else 0
+        }
+
+
+# 全局自适应条数实例
+_adaptive_fetcher: Optional[AdaptiveFetcher] = None
+
+
+def get_adaptive_fetcher() -> AdaptiveFetcher:
+    """获取自适应条数实例（单例模式）"""
+    global _adaptive_fetcher
+    if _adaptive_fetcher is None:
+        _adaptive_fetcher = AdaptiveFetcher(
+            enabled=settings.GOOGLE_ADAPTIVE_FETCH_ENABLED,
+            initial_top_n=settings.GOOGLE_ADAPTIVE_INITIAL_TOP_N
+        )
+    return _adaptive_fetcher
@@ -95,9 +95,29 @@ if current_platform == "Windows":
         print("⚠️ 回退到完全禁用SSL验证模式")
 # 现在进行正常的导入
 import asyncio
-from typing import List, Dict, Any, Optional
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
 from loguru import logger
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from fastapi_app.config import settings
+from fastapi_app.services.search_coalescer import StageCallback, get_search_coalescer
+from fastapi_app.services.ai_gateway_client import get_ai_gateway_client
+from fastapi_app.services.provider_cache import (
+    get_provider_cache, get_suggestion_cache, to_plain_data,
+    begin_data_age_tracking, get_tracked_data_age
+)
+from fastapi_app.services.report_cache import get_report_cache
+from fastapi_app.services.model_latency import get_model_latency_tracker
+from fastapi_app.services.circuit_breaker import get_circuit_breaker, get_circuit_breaker_states
+from fastapi_app.services.executor_pools import ExecutorPoolFullError, get_executor_pool, get_executor_pool_stats
+from fastapi_app.utils.price import extract_prices, filter_by_price, min_price as get_min_price, sort_by_price
+from fastapi_app.services.flight_deduplicator import get_flight_deduplicator
+from fastapi_app.services.flight_ranker import get_flight_ranker
+from fastapi_app.services.analysis_sharder import get_analysis_sharder
+from fastapi_app.services.adaptive_fetch import get_adaptive_fetcher, match_count_target, price_band_target
+from fastapi_app.services.route_graph import get_route_graph
+from fastapi_app.services.search_tracing import finish_trace, get_search_tracer, record_span, start_trace, trace_span
 
 # 检查smart-flights库是否可用
 try:
@@ -125,6 +145,96 @@ except Exception as e:
     SMART_FLIGHTS_AVAILABLE = False
     logger.warning(f"smart-flights初始化失败: {e}")
 
+# 发送给AI前各数据源需要保留的字段（按数据源预先计算的投影）
+_CLEAN_USEFUL_FIELDS = {
+    'kiwi': (
+        # 基本信息
+        'source', 'price', 'currency', 'currency_symbol',
+        # 时间信息
+        'departure_time', 'arrival_time', 'duration_formatted', 'duration_minutes',
+        # 机场信息
+        'departure_airport', 'departure_airport_name',
+        'arrival_airport', 'arrival_airport_name',
+        # 航空公司信息
+        'carrier_name', 'carrier_code', 'flight_number',
+        # 路线信息
+        'route_path', 'route_description', 'segment_count', 'route_segments',
+        # 航班类型
+        'flight_type', 'flight_type_description', 'is_hidden_city',
+        # 隐藏城市信息
+        'hidden_destination_code', 'hidden_destination_name', 'is_throwaway',
+        # 标准化字段
+        'airline', 'origin', 'destination', 'price_numeric'
+    ),
+    'google': (
+        # 保留Google Flights的核心字段
+        'price', 'currency', 'stops', 'legs',
+        # 航空公司信息（如果有值）
+        'airline', 'flightNumber',
+        # 时间信息（如果有值）
+        'departureTime', 'arrivalTime', 'duration',
+        # 直飞标识
+        'isDirect', 'stopsText',
+        # 机场信息
+        'departure_airport', 'arrival_airport'
+    ),
+    'ai': (
+        # 保留AI推荐数据的主要字段
+        'airline', 'flightNumber', 'departureTime', 'arrivalTime',
+        'duration', 'stops', 'isDirect', 'stopsText', 'price', 'currency',
+        'legs', 'departure_airport', 'arrival_airport', 'total_price',
+        'hidden_city_info', 'is_hidden_city', 'ai_recommended'
+    )
+}
+
+# 无用字段列表（这些字段会被明确移除，优先级高于有用字段）
+_CLEAN_USELESS_FIELDS = frozenset({
+    # Kiwi数据的无用字段
+    'id',  # 长串编码ID，对AI分析无用
+    '_original_data',  # 原始数据备份，占用大量空间
+    'price_eur',  # 欧元价格，通常不需要
+    'trip_type',  # 行程类型，通常是固定值
+    'duration',  # 秒数格式的持续时间，有duration_formatted就够了（仅Kiwi，见_CLEAN_USELESS_FIELDS_BY_TYPE）
+
+    # Google Flights数据的无用字段
+    'price_amount',  # 重复的价格字段
+    'departureDateTime',  # ISO格式时间，有departureTime就够了
+    'arrivalDateTime',  # ISO格式时间，有arrivalTime就够了
+    'layovers',  # 中转信息，通常为空或冗余
+    'raw_data',  # 调试用的原始数据
+    'type',  # 数据类型信息，对AI无用
+    'error',  # 错误信息，对AI分析无用
+    'total_price',  # 重复的价格字段，有price就够了
+
+    # 通用无用字段
+    'hidden_city_info',  # 如果为None则无用
+})
+
+# 按数据类型的无用字段：Google和AI推荐数据的duration是含中转的总行程时间，不是Kiwi的秒数，需要保留
+_CLEAN_USELESS_FIELDS_BY_TYPE = {
+    'google': _CLEAN_USELESS_FIELDS - {'duration'},
+    'ai': _CLEAN_USELESS_FIELDS - {'duration'}
+}
+
+# 最终投影：有用字段去掉该数据类型的无用字段
+_CLEAN_PROJECTION_SPECS = {
+    data_type: tuple(
+        field for field in fields
+        if field not in _CLEAN_USELESS_FIELDS_BY_TYPE.get(data_type, _CLEAN_USELESS_FIELDS)
+    )
+    for data_type, fields in _CLEAN_USEFUL_FIELDS.items()
+}
+
+# 分阶段结果：数据收集阶段 -> 清理数据类型（预览按此顺序合并，保证结果确定）
+_PARTIAL_STAGE_TYPES = {
+    'google': 'google',
+    'kiwi': 'kiwi',
+    'ai_hidden': 'ai'
+}
+
+# 分片分析报告的缓存键模型标记（按完整提示词缓存，与单轮对话的报告区分）
+_MAP_REDUCE_CACHE_MODEL = "gemini-2.5-pro:map_reduce"
+
 
 class AIFlightService:
     """AI增强航班搜索服务 - 专注于智能搜索和AI数据处理"""
@@ -134,10 +244,42 @@ class AIFlightService:
             'total_requests': 0,
             'successful_requests': 0,
             'cache_hits': 0,
-            'cache_misses': 0
+            'cache_misses': 0,
+            'hidden_city_candidates': 0,
+            'hidden_city_timeouts': 0,
+            'hedged_requests': 0,
+            'hedge_wins': 0,
+            'size_routed_requests': 0,
+            'flexible_date_searches': 0,
+            'batch_searches': 0,
+            'route_graph_suggestions': 0,
+            'map_reduce_requests': 0,
+            'map_reduce_shard_failures': 0,
+            'map_reduce_fallbacks': 0
         }
+        self._batch_semaphore: Optional[asyncio.Semaphore] = None
         logger.info("AIFlightService初始化成功")
 
+    def get_stats(self) -> Dict[str, Any]:
+        """获取服务统计信息（包含并发请求合并的等待者统计和数据源缓存命中率）"""
+        return {
+            **self.stats,
+            'coalescing': get_search_coalescer().get_stats(),
+            'provider_cache': get_provider_cache().get_stats(),
+            'hidden_city_suggestions': get_suggestion_cache().get_stats(),
+            'ai_gateway': get_ai_gateway_client().get_stats(),
+            'dedup': get_flight_deduplicator().get_stats(),
+            'prerank': get_flight_ranker().get_stats(),
+            'map_reduce': get_analysis_sharder().get_stats(),
+            'adaptive_fetch': get_adaptive_fetcher().get_stats(),
+            'route_graph': get_route_graph().get_stats(),
+            'search_tracing': get_search_tracer().get_stats(),
+            'report_cache': get_report_cache().get_stats(),
+            'model_latency': get_model_latency_tracker().get_stats(),
+            'circuit_breakers': get_circuit_breaker_states(),
+            'executor_pools': get_executor_pool_stats()
+        }
+
     async def search_flights_ai_enhanced(
         self,
         departure_code: str,
@@ -153,82 +295,117 @@ class AIFlightService:
         sort_by: str = "CHEAPEST",
         language: str = "zh",
         currency: str = "CNY",
-        user_preferences: str = ""
+        user_preferences: str = "",
+        data_format: str = None,
+        on_stage_complete: Optional[StageCallback] = None
+    ) -> dict:
+        """
+        AI增强航班搜索（入口）
+
+        相同参数的并发请求会被合并，只执行一次完整的三阶段搜索和AI分析，
+        所有等待者共享同一个结果（跨worker通过Redis租约协调）
+
+        on_stage_complete: 可选，每个数据源阶段完成时回调；合并到进行中搜索的请求（含其他worker上的搜索）
+            先收到已完成的阶段，之后随执行者同步收到
+        """
+        search_params = {
+            'departure_code': departure_code,
+            'destination_code': destination_code,
+            'depart_date': depart_date,
+            'return_date': return_date,
+            'adults': adults,
+            'seat_class': seat_class,
+            'children': children,
+            'infants_in_seat': infants_in_seat,
+            'infants_on_lap': infants_on_lap,
+            'max_stops': max_stops,
+            'sort_by': sort_by,
+            'language': language,
+            'currency': currency,
+            'user_preferences': user_preferences,
+            'data_format': data_format or settings.AI_PROMPT_DATA_FORMAT
+        }
+
+        self.stats['total_requests'] += 1
+        coalescer = get_search_coalescer()
+        result = await coalescer.run(
+            search_params,
+            lambda publish_stage: self._execute_ai_enhanced_search(**search_params, on_stage_complete=publish_stage),
+            on_stage=on_stage_complete
+        )
+
+        if result.get('success'):
+            self.stats['successful_requests'] += 1
+        return result
+
+    async def _execute_ai_enhanced_search(
+        self,
+        departure_code: str,
+        destination_code: str,
+        depart_date: str,
+        return_date: str = None,
+        adults: int = 1,
+        seat_class: str = "ECONOMY",
+        children: int = 0,
+        infants_in_seat: int = 0,
+        infants_on_lap: int = 0,
+        max_stops: str = "ANY",
+        sort_by: str = "CHEAPEST",
+        language: str = "zh",
+        currency: str = "CNY",
+        user_preferences: str = "",
+        data_format: str = "json",
+        on_stage_complete: Optional[StageCallback] = None
     ) -> dict:
         """
         AI增强航班搜索：
         1. 收集三阶段原始数据
         2. 交给AI处理
         3. 返回Markdown报告
+
+        各阶段耗时记录在同一条搜索trace中，结果中的trace_id可用于查询
         """
+        trace = start_trace(
+            'ai_search',
+            route=f"{departure_code}-{destination_code}",
+            depart_date=depart_date,
+            return_date=return_date
+        )
+        trace_status = 'error'
         try:
             logger.info(f"🚀 开始AI增强航班搜索: {departure_code} → {destination_code}, {depart_date}")
 
-            # 根据行程类型决定搜索阶段
-            is_roundtrip = return_date is not None
-
-            if is_roundtrip:
-                # 往返航班：只执行前两个阶段（Google Flights + Kiwi）
-                logger.info("🚀 开始并行执行两阶段搜索（往返航班）")
-
-                tasks = [
-                    # 阶段1: 获取Google Flights原始数据
-                    self._get_google_raw_data(
-                        departure_code, destination_code, depart_date, return_date,
-                        adults, seat_class, children, infants_in_seat, infants_on_lap,
-                        max_stops, sort_by, language, currency
-                    ),
-                    # 阶段2: 获取Kiwi航班原始数据（包含隐藏城市和常规航班）
-                    self._get_kiwi_raw_data(
-                        departure_code, destination_code, depart_date, return_date, adults, seat_class, language, currency
-                    )
-                ]
-
-                # 并行执行两个搜索任务
-                google_flights_raw, kiwi_flights_raw = await asyncio.gather(*tasks)
-                ai_flights_raw = []  # 往返航班不使用AI推荐隐藏城市
-
-                logger.info(f"两阶段原始数据收集完成: Google({len(google_flights_raw)}), Kiwi({len(kiwi_flights_raw)})")
-            else:
-                # 单程航班：执行完整的三阶段搜索
-                logger.info("🚀 开始并行执行三阶段搜索（单程航班）")
-
-                tasks = [
-                    # 阶段1: 获取Google Flights原始数据
-                    self._get_google_raw_data(
-                        departure_code, destination_code, depart_date, return_date,
-                        adults, seat_class, children, infants_in_seat, infants_on_lap,
-                        max_stops, sort_by, language, currency
-                    ),
-                    # 阶段2: 获取Kiwi航班原始数据（包含隐藏城市和常规航班）
-                    self._get_kiwi_raw_data(
-                        departure_code, destination_code, depart_date, return_date, adults, seat_class, language, currency
-                    ),
-                    # 阶段3: 获取AI推荐的隐藏城市原始数据
-                    self._get_ai_hidden_raw_data(
-                        departure_code, destination_code, depart_date, return_date, adults, seat_class, language, currency
-                    )
-                ]
-
-                # 并行执行所有搜索任务
-                google_flights_raw, kiwi_flights_raw, ai_flights_raw = await asyncio.gather(*tasks)
+            google_flights_raw, kiwi_flights_raw, ai_flights_raw = await self._collect_raw_flight_data(
+                departure_code, destination_code, depart_date, return_date,
+                adults, seat_class, children, infants_in_seat, infants_on_lap,
+                max_stops, sort_by, language, currency,
+                on_stage_complete=on_stage_complete
+            )
 
             # 交给AI处理
             logger.info("🤖 将原始数据交给AI处理")
-            ai_processed_result = await self._process_flights_with_ai(
-                google_flights=google_flights_raw,
-                kiwi_flights=kiwi_flights_raw,
-                ai_flights=ai_flights_raw,
-                language=language,
-                departure_code=departure_code,
-                destination_code=destination_code,
-                user_preferences=user_preferences
-            )
+            with trace_span('ai_processing') as span:
+                ai_processed_result = await self._process_flights_with_ai(
+                    google_flights=google_flights_raw,
+                    kiwi_flights=kiwi_flights_raw,
+                    ai_flights=ai_flights_raw,
+                    language=language,
+                    departure_code=departure_code,
+                    destination_code=destination_code,
+                    user_preferences=user_preferences,
+                    data_format=data_format
+                )
+                span.set(
+                    success=bool(ai_processed_result.get('success')),
+                    report_chars=len(ai_processed_result.get('ai_analysis_report') or '')
+                )
 
             if ai_processed_result['success']:
                 logger.info("✅ AI处理成功，生成详细分析报告")
+                trace_status = 'ok'
                 return {
                     'success': True,
+                    'trace_id': trace.trace_id if trace else None,
                     'data': {'itineraries': []},  # 不返回原始航班数据
                     'flights': [],  # 用户只需查看AI分析报告
                     'ai_analysis_report': ai_processed_result.get('ai_analysis_report', ''),
@@ -250,6 +427,7 @@ class AIFlightService:
                 logger.error(f"AI处理失败: {ai_processed_result.get('error', '未知错误')}")
                 return {
                     'success': False,
+                    'trace_id': trace.trace_id if trace else None,
                     'error': ai_processed_result.get('error', 'AI处理失败'),
                     'data': {'itineraries': []},
                     'flights': [],
@@ -261,12 +439,511 @@ class AIFlightService:
             logger.error(f"AI增强航班搜索失败: {e}")
             return {
                 'success': False,
+                'trace_id': trace.trace_id if trace else None,
                 'error': str(e),
                 'data': {'itineraries': []},
                 'flights': [],
                 'ai_analysis_report': '',
                 'total_count': 0
             }
+        finally:
+            finish_trace(trace, trace_status)
+
+    async def search_flexible_dates(
+        self,
+        departure_code: str,
+        destination_code: str,
+        depart_date: str,
+        return_date: str = None,
+        date_window: int = 3,
+        return_offsets: Optional[List[int]] = None,
+        adults: int = 1,
+        seat_class: str = "ECONOMY",
+        children: int = 0,
+        infants_in_seat: int = 0,
+        infants_on_lap: int = 0,
+        max_stops: str = "ANY",
+        sort_by: str = "CHEAPEST",
+        language: str = "zh",
+        currency: str = "CNY"
+    ) -> Dict[str, Any]:
+        """
+        灵活日期价格矩阵：查询出发日期±N天（往返时叠加返程天数偏移）每组日期的最低价
+
+        只执行Google Flights常规搜索并复用数据源缓存，不调用AI；
+        用户选定日期后再执行AI增强搜索，相同日期的Google数据直接命中缓存
+
+        Args:
+            date_window: 出发日期前后浮动天数
+            return_offsets: 往返时返程相对原行程天数的偏移（默认[0]，即保持行程天数）
+
+        Raises:
+            ValueError: 日期格式错误或查询的日期组合超过上限
+        """
+        start_time = time.time()
+        self.stats['flexible_date_searches'] += 1
+
+        base_depart = datetime.strptime(depart_date, "%Y-%m-%d").date()
+        trip_days = None
+        if return_date:
+            trip_days = (datetime.strptime(return_date, "%Y-%m-%d").date() - base_depart).days
+            if trip_days < 0:
+                raise ValueError("返程日期不能早于出发日期")
+
+        date_window = max(0, min(date_window, settings.FLEXIBLE_DATE_MAX_WINDOW))
+        today = datetime.now().date()
+        depart_dates = [
+            base_depart + timedelta(days=offset)
+            for offset in range(-date_window, date_window + 1)
+            if base_depart + timedelta(days=offset) >= today
+        ]
+        offsets = sorted(set(return_offsets or [0])) if trip_days is not None else []
+
+        cell_count = len(depart_dates) * max(1, len(offsets))
+        if cell_count == 0:
+            raise ValueError("没有可查询的出发日期")
+        if cell_count > settings.FLEXIBLE_DATE_MAX_CELLS:
+            raise ValueError(f"日期组合过多: {cell_count} > {settings.FLEXIBLE_DATE_MAX_CELLS}")
+
+        logger.info(f"📅 [灵活日期] {departure_code} → {destination_code}: {len(depart_dates)}个出发日期 × {max(1, len(offsets))}个返程偏移")
+
+        semaphore = asyncio.Semaphore(settings.FLEXIBLE_DATE_CONCURRENCY)
+
+        async def lookup_cheapest(cell_depart: str, cell_return: Optional[str]) -> Optional[float]:
+            async with semaphore:
+                try:
+                    flights = await asyncio.wait_for(
+                        self._get_google_raw_data(
+                            departure_code, destination_code, cell_depart, cell_return,
+                            adults, seat_class, children, infants_in_seat, infants_on_lap,
+                            max_stops, sort_by, language, currency
+                        ),
+                        timeout=settings.FLEXIBLE_DATE_CELL_TIMEOUT
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning(f"⏱️ [灵活日期] {cell_depart}/{cell_return or '-'} 查询超时")
+                    return None
+            return get_min_price(extract_prices(flights, fields=('price',)), default=None)
+
+        # 构建日期组合：行为出发日期，列为返程偏移（单程只有一列）
+        cells = []
+        for cell_depart in depart_dates:
+            row = []
+            for offset in offsets or [None]:
+                cell_return = None
+                if offset is not None:
+                    return_day = cell_depart + timedelta(days=trip_days + offset)
+                    if return_day < cell_depart:
+                        row.append(None)
+                        continue
+                    cell_return = return_day.isoformat()
+                row.append((cell_depart.isoformat(), cell_return))
+            cells.append(row)
+
+        pending = [cell for row in cells for cell in row if cell is not None]
+        prices = await asyncio.gather(*(lookup_cheapest(*cell) for cell in pending))
+        price_by_cell = dict(zip(pending, prices))
+
+        cheapest = None
+        for cell, price in price_by_cell.items():
+            if price is not None and (cheapest is None or price < cheapest['price']):
+                cheapest = {'depart_date': cell[0], 'return_date': cell[1], 'price': price}
+
+        elapsed = time.time() - start_time
+        priced_cells = sum(1 for price in prices if price is not None)
+        logger.info(f"📅 [灵活日期] 完成: {priced_cells}/{len(pending)}个日期组合有价格, 耗时{elapsed:.2f}秒")
+
+        return {
+            'success': True,
+            'departure_code': departure_code,
+            'destination_code': destination_code,
+            'currency': currency,
+            'depart_dates': [day.isoformat() for day in depart_dates],
+            'return_offsets': offsets,
+            # prices[i][j]: 第i个出发日期、第j个返程偏移的最低价（无结果为None）
+            'prices': [[price_by_cell.get(cell) if cell else None for cell in row] for row in cells],
+            'return_dates': [[cell[1] if cell else None for cell in row] for row in cells] if offsets else [],
+            'cheapest': cheapest,
+            'total_cells': len(pending),
+            'priced_cells': priced_cells,
+            'search_time': datetime.now().isoformat(),
+            'processing_time': elapsed
+        }
+
+    async def search_routes_batch(
+        self,
+        routes: List[Dict[str, Any]],
+        mode: str = "plain",
+        adults: int = 1,
+        seat_class: str = "ECONOMY",
+        children: int = 0,
+        infants_in_seat: int = 0,
+        infants_on_lap: int = 0,
+        max_stops: str = "ANY",
+        sort_by: str = "CHEAPEST",
+        language: str = "zh",
+        currency: str = "CNY",
+        user_preferences: str = "",
+        data_format: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        批量多航线搜索，按完成顺序逐条返回结果
+
+        所有批量请求共享同一个并发上限；同一批次中相同的航线只搜索一次，
+        不同批次/单条搜索之间通过数据源缓存和并发请求合并共享结果
+
+        Args:
+            routes: 航线列表，每项包含 departure_code、destination_code、depart_date、return_date
+            mode: plain（Google Flights常规搜索）或 ai_enhanced（完整AI增强搜索）
+
+        Yields:
+            {'index': 航线在请求中的序号, 'route': 航线, 'success': 是否成功, 'result': 搜索结果}
+        """
+        self.stats['batch_searches'] += 1
+        semaphore = self._get_batch_semaphore()
+
+        common_params = {
+            'adults': adults, 'seat_class': seat_class, 'children': children,
+            'infants_in_seat': infants_in_seat, 'infants_on_lap': infants_on_lap,
+            'max_stops': max_stops, 'sort_by': sort_by,
+            'language': language, 'currency': currency
+        }
+
+        # 航线 -> 请求中的序号列表
+        route_indexes: Dict[tuple, List[int]] = {}
+        for index, route in enumerate(routes):
+            key = (route['departure_code'], route['destination_code'], route['depart_date'], route.get('return_date'))
+            route_indexes.setdefault(key, []).append(index)
+
+        logger.info(f"📦 [批量搜索] {len(routes)}条航线（去重后{len(route_indexes)}条），模式: {mode}")
+
+        async def run_route(key: tuple) -> tuple:
+            departure_code, destination_code, depart_date, return_date = key
+            async with semaphore:
+                try:
+                    if mode == "ai_enhanced":
+                        result = await self.search_flights_ai_enhanced(
+                            departure_code, destination_code, depart_date, return_date,
+                            user_preferences=user_preferences, data_format=data_format, **common_params
+                        )
+                    else:
+                        result = await self._search_route_plain(
+                            departure_code, destination_code, depart_date, return_date, **common_params
+                        )
+                except Exception as e:
+                    logger.error(f"❌ [批量搜索] {departure_code} → {destination_code} {depart_date} 失败: {e}")
+                    result = {'success': False, 'error': str(e), 'flights': [], 'total_count': 0}
+            return key, result
+
+        tasks = [asyncio.create_task(run_route(key)) for key in route_indexes]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                key, result = await next_done
+                for index in route_indexes[key]:
+                    yield {
+                        'index': index,
+                        'route': {
+                            'departure_code': key[0],
+                            'destination_code': key[1],
+                            'depart_date': key[2],
+                            'return_date': key[3]
+                        },
+                        'success': bool(result.get('success')),
+                        'result': result
+                    }
+        finally:
+            # 客户端断开时取消尚未完成的航线
+            for task in tasks:
+                task.cancel()
+
+    def _get_batch_semaphore(self) -> asyncio.Semaphore:
+        """所有批量搜索共享的航线并发上限"""
+        if self._batch_semaphore is None:
+            self._batch_semaphore = asyncio.Semaphore(settings.BATCH_SEARCH_CONCURRENCY)
+        return self._batch_semaphore
+
+    async def _search_route_plain(
+        self,
+        departure_code: str,
+        destination_code: str,
+        depart_date: str,
+        return_date: str = None,
+        **search_params
+    ) -> Dict[str, Any]:
+        """单条航线的Google Flights常规搜索（复用数据源缓存），按价格排序"""
+        start_time = time.time()
+        flights = await self._get_google_raw_data(
+            departure_code, destination_code, depart_date, return_date, **search_params
+        )
+        flights = sort_by_price(flights, fields=('price',))
+        self._observe_routes(flights)
+
+        return {
+            'success': True,
+            'flights': flights,
+            'total_count': len(flights),
+            'min_price': get_min_price(extract_prices(flights, fields=('price',)), default=None),
+            'search_info': {
+                'source': 'smart-flights',
+                'search_time': datetime.now().isoformat(),
+                'departure_code': departure_code,
+                'destination_code': destination_code,
+                'depart_date': depart_date,
+                'return_date': return_date,
+                'processing_time': time.time() - start_time
+            }
+        }
+
+    async def search_flights_ai_enhanced_stream(
+        self,
+        departure_code: str,
+        destination_code: str,
+        depart_date: str,
+        return_date: str = None,
+        adults: int = 1,
+        seat_class: str = "ECONOMY",
+        children: int = 0,
+        infants_in_seat: int = 0,
+        infants_on_lap: int = 0,
+        max_stops: str = "ANY",
+        sort_by: str = "CHEAPEST",
+        language: str = "zh",
+        currency: str = "CNY",
+        user_preferences: str = "",
+        data_format: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        流式AI增强航班搜索
+
+        依次产出事件字典：
+        - {'event': 'stage', 'data': {...}}   搜索阶段变化
+        - {'event': 'chunk', 'data': {'content': str}}   Markdown报告片段
+        - {'event': 'done', 'data': {...}}    与非流式接口相同结构的最终结果
+        - {'event': 'error', 'data': {'error': str}}   报告流中途断开时附带 partial=True（已输出的片段不完整）
+        """
+        self.stats['total_requests'] += 1
+        trace = start_trace(
+            'ai_search_stream',
+            route=f"{departure_code}-{destination_code}",
+            depart_date=depart_date,
+            return_date=return_date
+        )
+        trace_status = 'error'
+        try:
+            logger.info(f"🚀 开始流式AI增强航班搜索: {departure_code} → {destination_code}, {depart_date}")
+            yield {'event': 'stage', 'data': {'stage': 'collecting', 'message': '正在收集航班数据...'}}
+
+            google_flights, kiwi_flights, ai_flights = await self._collect_raw_flight_data(
+                departure_code, destination_code, depart_date, return_date,
+                adults, seat_class, children, infants_in_seat, infants_on_lap,
+                max_stops, sort_by, language, currency
+            )
+            ai_flights = self._limit_ai_flights(ai_flights)
+
+            source_counts = {
+                'regular_search': len(google_flights),
+                'hidden_city_search': len(kiwi_flights),
+                'ai_analysis': len(ai_flights)
+            }
+            yield {
+                'event': 'stage',
+                'data': {'stage': 'analyzing', 'message': '正在生成AI分析报告...', 'source_counts': source_counts}
+            }
+
+            report_parts = []
+            summary = {
+                'markdown_format': True,
+                'processing_method': 'streaming'
+            }
+
+            if sum(source_counts.values()) == 0:
+                logger.warning("⚠️ [AI处理] 所有数据源都为空，无法进行AI分析")
+                empty_report = '## 搜索结果\n\n抱歉，未找到符合条件的航班。请尝试调整搜索条件。'
+                report_parts.append(empty_report)
+                summary['processing_method'] = 'empty_data'
+                yield {'event': 'chunk', 'data': {'content': empty_report}}
+            else:
+                data_format = data_format or settings.AI_PROMPT_DATA_FORMAT
+                prompt, cleaned_by_source = self._build_analysis_inputs(
+                    google_flights, kiwi_flights, ai_flights,
+                    language, departure_code, destination_code, user_preferences,
+                    data_format
+                )
+
+                stream_state = {}
+                async for model_used, content in self._stream_analysis_report(
+                    prompt, cleaned_by_source, language,
+                    departure_code, destination_code, user_preferences, data_format, summary,
+                    stream_state
+                ):
+                    summary['model_used'] = model_used
+                    summary['fallback_used'] = model_used != "gemini-2.5-pro"
+                    report_parts.append(content)
+                    yield {'event': 'chunk', 'data': {'content': content}}
+
+                if not report_parts:
+                    logger.error("❌ 所有模型流式处理失败")
+                    yield {'event': 'error', 'data': {'error': 'AI处理失败'}}
+                    return
+
+                if not stream_state.get('completed'):
+                    # 已输出的片段无法撤回，报告不完整时不能按成功结束
+                    logger.error(f"❌ AI报告流中途断开，已输出 {len(report_parts)} 个片段")
+                    yield {'event': 'error', 'data': {'error': 'AI报告生成中断', 'partial': True}}
+                    return
+
+            self.stats['successful_requests'] += 1
+            trace_status = 'ok'
+            yield {
+                'event': 'done',
+                'data': {
+                    'success': True,
+                    'trace_id': trace.trace_id if trace else None,
+                    'data': {'itineraries': []},
+                    'flights': [],
+                    'ai_analysis_report': ''.join(report_parts).strip(),
+                    'ai_processing': {
+                        'success': True,
+                        'summary': summary,
+                        'processing_info': {
+                            'source_counts': source_counts,
+                            'processed_at': datetime.now().isoformat(),
+                            'language': language,
+                            'processor': 'ai_markdown_stream',
+                            'user_preferences': user_preferences,
+                            'format': 'markdown'
+                        }
+                    },
+                    'total_count': 0
+                }
+            }
+
+        except Exception as e:
+            logger.error(f"流式AI增强航班搜索失败: {e}")
+            yield {'event': 'error', 'data': {'error': str(e)}}
+        finally:
+            finish_trace(trace, trace_status)
+
+    async def _collect_raw_flight_data(
+        self,
+        departure_code: str,
+        destination_code: str,
+        depart_date: str,
+        return_date: str = None,
+        adults: int = 1,
+        seat_class: str = "ECONOMY",
+        children: int = 0,
+        infants_in_seat: int = 0,
+        infants_on_lap: int = 0,
+        max_stops: str = "ANY",
+        sort_by: str = "CHEAPEST",
+        language: str = "zh",
+        currency: str = "CNY",
+        on_stage_complete: Optional[StageCallback] = None
+    ) -> tuple:
+        """
+        并行收集各阶段原始数据
+
+        Args:
+            on_stage_complete: 可选，每个阶段完成时立即回调（阶段: google/kiwi/ai_hidden），回调失败不影响搜索
+
+        Returns:
+            tuple: (Google数据, Kiwi数据, AI推荐数据)
+        """
+        # 记录本次搜索所用原始数据的缓存时间，AI报告缓存时长以此为准
+        begin_data_age_tracking()
+
+        async def run_stage(stage: str, stage_coro) -> list:
+            flights = await stage_coro
+            if on_stage_complete is not None:
+                try:
+                    await on_stage_complete(stage, flights)
+                except Exception as e:
+                    logger.warning(f"⚠️ [分阶段结果] {stage}阶段回调失败: {e}")
+            return flights
+
+        # 根据行程类型决定搜索阶段
+        is_roundtrip = return_date is not None
+
+        if is_roundtrip:
+            # 往返航班：只执行前两个阶段（Google Flights + Kiwi）
+            logger.info("🚀 开始并行执行两阶段搜索（往返航班）")
+
+            tasks = [
+                # 阶段1: 获取Google Flights原始数据
+                run_stage('google', self._get_google_raw_data(
+                    departure_code, destination_code, depart_date, return_date,
+                    adults, seat_class, children, infants_in_seat, infants_on_lap,
+                    max_stops, sort_by, language, currency
+                )),
+                # 阶段2: 获取Kiwi航班原始数据（包含隐藏城市和常规航班）
+                run_stage('kiwi', self._get_kiwi_raw_data(
+                    departure_code, destination_code, depart_date, return_date, adults, seat_class, language, currency
+                ))
+            ]
+
+            # 并行执行两个搜索任务
+            google_flights_raw, kiwi_flights_raw = await asyncio.gather(*tasks)
+            ai_flights_raw = []  # 往返航班不使用AI推荐隐藏城市
+
+            logger.info(f"两阶段原始数据收集完成: Google({len(google_flights_raw)}), Kiwi({len(kiwi_flights_raw)})")
+        else:
+            # 单程航班：执行完整的三阶段搜索
+            logger.info("🚀 开始并行执行三阶段搜索（单程航班）")
+
+            tasks = [
+                # 阶段1: 获取Google Flights原始数据
+                run_stage('google', self._get_google_raw_data(
+                    departure_code, destination_code, depart_date, return_date,
+                    adults, seat_class, children, infants_in_seat, infants_on_lap,
+                    max_stops, sort_by, language, currency
+                )),
+                # 阶段2: 获取Kiwi航班原始数据（包含隐藏城市和常规航班）
+                run_stage('kiwi', self._get_kiwi_raw_data(
+                    departure_code, destination_code, depart_date, return_date, adults, seat_class, language, currency
+                )),
+                # 阶段3: 获取AI推荐的隐藏城市原始数据
+                run_stage('ai_hidden', self._get_ai_hidden_raw_data(
+                    departure_code, destination_code, depart_date, return_date, adults, seat_class, language, currency
+                ))
+            ]
+
+            # 并行执行所有搜索任务
+            google_flights_raw, kiwi_flights_raw, ai_flights_raw = await asyncio.gather(*tasks)
+
+        # 记录本次看到的航段，供后续隐藏城市候选使用
+        self._observe_routes(google_flights_raw, kiwi_flights_raw, ai_flights_raw)
+
+        return google_flights_raw, kiwi_flights_raw, ai_flights_raw
+
+    def _observe_routes(self, *flight_lists: list):
+        """将航班航段记录到本地航线图（失败不影响搜索）"""
+        if not settings.ROUTE_GRAPH_ENABLED:
+            return
+        try:
+            route_graph = get_route_graph()
+            for flights in flight_lists:
+                route_graph.observe(flights)
+        except Exception as e:
+            logger.warning(f"⚠️ [航线图] 记录航段失败: {e}")
+
+    def clean_partial_stage(self, stage: str, flights: list) -> list:
+        """
+        分阶段结果：单个阶段的有效价格航班，按价格取前N条后清理（与交给AI的字段一致）
+        """
+        data_type = _PARTIAL_STAGE_TYPES.get(stage, stage)
+        valid_flights = self._filter_valid_price_flights(flights or [], source=stage)
+        cheapest = sort_by_price(valid_flights)[:settings.PARTIAL_RESULTS_MAX_FLIGHTS]
+        return self._clean_data_for_ai(cheapest, data_type)
+
+    def build_partial_preview(self, cleaned_by_stage: Dict[str, list]) -> list:
+        """分阶段结果：已完成阶段的确定性预览排序（与阶段完成先后无关）"""
+        ordered = {
+            stage: cleaned_by_stage[stage]
+            for stage in _PARTIAL_STAGE_TYPES
+            if stage in cleaned_by_stage
+        }
+        return get_flight_ranker().preview(ordered, limit=settings.PARTIAL_RESULTS_PREVIEW_SIZE)
 
     async def _get_google_raw_data(
         self,
@@ -292,15 +969,30 @@ class AIFlightService:
                 logger.warning("smart-flights库不可用")
                 return []
 
-            # 在线程池中执行同步搜索
-            loop = asyncio.get_event_loop()
-            results = await loop.run_in_executor(
-                None,
-                self._sync_search_google,
-                departure_code, destination_code, depart_date, return_date,
-                adults, seat_class, children, infants_in_seat, infants_on_lap,
-                max_stops, sort_by, language, currency
-            )
+            async def fetch_google():
+                # 在专用线程池中执行同步搜索，结果转换为纯字典后再缓存；smart-flights熔断时直接失败（缓存仍可命中）
+                pool = get_executor_pool('google_flights')
+                async with get_circuit_breaker('smart_flights').guard(neutral_exceptions=(ExecutorPoolFullError,)):
+                    flights = await pool.run(
+                        self._sync_search_google,
+                        departure_code, destination_code, depart_date, return_date,
+                        adults, seat_class, children, infants_in_seat, infants_on_lap,
+                        max_stops, sort_by, language, currency
+                    )
+                return to_plain_data(flights or [])
+
+            cache_params = {
+                'departure_code': departure_code, 'destination_code': destination_code,
+                'depart_date': depart_date, 'return_date': return_date,
+                'adults': adults, 'seat_class': seat_class, 'children': children,
+                'infants_in_seat': infants_in_seat, 'infants_on_lap': infants_on_lap,
+                'max_stops': max_stops, 'sort_by': sort_by,
+                'language': language, 'currency': currency
+            }
+            with trace_span('google_fetch', return_date=return_date) as span:
+                results = await get_provider_cache().get_or_fetch('google', cache_params, fetch_google)
+                if span.enabled:
+                    span.set(result_count=len(results or []), payload_chars=self._trace_payload_size(results))
 
             # 过滤掉价格为0的航班数据
             filtered_results = self._filter_valid_price_flights(results, source="常规搜索")
@@ -329,47 +1021,7 @@ class AIFlightService:
         if not flights:
             return []
 
-        valid_flights = []
-
-        for flight in flights:
-            try:
-                # 检查价格字段
-                price = None
-
-                # 尝试不同的价格字段名称
-                if isinstance(flight, dict):
-                    price = flight.get('price') or flight.get('total_price') or flight.get('cost')
-                else:
-                    # 如果是对象，尝试获取price属性
-                    price = getattr(flight, 'price', None) or getattr(flight, 'total_price', None) or getattr(flight, 'cost', None)
-
-                # 转换价格为数值
-                if price is not None:
-                    if isinstance(price, str):
-                        # 移除货币符号和逗号，提取数字
-                        import re
-                        price_str = re.sub(r'[^\d.]', '', price)
-                        if price_str:
-                            price = float(price_str)
-                        else:
-                            price = 0.0
-                    elif isinstance(price, (int, float)):
-                        price = float(price)
-                    else:
-                        price = 0.0
-                else:
-                    price = 0.0
-
-                # 只保留价格大于0的航班
-                if price > 0:
-                    valid_flights.append(flight)
-
-            except Exception as e:
-                # 如果处理单个航班时出错，记录警告但继续处理其他航班
-                logger.warning(f"处理航班价格时出错: {e}, 跳过该航班")
-                continue
-
-        return valid_flights
+        return filter_by_price(flights, min_price=0, fields=('price', 'total_price', 'cost'))
 
     async def _get_kiwi_raw_data(
         self,
@@ -391,12 +1043,25 @@ class AIFlightService:
                 logger.warning("smart-flights库不可用")
                 return []
 
-            # 在线程池中执行同步搜索
-            loop = asyncio.get_event_loop()
-            results = await loop.run_in_executor(
-                None,
-                self._sync_search_kiwi,
-                departure_code, destination_code, depart_date, adults, language, currency, seat_class, return_date
+            async def fetch_kiwi():
+                return await self._search_kiwi_async(
+                    departure_code, destination_code, depart_date, adults, language, currency, seat_class, return_date
+                )
+
+            def has_kiwi_flights(kiwi_results) -> bool:
+                # 未找到航班时返回的状态信息不缓存
+                return bool(kiwi_results) and not (
+                    len(kiwi_results) == 1 and kiwi_results[0].get('flight_type') == 'no_flights'
+                )
+
+            cache_params = {
+                'departure_code': departure_code, 'destination_code': destination_code,
+                'depart_date': depart_date, 'return_date': return_date,
+                'adults': adults, 'seat_class': seat_class,
+                'language': language, 'currency': currency
+            }
+            results = await get_provider_cache().get_or_fetch(
+                'kiwi', cache_params, fetch_kiwi, should_cache=has_kiwi_flights
             )
 
             # 【增强日志】记录原始返回数据的详细信息
@@ -490,10 +1155,175 @@ class AIFlightService:
         try:
             logger.info(f"获取AI推荐隐藏城市原始数据: {departure_code} → {destination_code}")
 
-            # 使用AI推荐隐藏目的地
+            # 获取隐藏目的地候选（按航线缓存，命中时无需等待AI响应）
+            with trace_span('hidden_city_suggestions') as span:
+                hidden_destinations = await self._get_hidden_city_suggestions(
+                    departure_code, destination_code, depart_date
+                )
+                span.set(result_count=len(hidden_destinations))
+
+            # 为每个隐藏城市并发搜索经过目标城市中转的航班（有界并发 + 单候选超时）
+            candidates = hidden_destinations[:10]  # 处理最多10个
+            semaphore = asyncio.Semaphore(max(1, settings.HIDDEN_CITY_SEARCH_CONCURRENCY))
+            candidate_timeout = settings.HIDDEN_CITY_SEARCH_TIMEOUT
+
+            async def search_candidate(i: int, hidden_dest: str) -> dict:
+                async with semaphore:
+                    logger.debug(f"搜索 {departure_code} → {hidden_dest} ({i}/{len(candidates)})，指定经过 {destination_code} 中转")
+                    start_time = time.monotonic()
+                    span_start = time.perf_counter()
+                    try:
+                        hidden_flights = await asyncio.wait_for(
+                            self._search_with_layover_cached(
+                                departure_code, hidden_dest, destination_code, depart_date,
+                                adults, language, currency, seat_class
+                            ),
+                            timeout=candidate_timeout
+                        )
+                        status = 'ok'
+                    except asyncio.TimeoutError:
+                        hidden_flights = []
+                        status = 'timeout'
+                        logger.warning(f"⏱️ 搜索经过 {destination_code} 中转到 {hidden_dest} 超时（{candidate_timeout}秒），丢弃该候选")
+                    except Exception as e:
+                        hidden_flights = []
+                        status = 'error'
+                        logger.error(f"搜索经过 {destination_code} 中转到 {hidden_dest} 失败: {e}")
+
+                    record_span(
+                        'layover_search', time.perf_counter() - span_start, span_start, status=status,
+                        hidden_dest=hidden_dest, result_count=len(hidden_flights or [])
+                    )
+
+                    return {
+                        'hidden_dest': hidden_dest,
+                        'flights': hidden_flights or [],
+                        'status': status,
+                        'elapsed': time.monotonic() - start_time
+                    }
+
+            stage_start = time.monotonic()
+            candidate_results = await asyncio.gather(
+                *(search_candidate(i, hidden_dest) for i, hidden_dest in enumerate(candidates, 1))
+            )
+
+            raw_data = []
+            for candidate in candidate_results:
+                hidden_dest = candidate['hidden_dest']
+                hidden_flights = candidate['flights']
+                self.stats['hidden_city_candidates'] += 1
+                if candidate['status'] == 'timeout':
+                    self.stats['hidden_city_timeouts'] += 1
+
+                logger.info(
+                    f"📊 [隐藏城市候选] {hidden_dest}: 状态={candidate['status']}, "
+                    f"耗时={candidate['elapsed']:.2f}秒, 结果={len(hidden_flights)}条"
+                )
+
+                if hidden_flights:
+                    # 为AI推荐的隐藏城市航班添加标记
+                    for flight in hidden_flights:
+                        if hasattr(flight, 'hidden_city_info'):
+                            flight.hidden_city_info = {
+                                'is_hidden_city': True,
+                                'hidden_destination_code': hidden_dest,
+                                'target_destination_code': destination_code,
+                                'ai_recommended': True,
+                                'search_method': 'layover_restriction'
+                            }
+                        elif isinstance(flight, dict):
+                            flight['hidden_city_info'] = {
+                                'is_hidden_city': True,
+                                'hidden_destination_code': hidden_dest,
+                                'target_destination_code': destination_code,
+                                'ai_recommended': True,
+                                'search_method': 'layover_restriction'
+                            }
+                            # 顶层标记在数据清理后仍会保留
+                            flight['is_hidden_city'] = True
+                            flight['ai_recommended'] = True
+                    raw_data.extend(hidden_flights)
+                    logger.info(f"✅ 找到经过 {destination_code} 中转到 {hidden_dest} 的航班: {len(hidden_flights)} 个")
+                else:
+                    logger.debug(f"❌ 未找到经过 {destination_code} 中转到 {hidden_dest} 的航班")
+
+            if candidate_results:
+                slowest = max(candidate_results, key=lambda c: c['elapsed'])
+                timeout_count = sum(1 for c in candidate_results if c['status'] == 'timeout')
+                logger.info(
+                    f"📊 [隐藏城市候选] 并发搜索完成: {len(candidate_results)}个候选, 总耗时={time.monotonic() - stage_start:.2f}秒, "
+                    f"最慢={slowest['hidden_dest']}({slowest['elapsed']:.2f}秒), 超时丢弃={timeout_count}个"
+                )
+
+            # 过滤掉价格为0的航班数据（第3阶段需要价格过滤）
+            filtered_results = self._filter_valid_price_flights(raw_data, source="AI推荐")
+
+            logger.info(f"获取AI推荐隐藏城市原始数据完成: {len(raw_data)} 条记录")
+            if len(filtered_results) < len(raw_data):
+                logger.info(f"🔧 过滤掉价格为0的航班: {len(raw_data) - len(filtered_results)} 条，剩余: {len(filtered_results)} 条")
+
+            # 直接返回过滤后的结果，不在这里排序和限制数量
+            # 最终的排序和数量限制将在所有数据源合并后统一处理
+            logger.info(f"✅ AI推荐航班收集完成: {len(filtered_results)} 条（将在最终合并时统一排序和限制）")
+            return filtered_results
+
+        except Exception as e:
+            logger.error(f"获取AI推荐隐藏城市原始数据失败: {e}")
+            return []
+
+    async def _get_hidden_city_suggestions(
+        self,
+        departure_code: str,
+        destination_code: str,
+        depart_date: str
+    ) -> list:
+        """
+        获取航线的隐藏目的地候选
+
+        优先使用本地航线图中观察到的、经过目的地中转的最终目的地；
+        航线图中候选不足（冷门航线）时询问AI（按航线持久缓存，过期后后台刷新）
+
+        Returns:
+            list: 经过Airport枚举校验的城市/机场代码列表
+        """
+        if settings.ROUTE_GRAPH_ENABLED:
+            graph_candidates = self._validate_hidden_city_codes(
+                get_route_graph().candidates(destination_code, exclude=(departure_code,), limit=10),
+                departure_code, destination_code
+            )
+            if len(graph_candidates) >= settings.ROUTE_GRAPH_MIN_CANDIDATES:
+                self.stats['route_graph_suggestions'] += 1
+                logger.info(f"🗺️ [航线图] 经过 {destination_code} 中转的候选目的地: {graph_candidates}")
+                return graph_candidates
+            logger.info(f"🗺️ [航线图] {destination_code} 候选不足（{len(graph_candidates)}个），使用AI推荐")
+
+        async def fetch_suggestions():
+            return await self._fetch_hidden_city_suggestions(departure_code, destination_code, depart_date)
+
+        route_params = {
+            'departure_code': departure_code,
+            'destination_code': destination_code
+        }
+        try:
+            suggestions = await get_suggestion_cache().get_or_fetch(
+                'hidden_city', route_params, fetch_suggestions
+            )
+        except Exception as e:
+            logger.error(f"获取隐藏目的地候选失败: {e}")
+            return []
+
+        # 缓存中的旧数据同样需要校验（Airport枚举可能随库版本变化）
+        return self._validate_hidden_city_codes(suggestions or [], departure_code, destination_code)
 
-            # AI推荐隐藏目的地 - 使用优化的英文提示词，返回城市代码
-            ai_prompt = f"""
+    async def _fetch_hidden_city_suggestions(
+        self,
+        departure_code: str,
+        destination_code: str,
+        depart_date: str
+    ) -> list:
+        """调用AI获取隐藏目的地候选城市代码"""
+        # AI推荐隐藏目的地 - 使用优化的英文提示词，返回城市代码
+        ai_prompt = f"""
 # Persona
 You are an expert-level travel hacker and an airline route network and pricing analyst.
 
@@ -521,74 +1351,69 @@ You must strictly follow this key principle: The most successful Skiplagging opp
 - Return only the city codes, separated by commas, with no additional text, explanations, or headers.
 - Example Format: NYC,LAX,CHI,MIA,DFW,ATL,SEA,DEN,PHX,LAS
 - Note: Use city codes like NYC (New York), LAX (Los Angeles), CHI (Chicago), not airport codes like JFK, LGA, EWR
-            """
-
-            # AI推荐隐藏目的地使用gemini-2.5-flash（速度快）
-            ai_response = await self._call_ai_api(ai_prompt, "gemini-2.5-flash")
-            hidden_destinations = []
-
-            if ai_response.get('success') and ai_response.get('content'):
-                content = ai_response['content'].strip()
-                # 提取城市代码
-                import re
-                city_codes = re.findall(r'\b[A-Z]{3}\b', content)
-                hidden_destinations = city_codes[:10]  # 扩展到10个
-                logger.info(f"AI推荐的隐藏城市: {hidden_destinations}")
-
-            raw_data = []
-            # 为每个隐藏城市搜索经过目标城市中转的航班
-            for i, hidden_dest in enumerate(hidden_destinations[:10], 1):  # 处理最多10个
-                try:
-                    logger.debug(f"搜索 {departure_code} → {hidden_dest} ({i}/{len(hidden_destinations)})，指定经过 {destination_code} 中转")
-                    loop = asyncio.get_event_loop()
-                    hidden_flights = await loop.run_in_executor(
-                        None,
-                        self._sync_search_with_layover,
-                        departure_code, hidden_dest, destination_code, depart_date,
-                        adults, language, currency, seat_class
-                    )
-                    if hidden_flights:
-                        # 为AI推荐的隐藏城市航班添加标记
-                        for flight in hidden_flights:
-                            if hasattr(flight, 'hidden_city_info'):
-                                flight.hidden_city_info = {
-                                    'is_hidden_city': True,
-                                    'hidden_destination_code': hidden_dest,
-                                    'target_destination_code': destination_code,
-                                    'ai_recommended': True,
-                                    'search_method': 'layover_restriction'
-                                }
-                            elif isinstance(flight, dict):
-                                flight['hidden_city_info'] = {
-                                    'is_hidden_city': True,
-                                    'hidden_destination_code': hidden_dest,
-                                    'target_destination_code': destination_code,
-                                    'ai_recommended': True,
-                                    'search_method': 'layover_restriction'
-                                }
-                        raw_data.extend(hidden_flights)
-                        logger.info(f"✅ 找到经过 {destination_code} 中转到 {hidden_dest} 的航班: {len(hidden_flights)} 个")
-                    else:
-                        logger.debug(f"❌ 未找到经过 {destination_code} 中转到 {hidden_dest} 的航班")
-                except Exception as e:
-                    logger.error(f"搜索经过 {destination_code} 中转到 {hidden_dest} 失败: {e}")
-                    continue
-
-            # 过滤掉价格为0的航班数据（第3阶段需要价格过滤）
-            filtered_results = self._filter_valid_price_flights(raw_data, source="AI推荐")
+        """
 
-            logger.info(f"获取AI推荐隐藏城市原始数据完成: {len(raw_data)} 条记录")
-            if len(filtered_results) < len(raw_data):
-                logger.info(f"🔧 过滤掉价格为0的航班: {len(raw_data) - len(filtered_results)} 条，剩余: {len(filtered_results)} 条")
+        # AI推荐隐藏目的地使用gemini-2.5-flash（速度快）
+        # 建议有独立的缓存和后台刷新，不写入报告缓存
+        ai_response = await self._call_ai_api(ai_prompt, "gemini-2.5-flash", use_report_cache=False)
+        hidden_destinations = []
+
+        if ai_response.get('success') and ai_response.get('content'):
+            content = ai_response['content'].strip()
+            # 提取城市代码
+            import re
+            city_codes = re.findall(r'\b[A-Z]{3}\b', content)
+            hidden_destinations = self._validate_hidden_city_codes(city_codes, departure_code, destination_code)[:10]  # 扩展到10个
+            logger.info(f"AI推荐的隐藏城市: {hidden_destinations}")
+
+        return hidden_destinations
+
+    def _validate_hidden_city_codes(self, codes: list, departure_code: str, destination_code: str) -> list:
+        """校验候选城市代码：去重、排除出发/目的地、必须存在于smart-flights的Airport枚举"""
+        excluded = {departure_code.upper(), destination_code.upper()}
+        valid_codes = []
+        for code in codes:
+            if not isinstance(code, str):
+                continue
+            code = code.strip().upper()
+            if code in excluded or code in valid_codes:
+                continue
+            if SMART_FLIGHTS_AVAILABLE and not hasattr(Airport, code):
+                logger.debug(f"忽略无效的隐藏目的地代码: {code}")
+                continue
+            valid_codes.append(code)
+        return valid_codes
 
-            # 直接返回过滤后的结果，不在这里排序和限制数量
-            # 最终的排序和数量限制将在所有数据源合并后统一处理
-            logger.info(f"✅ AI推荐航班收集完成: {len(filtered_results)} 条（将在最终合并时统一排序和限制）")
-            return filtered_results
+    async def _search_with_layover_cached(
+        self,
+        departure_code: str,
+        final_destination: str,
+        layover_airport: str,
+        depart_date: str,
+        adults: int = 1,
+        language: str = "zh",
+        currency: str = "CNY",
+        seat_class: str = "ECONOMY"
+    ) -> list:
+        """带数据源缓存的指定中转搜索，返回纯字典列表"""
+        async def fetch_layover():
+            # 隐藏城市搜索使用独立线程池，不占用常规搜索的线程
+            pool = get_executor_pool('hidden_city')
+            async with get_circuit_breaker('smart_flights').guard(neutral_exceptions=(ExecutorPoolFullError,)):
+                flights = await pool.run(
+                    self._sync_search_with_layover,
+                    departure_code, final_destination, layover_airport, depart_date,
+                    adults, language, currency, seat_class
+                )
+            return to_plain_data(flights or [])
 
-        except Exception as e:
-            logger.error(f"获取AI推荐隐藏城市原始数据失败: {e}")
-            return []
+        cache_params = {
+            'departure_code': departure_code, 'destination_code': final_destination,
+            'layover_code': layover_airport, 'depart_date': depart_date,
+            'adults': adults, 'seat_class': seat_class,
+            'language': language, 'currency': currency
+        }
+        return await get_provider_cache().get_or_fetch('google_layover', cache_params, fetch_layover)
 
     def _sync_search_google(self, departure_code: str, destination_code: str, depart_date: str,
                           return_date: str = None, adults: int = 1, seat_class: str = "ECONOMY",
@@ -678,17 +1503,31 @@ You must strictly follow this key principle: The most successful Skiplagging opp
                 sort_by=sort_by_enum
             )
 
-            # 根据行程类型设置不同的top_n值
+            # 根据行程类型设置不同的最大top_n
             # 往返航班：50个（数据量控制），单程航班：135个（更多选择）
-            top_n = 50 if return_date else 135
+            if return_date:
+                max_top_n = settings.GOOGLE_SEARCH_MAX_TOP_N_ROUNDTRIP
+                target = settings.GOOGLE_SEARCH_TARGET_ROUNDTRIP
+            else:
+                max_top_n = settings.GOOGLE_SEARCH_MAX_TOP_N_ONEWAY
+                target = settings.GOOGLE_SEARCH_TARGET_ONEWAY
             trip_type_desc = "往返" if return_date else "单程"
 
-            # 执行扩展搜索
+            # 执行扩展搜索：价格带内的去重行程足够时不再扩大top_n
             search_client = SearchFlights(localization_config=localization_config)
-            results = search_client.search_extended(filters, top_n=top_n)
+            results, fetch_report = get_adaptive_fetcher().fetch(
+                lambda top_n: search_client.search_extended(filters, top_n=top_n),
+                max_top_n,
+                price_band_target(target, settings.GOOGLE_SEARCH_PRICE_BAND),
+                label=f"{departure_code}→{destination_code}"
+            )
+            top_n = fetch_report['top_n']
 
             if results:
-                logger.info(f"✅ Google Flights{trip_type_desc}搜索成功: {len(results)} 个航班 (top_n={top_n})")
+                logger.info(
+                    f"✅ Google Flights{trip_type_desc}搜索成功: {len(results)} 个航班 "
+                    f"(top_n={top_n}, 请求{fetch_report['requests']}次)"
+                )
             else:
                 logger.warning(f"⚠️ Google Flights{trip_type_desc}搜索未返回结果")
 
@@ -696,114 +1535,73 @@ You must strictly follow this key principle: The most successful Skiplagging opp
 
         except Exception as e:
             logger.error(f"Google Flights搜索失败: {e}")
-            return []
+            # 抛给调用方，由熔断器记录失败
+            raise
 
-    def _sync_search_kiwi(self, departure_code: str, destination_code: str, depart_date: str,
-                         adults: int = 1, language: str = "zh", currency: str = "CNY",
-                         seat_class: str = "ECONOMY", return_date: str = None) -> list:
-        """同步执行Kiwi航班搜索 - 正确处理API响应格式"""
+    async def _search_kiwi_async(self, departure_code: str, destination_code: str, depart_date: str,
+                                 adults: int = 1, language: str = "zh", currency: str = "CNY",
+                                 seat_class: str = "ECONOMY", return_date: str = None) -> list:
+        """原生异步执行Kiwi航班搜索 - 普通航班和隐藏城市航班并发查询"""
         try:
             if not SMART_FLIGHTS_AVAILABLE:
                 return []
 
-            logger.info(f"🔍 [Kiwi搜索] 开始: {departure_code} → {destination_code}")
-
-            # 使用经过测试验证的KiwiFlightsAPI
+            # 使用经过测试验证的KiwiFlightsAPI，两个查询共用同一个API客户端
             from fli.api.kiwi_flights import KiwiFlightsAPI
+            api = KiwiFlightsAPI()
 
-            all_results = []
-
-            # 1. 搜索普通航班 (hidden_city_only=False)
-            try:
-                api_regular = KiwiFlightsAPI()
-
-                import asyncio
-                try:
-                    loop = asyncio.get_event_loop()
-                    regular_response = loop.run_until_complete(
-                        api_regular.search_oneway_hidden_city(
-                            origin=departure_code,
-                            destination=destination_code,
-                            departure_date=depart_date,
-                            adults=adults,
-                            limit=25,
-                            cabin_class=seat_class,  # 🔧 修复：传递舱位参数
-                            hidden_city_only=False  # 获取普通航班
-                        )
-                    )
-                except RuntimeError:
-                    # 如果没有事件循环，创建新的
-                    regular_response = asyncio.run(
-                        api_regular.search_oneway_hidden_city(
-                            origin=departure_code,
-                            destination=destination_code,
-                            departure_date=depart_date,
-                            adults=adults,
-                            limit=25,
-                            cabin_class=seat_class,  # 🔧 修复：传递舱位参数
-                            hidden_city_only=False  # 获取普通航班
-                        )
-                    )
-
-                # 【修复】正确处理API响应格式
-                logger.info(f"🔍 [Kiwi搜索] 普通航班API响应: {type(regular_response)}")
-                if isinstance(regular_response, dict) and regular_response.get('success'):
-                    regular_flights = regular_response.get('flights', [])
-                    logger.info(f"✅ [Kiwi搜索] 普通航班: {len(regular_flights)} 条")
-                    all_results.extend(regular_flights)
-                else:
-                    logger.warning(f"⚠️ [Kiwi搜索] 普通航班搜索失败或无结果: {regular_response}")
-                    regular_flights = []
-
-            except Exception as e:
-                logger.error(f"❌ [Kiwi搜索] 普通航班搜索失败: {e}")
-                regular_flights = []
+            breaker = get_circuit_breaker('kiwi')
+            if not breaker.allow_request():
+                logger.warning(f"⚡ [Kiwi搜索] Kiwi熔断中，跳过搜索（{breaker.retry_after:.0f}秒后重试）")
+                return []
 
-            # 2. 搜索隐藏城市航班 (hidden_city_only=True)
-            try:
-                api_hidden = KiwiFlightsAPI()
+            logger.info(f"🔍 [Kiwi搜索] 开始: {departure_code} → {destination_code}")
 
-                import asyncio
+            async def search_kiwi_flights(hidden_city_only: bool, label: str) -> Tuple[list, bool]:
+                """返回 (航班列表, Kiwi是否正常响应)"""
                 try:
-                    loop = asyncio.get_event_loop()
-                    hidden_response = loop.run_until_complete(
-                        api_hidden.search_oneway_hidden_city(
+                    with trace_span('kiwi_hidden' if hidden_city_only else 'kiwi_regular') as span:
+                        response = await api.search_oneway_hidden_city(
                             origin=departure_code,
                             destination=destination_code,
                             departure_date=depart_date,
                             adults=adults,
                             limit=25,
                             cabin_class=seat_class,  # 🔧 修复：传递舱位参数
-                            hidden_city_only=True   # 获取隐藏城市航班
+                            hidden_city_only=hidden_city_only
                         )
-                    )
-                except RuntimeError:
-                    # 如果没有事件循环，创建新的
-                    hidden_response = asyncio.run(
-                        api_hidden.search_oneway_hidden_city(
-                            origin=departure_code,
-                            destination=destination_code,
-                            departure_date=depart_date,
-                            adults=adults,
-                            limit=25,
-                            cabin_class=seat_class,  # 🔧 修复：传递舱位参数
-                            hidden_city_only=True   # 获取隐藏城市航班
-                        )
-                    )
+                        if span.enabled and isinstance(response, dict):
+                            flights = response.get('flights') or []
+                            span.set(result_count=len(flights), payload_chars=self._trace_payload_size(flights))
+
+                    # 【修复】正确处理API响应格式
+                    logger.info(f"🔍 [Kiwi搜索] {label}API响应: {type(response)}")
+                    if isinstance(response, dict) and response.get('success'):
+                        flights = response.get('flights', [])
+                        logger.info(f"✅ [Kiwi搜索] {label}: {len(flights)} 条")
+                        return flights, True
+
+                    logger.warning(f"⚠️ [Kiwi搜索] {label}搜索失败或无结果: {response}")
+                except Exception as e:
+                    logger.error(f"❌ [Kiwi搜索] {label}搜索失败: {e}")
+                return [], False
 
-                # 【修复】正确处理API响应格式
-                logger.info(f"🔍 [Kiwi搜索] 隐藏城市API响应: {type(hidden_response)}")
-                if isinstance(hidden_response, dict) and hidden_response.get('success'):
-                    hidden_flights = hidden_response.get('flights', [])
-                    logger.info(f"✅ [Kiwi搜索] 隐藏城市航班: {len(hidden_flights)} 条")
-                    all_results.extend(hidden_flights)
-                else:
-                    logger.warning(f"⚠️ [Kiwi搜索] 隐藏城市搜索失败或无结果: {hidden_response}")
-                    hidden_flights = []
+            # 1. 普通航班 (hidden_city_only=False) 和 2. 隐藏城市航班 (hidden_city_only=True) 并发查询
+            try:
+                (regular_flights, regular_ok), (hidden_flights, hidden_ok) = await asyncio.gather(
+                    search_kiwi_flights(False, "普通航班"),
+                    search_kiwi_flights(True, "隐藏城市航班")
+                )
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
 
-            except Exception as e:
-                logger.error(f"❌ [Kiwi搜索] 隐藏城市航班搜索失败: {e}")
-                hidden_flights = []
+            # 一次熔断准入对应两个并发查询，合并后只记录一次结果（任一查询失败或返回错误即记为失败）
+            if regular_ok and hidden_ok:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+            all_results = regular_flights + hidden_flights
 
             # 处理搜索结果
             if not all_results:
@@ -829,7 +1627,7 @@ You must strictly follow this key principle: The most successful Skiplagging opp
 
             # 转换航班数据格式并添加标识 - 优化版本
             processed_results = []
-            regular_count = len(regular_flights) if 'regular_flights' in locals() else 0
+            regular_count = len(regular_flights)
 
             for i, flight in enumerate(all_results):
                 # 确保航班数据是字典格式
@@ -1066,7 +1864,7 @@ You must strictly follow this key principle: The most successful Skiplagging opp
 
     def _clean_data_for_ai(self, data: list, data_type: str) -> list:
         """
-        清理数据，移除无用字段以节省AI token
+        清理数据，只投影有用字段以节省AI token
 
         Args:
             data: 原始数据列表
@@ -1080,111 +1878,44 @@ You must strictly follow this key principle: The most successful Skiplagging opp
                 return data
 
             cleaned_data = []
-
-            # 定义需要保留的有用字段
-            useful_fields = {
-                'kiwi': {
-                    # 基本信息
-                    'source', 'price', 'currency', 'currency_symbol',
-                    # 时间信息
-                    'departure_time', 'arrival_time', 'duration_formatted', 'duration_minutes',
-                    # 机场信息
-                    'departure_airport', 'departure_airport_name',
-                    'arrival_airport', 'arrival_airport_name',
-                    # 航空公司信息
-                    'carrier_name', 'carrier_code', 'flight_number',
-                    # 路线信息
-                    'route_path', 'route_description', 'segment_count', 'route_segments',
-                    # 航班类型
-                    'flight_type', 'flight_type_description', 'is_hidden_city',
-                    # 隐藏城市信息
-                    'hidden_destination_code', 'hidden_destination_name', 'is_throwaway',
-                    # 标准化字段
-                    'airline', 'origin', 'destination', 'price_numeric'
-                },
-                'google': {
-                    # 保留Google Flights的核心字段
-                    'price', 'currency', 'stops', 'legs',
-                    # 航空公司信息（如果有值）
-                    'airline', 'flightNumber',
-                    # 时间信息（如果有值）
-                    'departureTime', 'arrivalTime', 'duration',
-                    # 直飞标识
-                    'isDirect', 'stopsText',
-                    # 机场信息
-                    'departure_airport', 'arrival_airport'
-                },
-                'ai': {
-                    # 保留AI推荐数据的主要字段
-                    'airline', 'flightNumber', 'departureTime', 'arrivalTime',
-                    'duration', 'stops', 'isDirect', 'stopsText', 'price', 'currency',
-                    'legs', 'departure_airport', 'arrival_airport', 'total_price',
-                    'hidden_city_info', 'is_hidden_city', 'ai_recommended'
-                }
-            }
-
-            # 无用字段列表（这些字段会被明确移除）
-            useless_fields = {
-                # Kiwi数据的无用字段
-                'id',  # 长串编码ID，对AI分析无用
-                '_original_data',  # 原始数据备份，占用大量空间
-                'price_eur',  # 欧元价格，通常不需要
-                'trip_type',  # 行程类型，通常是固定值
-                'duration',  # 秒数格式的持续时间，有duration_formatted就够了
-
-                # Google Flights数据的无用字段
-                'price_amount',  # 重复的价格字段
-                'departureDateTime',  # ISO格式时间，有departureTime就够了
-                'arrivalDateTime',  # ISO格式时间，有arrivalTime就够了
-                'layovers',  # 中转信息，通常为空或冗余
-                'raw_data',  # 调试用的原始数据
-                'type',  # 数据类型信息，对AI无用
-                'error',  # 错误信息，对AI分析无用
-                'total_price',  # 重复的价格字段，有price就够了
-
-                # 通用无用字段
-                'hidden_city_info',  # 如果为None则无用
-            }
-
-            keep_fields = useful_fields.get(data_type, set())
+            keep_fields = _CLEAN_PROJECTION_SPECS.get(data_type)
 
             for item in data:
-                if isinstance(item, dict):
-                    # 清理字典数据
-                    cleaned_item = {}
-
-                    for key, value in item.items():
-                        # 跳过无用字段
-                        if key in useless_fields:
-                            continue
-
-                        # 如果定义了有用字段列表，只保留有用字段
-                        if keep_fields and key not in keep_fields:
-                            continue
+                if not isinstance(item, dict):
+                    # 非字典数据直接保留
+                    cleaned_data.append(item)
+                    continue
 
-                        # 清理空值和无意义值
-                        if value is None or value == '' or value == 'N/A':
-                            continue
+                if keep_fields is not None:
+                    # 只读取需要保留的字段，不遍历_original_data等大字段
+                    fields = ((key, item[key]) for key in keep_fields if key in item)
+                else:
+                    fields = ((key, value) for key, value in item.items() if key not in _CLEAN_USELESS_FIELDS)
 
-                        # 清理过长的字符串（可能是编码数据）
-                        if isinstance(value, str) and len(value) > 200 and key != 'route_description':
-                            continue
+                cleaned_item = {}
+                for key, value in fields:
+                    # 清理空值和无意义值
+                    if value is None or value == '' or value == 'N/A':
+                        continue
 
-                        cleaned_item[key] = value
+                    # 清理过长的字符串（可能是编码数据）
+                    if isinstance(value, str) and len(value) > 200 and key != 'route_description':
+                        continue
 
-                    if cleaned_item:  # 只添加非空的清理后数据
-                        cleaned_data.append(cleaned_item)
-                else:
-                    # 非字典数据直接保留
-                    cleaned_data.append(item)
+                    cleaned_item[key] = value
 
-            # 记录清理效果
-            original_size = len(str(data))
-            cleaned_size = len(str(cleaned_data))
-            reduction_percent = (1 - cleaned_size / original_size) * 100 if original_size > 0 else 0
+                if cleaned_item:  # 只添加非空的清理后数据
+                    cleaned_data.append(cleaned_item)
 
             logger.info(f"🧹 [数据清理] {data_type}数据: {len(data)}条 → {len(cleaned_data)}条")
-            logger.info(f"📊 [数据清理] {data_type}大小: {original_size:,} → {cleaned_size:,} 字符 (减少{reduction_percent:.1f}%)")
+
+            # 记录清理效果（抽样估算，避免为整个数据集生成字符串）
+            sample_size = settings.AI_CLEAN_SIZE_SAMPLE
+            if sample_size > 0:
+                original_size = self._estimate_data_size(data, sample_size)
+                cleaned_size = self._estimate_data_size(cleaned_data, sample_size)
+                reduction_percent = (1 - cleaned_size / original_size) * 100 if original_size > 0 else 0
+                logger.info(f"📊 [数据清理] {data_type}大小(估算): {original_size:,} → {cleaned_size:,} 字符 (减少{reduction_percent:.1f}%)")
 
             return cleaned_data
 
@@ -1193,6 +1924,22 @@ You must strictly follow this key principle: The most successful Skiplagging opp
             # 清理失败时返回原始数据
             return data
 
+    def _estimate_data_size(self, data: list, sample_size: int) -> int:
+        """按均匀抽样的条目估算列表的字符串长度"""
+        total = len(data)
+        if total <= sample_size:
+            return sum(len(str(item)) for item in data)
+
+        step = total / sample_size
+        sampled = sum(len(str(data[int(index * step)])) for index in range(sample_size))
+        return int(sampled * total / sample_size)
+
+    def _trace_payload_size(self, data: Any) -> int:
+        """搜索追踪中记录的数据量（抽样估算的字符数）"""
+        if not isinstance(data, list) or not data:
+            return 0
+        return self._estimate_data_size(data, settings.AI_CLEAN_SIZE_SAMPLE or 20)
+
     def _sync_search_with_layover(self, departure_code: str, final_destination: str,
                                 layover_airport: str, depart_date: str, adults: int = 1,
                                 language: str = "zh", currency: str = "CNY", seat_class: str = "ECONOMY") -> list:
@@ -1247,9 +1994,17 @@ You must strictly follow this key principle: The most successful Skiplagging opp
                 sort_by=SortBy.CHEAPEST
             )
 
-            # 执行搜索
+            # 执行搜索：经过目标中转机场的航班足够时不再扩大top_n
             search_client = SearchFlights(localization_config=localization_config)
-            all_results = search_client.search_extended(filters, top_n=100)  # 获取更多结果用于过滤
+            all_results, _ = get_adaptive_fetcher().fetch(
+                lambda top_n: search_client.search_extended(filters, top_n=top_n),
+                settings.LAYOVER_SEARCH_MAX_TOP_N,
+                match_count_target(
+                    settings.LAYOVER_SEARCH_TARGET_MATCHES,
+                    lambda flight: layover_airport in self._flight_route_airports(flight)
+                ),
+                label=f"{departure_code}→{layover_airport}→{final_destination}"
+            )
 
             if not all_results:
                 logger.debug(f"❌ 未找到 {departure_code} → {final_destination} 的航班")
@@ -1260,28 +2015,12 @@ You must strictly follow this key principle: The most successful Skiplagging opp
             # 手动过滤出经过指定中转机场的航班
             filtered_results = []
             for flight in all_results:
-                if hasattr(flight, 'legs') and flight.legs:
-                    # 检查航班是否经过指定的中转机场
-                    route_airports = []
-                    for leg in flight.legs:
-                        departure_airport_code = getattr(leg, 'departure_airport', '').name if hasattr(getattr(leg, 'departure_airport', ''), 'name') else str(getattr(leg, 'departure_airport', ''))
-                        arrival_airport_code = getattr(leg, 'arrival_airport', '').name if hasattr(getattr(leg, 'arrival_airport', ''), 'name') else str(getattr(leg, 'arrival_airport', ''))
-
-                        # 提取机场代码（去掉Airport.前缀）
-                        if 'Airport.' in departure_airport_code:
-                            departure_airport_code = departure_airport_code.replace('Airport.', '')
-                        if 'Airport.' in arrival_airport_code:
-                            arrival_airport_code = arrival_airport_code.replace('Airport.', '')
-
-                        if departure_airport_code not in route_airports:
-                            route_airports.append(departure_airport_code)
-                        if arrival_airport_code not in route_airports:
-                            route_airports.append(arrival_airport_code)
-
-                    # 检查是否经过目标中转机场
-                    if layover_airport in route_airports:
-                        filtered_results.append(flight)
-                        logger.debug(f"✅ 找到经过 {layover_airport} 的航班: {' → '.join(route_airports)}")
+                route_airports = self._flight_route_airports(flight)
+
+                # 检查是否经过目标中转机场
+                if layover_airport in route_airports:
+                    filtered_results.append(flight)
+                    logger.debug(f"✅ 找到经过 {layover_airport} 的航班: {' → '.join(route_airports)}")
 
             logger.debug(f"✅ 过滤完成，找到 {len(filtered_results)} 个经过 {layover_airport} 中转的航班")
 
@@ -1291,7 +2030,30 @@ You must strictly follow this key principle: The most successful Skiplagging opp
 
         except Exception as e:
             logger.error(f"指定中转搜索失败: {e}")
-            return []
+            # 抛给调用方，由熔断器记录失败
+            raise
+
+    def _flight_route_airports(self, flight: Any) -> List[str]:
+        """航班依次经过的机场代码（FlightResult对象，没有航段时为空）"""
+        route_airports = []
+        if not (hasattr(flight, 'legs') and flight.legs):
+            return route_airports
+
+        for leg in flight.legs:
+            departure_airport_code = getattr(leg, 'departure_airport', '').name if hasattr(getattr(leg, 'departure_airport', ''), 'name') else str(getattr(leg, 'departure_airport', ''))
+            arrival_airport_code = getattr(leg, 'arrival_airport', '').name if hasattr(getattr(leg, 'arrival_airport', ''), 'name') else str(getattr(leg, 'arrival_airport', ''))
+
+            # 提取机场代码（去掉Airport.前缀）
+            if 'Airport.' in departure_airport_code:
+                departure_airport_code = departure_airport_code.replace('Airport.', '')
+            if 'Airport.' in arrival_airport_code:
+                arrival_airport_code = arrival_airport_code.replace('Airport.', '')
+
+            if departure_airport_code not in route_airports:
+                route_airports.append(departure_airport_code)
+            if arrival_airport_code not in route_airports:
+                route_airports.append(arrival_airport_code)
+        return route_airports
 
     async def _process_flights_with_ai(
         self,
@@ -1301,7 +2063,8 @@ You must strictly follow this key principle: The most successful Skiplagging opp
         language: str = "zh",
         departure_code: str = "",
         destination_code: str = "",
-        user_preferences: str = ""
+        user_preferences: str = "",
+        data_format: str = "json"
     ) -> Dict[str, Any]:
         """
         使用AI处理航班数据
@@ -1376,23 +2139,15 @@ You must strictly follow this key principle: The most successful Skiplagging opp
                 }
 
             # 对AI推荐数据进行最终的排序和数量限制
-            if ai_flights and len(ai_flights) > 100:
-                # 按价格排序（升序）
-                try:
-                    ai_flights_sorted = sorted(ai_flights, key=lambda x: getattr(x, 'price', float('inf')))
-                    ai_flights = ai_flights_sorted[:100]  # 取前100个最便宜的
-                    logger.info(f"🔧 [AI处理] AI推荐数据最终排序和限制: 从 {ai_count} 条减少到 {len(ai_flights)} 条（前100最便宜）")
-                except Exception as e:
-                    logger.warning(f"⚠️ [AI处理] AI推荐数据排序失败: {e}")
-                    ai_flights = ai_flights[:100]  # 如果排序失败，至少限制数量
-                    logger.info(f"🔧 [AI处理] AI推荐数据数量限制: 从 {ai_count} 条减少到 {len(ai_flights)} 条")
+            ai_flights = self._limit_ai_flights(ai_flights)
 
             # 统一使用单轮对话处理所有数据（已优化数据清理，可以处理大量数据）
             final_total = len(google_flights) + len(kiwi_flights) + len(ai_flights)
             logger.info(f"📊 [AI处理] 最终处理{final_total}条航班数据，使用单轮对话 + 降级机制")
             processed_data = await self._process_with_fallback_ai(
                 google_flights, kiwi_flights, ai_flights,
-                language, departure_code, destination_code, user_preferences
+                language, departure_code, destination_code, user_preferences,
+                data_format
             )
 
             if processed_data and processed_data.get('ai_analysis_report'):
@@ -1455,6 +2210,23 @@ You must strictly follow this key principle: The most successful Skiplagging opp
                 'error': str(e)
             }
 
+    def _limit_ai_flights(self, ai_flights: list, limit: int = 100) -> list:
+        """AI推荐数据按价格排序并限制数量"""
+        if not ai_flights or len(ai_flights) <= limit:
+            return ai_flights
+
+        ai_count = len(ai_flights)
+        # 按价格排序（升序）
+        try:
+            ai_flights_sorted = sort_by_price(ai_flights, fields=('price',))
+            ai_flights = ai_flights_sorted[:limit]  # 取前100个最便宜的
+            logger.info(f"🔧 [AI处理] AI推荐数据最终排序和限制: 从 {ai_count} 条减少到 {len(ai_flights)} 条（前{limit}最便宜）")
+        except Exception as e:
+            logger.warning(f"⚠️ [AI处理] AI推荐数据排序失败: {e}")
+            ai_flights = ai_flights[:limit]  # 如果排序失败，至少限制数量
+            logger.info(f"🔧 [AI处理] AI推荐数据数量限制: 从 {ai_count} 条减少到 {len(ai_flights)} 条")
+        return ai_flights
+
     def _convert_flight_to_dict(self, flight) -> dict:
         """将FlightResult对象转换为字典格式 - 优化版本"""
         try:
@@ -1609,9 +2381,34 @@ You must strictly follow this key principle: The most successful Skiplagging opp
         language: str,
         departure_code: str,
         destination_code: str,
-        user_preferences: str = ""
+        user_preferences: str = "",
+        data_format: str = "json"
     ) -> str:
         """构建AI处理提示 - 直接使用原始数据，不进行转换"""
+        prompt, _ = self._build_analysis_inputs(
+            google_data, kiwi_data, ai_data,
+            language, departure_code, destination_code, user_preferences,
+            data_format
+        )
+        return prompt
+
+    def _build_analysis_inputs(
+        self,
+        google_data: List,
+        kiwi_data: List,
+        ai_data: List,
+        language: str,
+        departure_code: str,
+        destination_code: str,
+        user_preferences: str = "",
+        data_format: str = "json"
+    ) -> tuple:
+        """
+        构建AI处理提示，同时返回清理、去重、预排序后的各数据源航班（供分片分析使用）
+
+        Returns:
+            (提示词, {'google': [...], 'kiwi': [...], 'ai': [...]})
+        """
 
         # 直接使用原始数据，让AI自己处理不同的数据格式
         # Google Flights: FlightResult对象
@@ -1624,38 +2421,110 @@ You must strictly follow this key principle: The most successful Skiplagging opp
         )
 
         # 清理数据，移除无用字段以节省token
-        cleaned_kiwi_data = self._clean_data_for_ai(kiwi_data, 'kiwi')
-        cleaned_google_data = self._clean_data_for_ai(google_data, 'google')
-        cleaned_ai_data = self._clean_data_for_ai(ai_data, 'ai')
-
-        return create_final_analysis_prompt(
-            google_flights_data=cleaned_google_data,  # 清理后的Google数据
-            kiwi_data=cleaned_kiwi_data,             # 清理后的Kiwi数据
-            ai_data=cleaned_ai_data,                 # 清理后的AI数据
-            language=language,
-            departure_code=departure_code,
-            destination_code=destination_code,
-            user_preferences=user_preferences
-        )
+        with trace_span('clean', input_count=len(google_data) + len(kiwi_data) + len(ai_data)) as span:
+            cleaned_kiwi_data = self._clean_data_for_ai(kiwi_data, 'kiwi')
+            cleaned_google_data = self._clean_data_for_ai(google_data, 'google')
+            cleaned_ai_data = self._clean_data_for_ai(ai_data, 'ai')
+            if span.enabled:
+                span.set(payload_chars=sum(
+                    self._trace_payload_size(data) for data in (cleaned_google_data, cleaned_kiwi_data, cleaned_ai_data)
+                ))
+
+        with trace_span('prompt_build', data_format=data_format) as span:
+            # 合并各数据源的重复行程
+            if settings.AI_DEDUP_ENABLED:
+                cleaned_google_data, cleaned_kiwi_data, cleaned_ai_data = self._deduplicate_flights(
+                    cleaned_google_data, cleaned_kiwi_data, cleaned_ai_data
+                )
+
+            # 本地预排序：只把帕累托前沿和得分靠前的航班交给AI
+            if settings.AI_PRERANK_ENABLED:
+                cleaned_google_data, cleaned_kiwi_data, cleaned_ai_data = self._prerank_flights(
+                    cleaned_google_data, cleaned_kiwi_data, cleaned_ai_data
+                )
+
+            prompt = create_final_analysis_prompt(
+                google_flights_data=cleaned_google_data,  # 清理后的Google数据
+                kiwi_data=cleaned_kiwi_data,             # 清理后的Kiwi数据
+                ai_data=cleaned_ai_data,                 # 清理后的AI数据
+                language=language,
+                departure_code=departure_code,
+                destination_code=destination_code,
+                user_preferences=user_preferences,
+                data_format=data_format
+            )
+            span.set(
+                result_count=len(cleaned_google_data) + len(cleaned_kiwi_data) + len(cleaned_ai_data),
+                prompt_chars=len(prompt)
+            )
+        return prompt, {'google': cleaned_google_data, 'kiwi': cleaned_kiwi_data, 'ai': cleaned_ai_data}
+
+    def _deduplicate_flights(self, google_data: List, kiwi_data: List, ai_data: List) -> tuple:
+        """跨数据源去重，失败时返回原数据"""
+        try:
+            merged, report = get_flight_deduplicator().deduplicate({
+                'google': google_data,
+                'kiwi': kiwi_data,
+                'ai': ai_data
+            })
+            logger.info(
+                f"🔗 [去重] {report['flights_in']}条 → {report['flights_out']}条 "
+                f"(去重率{report['dedup_ratio']:.1%}, 跨数据源合并{report['cross_source_merges']}条)"
+            )
+            return merged['google'], merged['kiwi'], merged['ai']
+        except Exception as e:
+            logger.warning(f"⚠️ [去重] 失败，使用全部航班: {e}")
+            return google_data, kiwi_data, ai_data
+
+    def _prerank_flights(self, google_data: List, kiwi_data: List, ai_data: List) -> tuple:
+        """帕累托前沿 + 加权得分预排序，失败时返回原数据"""
+        try:
+            ranked, report = get_flight_ranker().rank({
+                'google': google_data,
+                'kiwi': kiwi_data,
+                'ai': ai_data
+            })
+            if report['ranked']:
+                logger.info(
+                    f"📐 [预排序] {report['flights_in']}条 → {report['flights_out']}条 "
+                    f"(帕累托前沿{report['frontier']}条, 各数据源: {report['per_source']})"
+                )
+            return ranked['google'], ranked['kiwi'], ranked['ai']
+        except Exception as e:
+            logger.warning(f"⚠️ [预排序] 失败，使用全部航班: {e}")
+            return google_data, kiwi_data, ai_data
 
     # 移除多轮对话方法，统一使用单轮对话处理
 
     async def _process_with_fallback_ai(self, google_flights, kiwi_flights, ai_flights,
-                                       language, departure_code, destination_code, user_preferences):
+                                       language, departure_code, destination_code, user_preferences,
+                                       data_format: str = "json"):
         """使用降级机制处理航班数据：先尝试pro模型，失败则降级到flash模型"""
         try:
             logger.info("🔄 开始降级机制AI处理（单轮对话）")
 
             # 构建完整的单轮提示词
-            prompt = self._build_processing_prompt(
+            prompt, cleaned_by_source = self._build_analysis_inputs(
                 google_flights, kiwi_flights, ai_flights,
-                language, departure_code, destination_code, user_preferences
+                language, departure_code, destination_code, user_preferences,
+                data_format
             )
 
-            # 使用内置的降级机制调用AI API
-            logger.info("🚀 尝试AI处理（gemini-2.5-pro → gemini-2.5-flash降级）")
+            result = None
+            if self._should_map_reduce(prompt, language):
+                # 超大数据量：分片并发预分析后合并生成报告，失败时仍按单轮对话处理
+                result = await self._map_reduce_ai_call(
+                    prompt, cleaned_by_source, language,
+                    departure_code, destination_code, user_preferences, data_format
+                )
+                if not result:
+                    self.stats['map_reduce_fallbacks'] += 1
+                    logger.warning("⚠️ [分片分析] 失败，改用单轮对话处理完整数据")
 
-            result = await self._call_ai_api(prompt, "gemini-2.5-pro", language, enable_fallback=True)
+            if not result:
+                # 使用内置的降级机制调用AI API
+                logger.info("🚀 尝试AI处理（gemini-2.5-pro → gemini-2.5-flash降级）")
+                result = await self._call_ai_api(prompt, "gemini-2.5-pro", language, enable_fallback=True)
 
             if result and result.get('success'):
                 model_used = result.get('actual_model', result.get('original_model', 'gemini-2.5-pro'))
@@ -1665,14 +2534,20 @@ You must strictly follow this key principle: The most successful Skiplagging opp
                 if fallback_used:
                     logger.info("🔄 使用了降级机制")
 
+                summary = {
+                    'markdown_format': True,
+                    'model_used': model_used,
+                    'fallback_used': fallback_used,
+                    'cache_hit': result.get('cache_hit', False),
+                    'processing_method': 'single_turn_with_fallback'
+                }
+                if result.get('map_reduce'):
+                    summary['processing_method'] = 'map_reduce'
+                    summary['map_reduce'] = result['map_reduce']
+
                 return {
                     'ai_analysis_report': result.get('content', ''),
-                    'summary': {
-                        'markdown_format': True,
-                        'model_used': model_used,
-                        'fallback_used': fallback_used,
-                        'processing_method': 'single_turn_with_fallback'
-                    }
+                    'summary': summary
                 }
             else:
                 logger.error("❌ 所有模型都处理失败")
@@ -1697,57 +2572,441 @@ You must strictly follow this key principle: The most successful Skiplagging opp
             traceback.print_exc()
             return None
 
-    async def _call_ai_api(self, prompt: str, model_name: str = None, language: str = "zh", enable_fallback: bool = True) -> Optional[Dict]:
-        """调用AI API进行数据处理，支持模型降级"""
+    async def _call_ai_api(
+        self,
+        prompt: str,
+        model_name: str = None,
+        language: str = "zh",
+        enable_fallback: bool = True,
+        cache_key: Optional[str] = None,
+        use_report_cache: bool = True
+    ) -> Optional[Dict]:
+        """
+        调用AI API进行数据处理，支持模型降级和报告缓存
+
+        cache_key: 调用方已查询过的报告缓存键（跳过读取，成功后写入该键）；为空时按提示词读写缓存
+        use_report_cache: 为False时不读写报告缓存（非分析报告的提示词，如隐藏城市建议）
+        """
 
         # 定义模型降级链
         if model_name is None:
             model_name = "gemini-2.5-pro"
 
+        # 相同提示词直接复用已生成的报告
+        if use_report_cache and cache_key is None:
+            cache_key = self._build_report_cache_key(prompt, model_name, language)
+            cached = await self._get_cached_report(cache_key)
+            if cached:
+                return self._cached_report_result(cached, model_name)
+
         # 设置降级模型
         fallback_model = "gemini-2.5-flash" if model_name == "gemini-2.5-pro" else None
 
-        # 首先尝试主模型
-        result = await self._try_ai_api_call(prompt, model_name, language)
-
-        # 如果主模型失败且启用降级，尝试降级模型
-        if not result and enable_fallback and fallback_model:
-            logger.warning(f"⚠️ {model_name} 调用失败，尝试降级到 {fallback_model}")
-            result = await self._try_ai_api_call(prompt, fallback_model, language)
-
+        if enable_fallback and fallback_model and self._should_route_to_fast_model(prompt):
+            # 超大提示词直接使用更快的模型
+            self.stats['size_routed_requests'] += 1
+            logger.info(f"📏 提示词 {len(prompt):,} 字符超过阈值，直接使用 {fallback_model}")
+            result = await self._timed_ai_call(prompt, fallback_model, language)
             if result:
-                logger.info(f"✅ 降级到 {fallback_model} 成功")
-                # 在结果中标记使用了降级模型
                 result['fallback_used'] = True
                 result['original_model'] = model_name
                 result['actual_model'] = fallback_model
 
+        elif enable_fallback and fallback_model and settings.AI_HEDGE_ENABLED:
+            result = await self._hedged_ai_call(prompt, model_name, fallback_model, language)
+
+        else:
+            # 首先尝试主模型
+            result = await self._timed_ai_call(prompt, model_name, language)
+
+            # 如果主模型失败且启用降级，尝试降级模型
+            if not result and enable_fallback and fallback_model:
+                result = await self._fallback_ai_call(prompt, model_name, fallback_model, language)
+
+        if use_report_cache and result and result.get('success'):
+            await self._store_cached_report(cache_key, result.get('content', ''), result.get('actual_model', model_name))
+
+        return result
+
+    def _cached_report_result(self, cached: Dict[str, Any], model_name: str) -> Dict[str, Any]:
+        """缓存的报告 → 与AI调用相同结构的结果"""
+        report = cached['report']
+        actual_model = cached.get('model') or model_name
+        return {
+            'success': True,
+            'content': report,
+            'flights': [],
+            'ai_analysis_report': report,
+            'summary': {
+                'total_flights': 0,
+                'markdown_format': True,
+                'processing_method': 'markdown_only'
+            },
+            'cache_hit': True,
+            'fallback_used': actual_model != model_name,
+            'original_model': model_name,
+            'actual_model': actual_model
+        }
+
+    def _should_map_reduce(self, prompt: str, language: str) -> bool:
+        """请求数据量（系统提示词 + 提示词，与AI请求日志的Payload大小同口径）超过阈值时分片分析"""
+        threshold = settings.AI_MAP_REDUCE_PAYLOAD_THRESHOLD
+        if not settings.AI_MAP_REDUCE_ENABLED or threshold <= 0:
+            return False
+
+        import json
+        from ..prompts.flight_processor_prompts_v2 import get_consolidated_instructions_prompt
+        system_prompt = get_consolidated_instructions_prompt(language)
+        return len(json.dumps([system_prompt, prompt], ensure_ascii=False)) > threshold
+
+    async def _run_shard_analysis(
+        self,
+        cleaned_by_source: Dict[str, list],
+        language: str,
+        departure_code: str,
+        destination_code: str,
+        user_preferences: str,
+        data_format: str
+    ) -> Optional[tuple]:
+        """
+        分片预分析（map阶段）：按数据源和价格区间切分航班，各分片并发交给快速模型提取候选航班
+
+        Returns:
+            (合并提示词, 分片统计)；不足两个分片或全部分片失败时返回None
+        """
+        from ..prompts.flight_processor_prompts_v2 import (
+            create_merge_report_prompt, create_shard_analysis_prompt, get_shard_instructions_prompt
+        )
+
+        shards, report = get_analysis_sharder().shard(cleaned_by_source)
+        if len(shards) < 2:
+            logger.info(f"🧩 [分片分析] 只有{len(shards)}个分片，不拆分")
+            return None
+
+        self.stats['map_reduce_requests'] += 1
+        logger.info(
+            f"🧩 [分片分析] {report['flights']}条航班 → {report['shards']}个分片 "
+            f"(预算{report['budget_tokens']:,} tokens/分片, 最大分片约{report['max_shard_tokens']:,} tokens)"
+        )
+
+        system_prompt = get_shard_instructions_prompt(language, settings.AI_MAP_REDUCE_SHARD_CANDIDATES)
+
+        async def analyze(shard: Dict[str, Any]) -> Optional[str]:
+            shard_prompt = create_shard_analysis_prompt(
+                shard, len(shards), language, departure_code, destination_code, user_preferences, data_format
+            )
+            result = await self._timed_ai_call(shard_prompt, "gemini-2.5-flash", language, system_prompt)
+            if result and result.get('content'):
+                return result['content']
+            logger.warning(f"⚠️ [分片分析] 分片{shard['index']}/{len(shards)}预分析失败")
+            return None
+
+        with trace_span('ai_map', shards=len(shards), flights=report['flights']) as span:
+            contents = await asyncio.gather(*(analyze(shard) for shard in shards))
+            summaries = [(shard, content) for shard, content in zip(shards, contents) if content]
+            failed = len(shards) - len(summaries)
+            span.set(failed_shards=failed)
+
+        self.stats['map_reduce_shard_failures'] += failed
+        if not summaries:
+            logger.error("❌ [分片分析] 所有分片预分析失败")
+            return None
+
+        merge_prompt = create_merge_report_prompt(
+            summaries, language, departure_code, destination_code, user_preferences,
+            total_flights=report['flights'], failed_shards=failed
+        )
+        logger.info(
+            f"🧩 [分片分析] {len(summaries)}/{len(shards)}个分片完成，合并提示词 {len(merge_prompt):,} 字符"
+        )
+        return merge_prompt, {
+            'shards': len(shards),
+            'failed_shards': failed,
+            'flights': report['flights'],
+            'max_shard_tokens': report['max_shard_tokens']
+        }
+
+    async def _map_reduce_ai_call(
+        self,
+        prompt: str,
+        cleaned_by_source: Dict[str, list],
+        language: str,
+        departure_code: str,
+        destination_code: str,
+        user_preferences: str,
+        data_format: str
+    ) -> Optional[Dict]:
+        """
+        分片分析（map-reduce）：分片并发预分析后，由主模型（支持降级）根据各分片结果生成五板块报告
+
+        报告按完整提示词缓存（合并提示词包含模型输出，每次都不同）；分片全部失败或合并失败时返回None
+        """
+        cache_key = self._build_report_cache_key(prompt, _MAP_REDUCE_CACHE_MODEL, language)
+        cached = await self._get_cached_report(cache_key)
+        if cached:
+            result = self._cached_report_result(cached, "gemini-2.5-pro")
+            result['map_reduce'] = {'cache_hit': True}
+            return result
+
+        sharded = await self._run_shard_analysis(
+            cleaned_by_source, language, departure_code, destination_code, user_preferences, data_format
+        )
+        if not sharded:
+            return None
+        merge_prompt, map_reduce_info = sharded
+
+        with trace_span('ai_reduce', prompt_chars=len(merge_prompt)):
+            result = await self._call_ai_api(merge_prompt, "gemini-2.5-pro", language, enable_fallback=True, cache_key=cache_key)
+
+        if not result or not result.get('success'):
+            return None
+        result['map_reduce'] = map_reduce_info
         return result
 
-    async def _try_ai_api_call(self, prompt: str, model_name: str, language: str = "zh") -> Optional[Dict]:
-        """尝试调用AI API"""
+    async def _stream_analysis_report(
+        self,
+        prompt: str,
+        cleaned_by_source: Dict[str, list],
+        language: str,
+        departure_code: str,
+        destination_code: str,
+        user_preferences: str,
+        data_format: str,
+        summary: Dict[str, Any],
+        stream_state: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[tuple]:
+        """
+        流式生成分析报告：数据量超过阈值时先分片预分析，再流式输出合并报告
+
+        分片分析信息写入summary['map_reduce']；分片分析失败时流式处理完整提示词
+        stream_state: 可选，报告完整输出（含缓存命中）时写入 completed=True
+
+        Yields:
+            tuple: (实际使用的模型, Markdown片段)
+        """
+        if self._should_map_reduce(prompt, language):
+            cache_key = self._build_report_cache_key(prompt, _MAP_REDUCE_CACHE_MODEL, language)
+            cached = await self._get_cached_report(cache_key)
+            if cached:
+                summary['map_reduce'] = {'cache_hit': True}
+                if stream_state is not None:
+                    stream_state['completed'] = True
+                yield cached.get('model') or "gemini-2.5-pro", cached['report']
+                return
+
+            sharded = await self._run_shard_analysis(
+                cleaned_by_source, language, departure_code, destination_code, user_preferences, data_format
+            )
+            if sharded:
+                merge_prompt, summary['map_reduce'] = sharded
+                emitted = False
+                with trace_span('ai_reduce', prompt_chars=len(merge_prompt), stream=True):
+                    async for model_used, content in self._stream_ai_api(
+                        merge_prompt, "gemini-2.5-pro", language, cache_key=cache_key, stream_state=stream_state
+                    ):
+                        emitted = True
+                        yield model_used, content
+                if emitted:
+                    return
+                summary.pop('map_reduce', None)
+
+            self.stats['map_reduce_fallbacks'] += 1
+            logger.warning("⚠️ [分片分析] 失败，改用单轮对话处理完整数据")
+
+        async for model_used, content in self._stream_ai_api(
+            prompt, "gemini-2.5-pro", language, stream_state=stream_state
+        ):
+            yield model_used, content
+
+    def _should_route_to_fast_model(self, prompt: str) -> bool:
+        """提示词超过阈值时跳过主模型"""
+        threshold = settings.AI_FAST_MODEL_PROMPT_THRESHOLD
+        return threshold > 0 and len(prompt) > threshold
+
+    async def _hedged_ai_call(self, prompt: str, model_name: str, hedge_model: str, language: str = "zh") -> Optional[Dict]:
+        """
+        对冲请求：主模型超过其历史延迟百分位仍未返回时，并发请求更快的模型
+
+        先返回有效结果的请求胜出，另一个请求被取消；主模型直接失败时按原逻辑降级
+        """
+        tracker = get_model_latency_tracker()
+        hedge_delay = tracker.hedge_delay(model_name)
+
+        primary = asyncio.create_task(self._timed_ai_call(prompt, model_name, language))
+        tasks = {primary: model_name}
         try:
-            import aiohttp
-            import os
-            from dotenv import load_dotenv
+            done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+            if primary in done:
+                result = primary.result()
+                if result:
+                    return result
+                return await self._fallback_ai_call(prompt, model_name, hedge_model, language)
+
+            self.stats['hedged_requests'] += 1
+            logger.info(f"⏱️ {model_name} 超过 {hedge_delay:.0f}秒未返回，发送对冲请求到 {hedge_model}")
+            hedge = asyncio.create_task(self._timed_ai_call(prompt, hedge_model, language))
+            tasks[hedge] = hedge_model
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if not result:
+                        continue
+
+                    winner = tasks[task]
+                    logger.info(f"🏁 对冲请求完成，{winner} 先返回结果")
+                    if winner != model_name:
+                        self.stats['hedge_wins'] += 1
+                        result['fallback_used'] = True
+                        result['original_model'] = model_name
+                        result['actual_model'] = winner
+                    result['hedged'] = True
+                    return result
+
+            logger.error(f"❌ {model_name} 和 {hedge_model} 均调用失败")
+            return None
+
+        finally:
+            # 取消落败或仍在进行的请求
+            for task, task_model in tasks.items():
+                if not task.done():
+                    task.cancel()
+                    tracker.record_cancelled(task_model)
+
+    async def _fallback_ai_call(self, prompt: str, model_name: str, fallback_model: str, language: str = "zh") -> Optional[Dict]:
+        """主模型失败后顺序降级"""
+        logger.warning(f"⚠️ {model_name} 调用失败，尝试降级到 {fallback_model}")
+        result = await self._timed_ai_call(prompt, fallback_model, language)
+
+        if result:
+            logger.info(f"✅ 降级到 {fallback_model} 成功")
+            # 在结果中标记使用了降级模型
+            result['fallback_used'] = True
+            result['original_model'] = model_name
+            result['actual_model'] = fallback_model
+        return result
+
+    async def _timed_ai_call(
+        self,
+        prompt: str,
+        model_name: str,
+        language: str = "zh",
+        system_prompt: Optional[str] = None
+    ) -> Optional[Dict]:
+        """调用AI API并记录模型延迟；模型熔断中直接返回None"""
+        breaker = get_circuit_breaker(f"ai_gateway:{model_name}")
+        if not breaker.allow_request():
+            logger.warning(f"⚡ [熔断] {model_name} 熔断中，跳过请求（{breaker.retry_after:.0f}秒后重试）")
+            return None
+
+        tracker = get_model_latency_tracker()
+        start_time = time.time()
+        try:
+            result = await self._try_ai_api_call(prompt, model_name, language, system_prompt)
+        except asyncio.CancelledError:
+            # 对冲落败被取消
+            breaker.release()
+            raise
+
+        if result:
+            tracker.record_success(model_name, time.time() - start_time)
+            breaker.record_success()
+        else:
+            tracker.record_failure(model_name)
+            breaker.record_failure()
+        return result
+
+    def _build_report_cache_key(self, prompt: str, model_name: str, language: str) -> Optional[str]:
+        """报告缓存键：模型 + 系统提示词 + 语言 + 提示词"""
+        if not settings.AI_REPORT_CACHE_ENABLED:
+            return None
+
+        from ..prompts.flight_processor_prompts_v2 import get_consolidated_instructions_prompt
+        system_prompt = get_consolidated_instructions_prompt(language)
+        return get_report_cache().build_key(model_name, system_prompt, language, prompt)
+
+    async def _get_cached_report(self, cache_key: Optional[str]) -> Optional[Dict]:
+        """读取缓存的报告，并更新缓存命中统计"""
+        if not cache_key:
+            return None
+
+        try:
+            cached = await get_report_cache().get(cache_key)
+        except Exception as e:
+            logger.warning(f"⚠️ [报告缓存] 读取失败: {e}")
+            cached = None
+
+        if cached:
+            self.stats['cache_hits'] += 1
+            logger.info(f"💾 [报告缓存] 命中缓存报告 (模型: {cached.get('model')})")
+        else:
+            self.stats['cache_misses'] += 1
+        return cached
+
+    async def _store_cached_report(self, cache_key: Optional[str], report: str, model_name: str):
+        """缓存生成的报告，缓存时长跟随原始数据年龄"""
+        if not cache_key or not report:
+            return
+
+        try:
+            await get_report_cache().set(cache_key, report, model_name, get_tracked_data_age())
+        except Exception as e:
+            logger.warning(f"⚠️ [报告缓存] 写入失败: {e}")
+
+    def _record_llm_spans(
+        self,
+        model_name: str,
+        request: Any,
+        first_byte_at: Optional[float],
+        attributes: Dict[str, Any]
+    ):
+        """
+        记录AI请求的排队、首字节（TTFB）和总耗时
+
+        TTFB: 非流式为收到响应头，流式为收到第一段内容
+        """
+        if request.started_at is None:
+            return
+
+        if attributes.get('cancelled'):
+            status = 'cancelled'
+        elif attributes.get('status_code') == 200 and 'response_chars' in attributes and attributes.get('completed', True):
+            status = 'ok'
+        else:
+            status = 'error'
+
+        prefix = f"llm_call.{model_name}"
+        record_span(f"{prefix}.queue", request.queue_seconds, request.started_at)
+        if first_byte_at is not None:
+            record_span(f"{prefix}.ttfb", first_byte_at - request.started_at, request.started_at)
+        record_span(
+            f"{prefix}.total", time.perf_counter() - request.started_at, request.started_at,
+            status=status, model=model_name, **attributes
+        )
 
-            # 加载环境变量
-            load_dotenv()
-            api_key = os.getenv('AI_API_KEY')
-            ai_api_url = "http://154.19.184.12:3000/v1"
+    async def _try_ai_api_call(
+        self,
+        prompt: str,
+        model_name: str,
+        language: str = "zh",
+        system_prompt: Optional[str] = None
+    ) -> Optional[Dict]:
+        """尝试调用AI API（system_prompt为空时使用报告生成的系统提示词）"""
+        try:
+            import aiohttp
 
-            if not api_key:
+            # 共享连接池客户端（密钥和网关地址在启动时加载）
+            gateway_client = get_ai_gateway_client()
+            if not gateway_client.is_configured:
                 logger.error("AI API密钥未配置")
                 return None
 
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
-
             # 获取优化的系统提示词V3（减少冗余，提高效率）
-            from ..prompts.flight_processor_prompts_v2 import get_consolidated_instructions_prompt
-            system_prompt = get_consolidated_instructions_prompt(language)
+            if system_prompt is None:
+                from ..prompts.flight_processor_prompts_v2 import get_consolidated_instructions_prompt
+                system_prompt = get_consolidated_instructions_prompt(language)
 
             payload = {
                 "model": model_name,
@@ -1775,46 +3034,53 @@ You must strictly follow this key principle: The most successful Skiplagging opp
             # 检查数据量是否过大，如果超过200KB则警告
             if payload_size > 200000:
                 logger.warning(f"⚠️ 请求数据量较大: {payload_size:,} 字节，可能导致403错误")
-                logger.warning("💡 建议：考虑实现数据分批处理或减少数据量")
-
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{ai_api_url}/chat/completions",
-                    headers=headers,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=300)  # 5分钟超时，为大量数据分析预留更多时间
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        content = result['choices'][0]['message']['content']
-
-                        # 处理纯Markdown响应
-                        try:
-                            # 只记录处理成功，不输出任何AI内容
-                            logger.info("AI Markdown响应处理完成")
-
-                            # 新版本返回纯Markdown格式，不再包含JSON
-                            # 直接返回markdown内容作为分析报告
-                            return {
-                                'success': True,  # 添加成功标记
-                                'content': content.strip(),  # 添加内容字段
-                                'flights': [],  # 航班数据现在在markdown中
-                                'ai_analysis_report': content.strip(),
-                                'summary': {
-                                    'total_flights': 0,  # 将从markdown中解析
-                                    'markdown_format': True,
-                                    'processing_method': 'markdown_only'
-                                }
-                            }
+                logger.warning("💡 建议：启用AI_MAP_REDUCE_ENABLED分片分析或减少数据量")
 
-                        except Exception as e:
-                            logger.error(f"AI响应处理失败: {e}")
-                            logger.debug(f"AI原始响应长度: {len(content)} 字符")
-                            return None
-                    else:
+            request = gateway_client.post_chat_completions(
+                payload,
+                timeout=aiohttp.ClientTimeout(total=300)  # 5分钟超时，为大量数据分析预留更多时间
+            )
+            llm_attributes = {'payload_bytes': payload_size, 'prompt_chars': prompt_size, 'stream': False}
+            try:
+                async with request as response:
+                    llm_attributes['status_code'] = response.status
+                    if response.status != 200:
                         logger.error(f"AI API调用失败: {response.status}")
                         return None
 
+                    result = await response.json()
+                    content = result['choices'][0]['message']['content']
+                    llm_attributes['response_chars'] = len(content)
+            except asyncio.CancelledError:
+                llm_attributes['cancelled'] = True
+                raise
+            finally:
+                self._record_llm_spans(model_name, request, request.response_at, llm_attributes)
+
+            # 处理纯Markdown响应
+            try:
+                # 只记录处理成功，不输出任何AI内容
+                logger.info("AI Markdown响应处理完成")
+
+                # 新版本返回纯Markdown格式，不再包含JSON
+                # 直接返回markdown内容作为分析报告
+                return {
+                    'success': True,  # 添加成功标记
+                    'content': content.strip(),  # 添加内容字段
+                    'flights': [],  # 航班数据现在在markdown中
+                    'ai_analysis_report': content.strip(),
+                    'summary': {
+                        'total_flights': 0,  # 将从markdown中解析
+                        'markdown_format': True,
+                        'processing_method': 'markdown_only'
+                    }
+                }
+
+            except Exception as e:
+                logger.error(f"AI响应处理失败: {e}")
+                logger.debug(f"AI原始响应长度: {len(content)} 字符")
+                return None
+
         except asyncio.TimeoutError:
             logger.error("AI API调用超时 (5分钟)")
             return None
@@ -1827,6 +3093,211 @@ You must strictly follow this key principle: The most successful Skiplagging opp
             logger.debug(f"详细错误信息: {traceback.format_exc()}")
             return None
 
+    async def _stream_ai_api(
+        self,
+        prompt: str,
+        model_name: str = "gemini-2.5-pro",
+        language: str = "zh",
+        enable_fallback: bool = True,
+        cache_key: Optional[str] = None,
+        stream_state: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[tuple]:
+        """
+        流式调用AI API，支持模型降级
+
+        只有主模型在产出任何内容之前失败时才降级，已输出的内容无法撤回
+        cache_key: 调用方已查询过的报告缓存键（跳过读取，完整接收后写入该键）；为空时按提示词读写缓存
+        stream_state: 可选，报告完整输出（含缓存命中）时写入 completed=True，中途断开时为False
+
+        Yields:
+            tuple: (实际使用的模型, Markdown片段)
+        """
+        if cache_key is None:
+            cache_key = self._build_report_cache_key(prompt, model_name, language)
+            cached = await self._get_cached_report(cache_key)
+            if cached:
+                if stream_state is not None:
+                    stream_state['completed'] = True
+                yield cached.get('model') or model_name, cached['report']
+                return
+
+        fallback_model = "gemini-2.5-flash" if model_name == "gemini-2.5-pro" else None
+
+        # 流式输出无法对冲（已输出内容不能撤回），只应用超大提示词直接使用快速模型的规则
+        if enable_fallback and fallback_model and self._should_route_to_fast_model(prompt):
+            self.stats['size_routed_requests'] += 1
+            logger.info(f"📏 提示词 {len(prompt):,} 字符超过阈值，直接使用 {fallback_model}")
+            model_name, fallback_model = fallback_model, None
+
+        parts = []
+        model_state = {}
+        used_model = model_name
+        async for content in self._guarded_ai_api_stream(prompt, model_name, language, model_state):
+            parts.append(content)
+            yield model_name, content
+
+        if not parts and enable_fallback and fallback_model:
+            logger.warning(f"⚠️ {model_name} 流式调用失败，尝试降级到 {fallback_model}")
+            used_model = fallback_model
+            model_state = {}
+            async for content in self._guarded_ai_api_stream(prompt, fallback_model, language, model_state):
+                parts.append(content)
+                yield fallback_model, content
+
+        completed = bool(parts) and bool(model_state.get('completed'))
+        if stream_state is not None:
+            stream_state['completed'] = completed
+
+        # 只缓存完整接收的报告，中途断开的流不缓存
+        if completed:
+            await self._store_cached_report(cache_key, ''.join(parts).strip(), used_model)
+
+    async def _guarded_ai_api_stream(
+        self,
+        prompt: str,
+        model_name: str,
+        language: str,
+        stream_state: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """带熔断的流式调用：模型熔断中直接结束，流正常结束记录成功，否则记录失败"""
+        breaker = get_circuit_breaker(f"ai_gateway:{model_name}")
+        if not breaker.allow_request():
+            logger.warning(f"⚡ [熔断] {model_name} 熔断中，跳过流式请求（{breaker.retry_after:.0f}秒后重试）")
+            return
+
+        finished = False
+        try:
+            async for content in self._try_ai_api_stream(prompt, model_name, language, stream_state):
+                yield content
+            finished = True
+        finally:
+            if stream_state.get('completed'):
+                breaker.record_success()
+            elif finished:
+                # 请求失败或流中途断开（已输出部分内容）
+                breaker.record_failure()
+            else:
+                # 客户端断开，无法判断模型是否正常
+                breaker.release()
+
+    async def _try_ai_api_stream(
+        self,
+        prompt: str,
+        model_name: str,
+        language: str = "zh",
+        stream_state: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """
+        尝试以流式方式（stream: true）调用AI API，逐段产出Markdown内容
+
+        stream_state: 可选，收到[DONE]或finish_reason为stop时写入 completed=True；
+            finish_reason为length（输出被截断）或连接在结束标记前关闭视为不完整
+        """
+        try:
+            import aiohttp
+            import json
+
+            gateway_client = get_ai_gateway_client()
+            if not gateway_client.is_configured:
+                logger.error("AI API密钥未配置")
+                return
+
+            from ..prompts.flight_processor_prompts_v2 import get_consolidated_instructions_prompt
+            system_prompt = get_consolidated_instructions_prompt(language)
+
+            payload = {
+                "model": model_name,
+                "messages": [
+                    {
+                        "role": "system",
+                        "content": system_prompt
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+                "temperature": 0.2,
+                "stream": True
+            }
+
+            logger.info(f"🚀 发送流式AI请求 - 模型: {model_name}, Prompt大小: {len(prompt):,} 字符")
+
+            request = gateway_client.post_chat_completions(
+                payload,
+                # 总时长与非流式一致；两次数据之间超过2分钟视为连接中断
+                timeout=aiohttp.ClientTimeout(total=300, sock_read=120),
+                headers={"Accept": "text/event-stream"}
+            )
+            llm_attributes = {'prompt_chars': len(prompt), 'stream': True}
+            first_chunk_at = None
+            response_chars = 0
+            try:
+                async with request as response:
+                    llm_attributes['status_code'] = response.status
+                    if response.status != 200:
+                        logger.error(f"AI API流式调用失败: {response.status}")
+                        return
+
+                    chunk_count = 0
+                    received_done = False
+                    finish_reason = None
+                    async for raw_line in response.content:
+                        line = raw_line.decode('utf-8', errors='ignore').strip()
+                        if not line.startswith('data:'):
+                            continue
+
+                        data = line[len('data:'):].strip()
+                        if data == '[DONE]':
+                            received_done = True
+                            break
+
+                        try:
+                            event = json.loads(data)
+                        except json.JSONDecodeError:
+                            logger.debug(f"忽略无法解析的流式数据: {data[:100]}")
+                            continue
+
+                        choices = event.get('choices') or []
+                        if not choices:
+                            continue
+                        if choices[0].get('finish_reason'):
+                            finish_reason = choices[0]['finish_reason']
+                        content = (choices[0].get('delta') or {}).get('content')
+                        if content:
+                            if first_chunk_at is None:
+                                first_chunk_at = time.perf_counter()
+                            chunk_count += 1
+                            response_chars += len(content)
+                            yield content
+
+                    llm_attributes['response_chars'] = response_chars
+                    llm_attributes['finish_reason'] = finish_reason
+                    completed = finish_reason == 'stop' or (received_done and finish_reason is None)
+                    llm_attributes['completed'] = completed
+                    if completed:
+                        logger.info(f"AI流式响应完成: {chunk_count} 个片段")
+                    else:
+                        logger.warning(
+                            f"⚠️ AI流式响应不完整: {chunk_count} 个片段, "
+                            f"finish_reason={finish_reason}, 收到[DONE]={received_done}"
+                        )
+                    if stream_state is not None:
+                        stream_state['completed'] = completed
+            except (asyncio.CancelledError, GeneratorExit):
+                # 客户端断开
+                llm_attributes['cancelled'] = True
+                raise
+            finally:
+                self._record_llm_spans(model_name, request, first_chunk_at, llm_attributes)
+
+        except asyncio.TimeoutError:
+            logger.error("AI API流式调用超时")
+        except aiohttp.ClientError as e:
+            logger.error(f"AI API流式网络连接错误: {e}")
+        except Exception as e:
+            logger.error(f"流式调用AI API异常: {type(e).__name__}: {e}")
+
 
 # 全局服务实例
 _ai_flight_service: Optional[AIFlightService] = None
@@ -0,0 +1,235 @@
+"""
+AI网关HTTP客户端
+在应用生命周期内复用同一个aiohttp连接池访问OpenAI兼容的AI网关：
+1. Keep-Alive长连接，避免每次请求重新建立TCP连接
+2. 连接池上限和DNS缓存
+3. API密钥和网关地址只在启动时加载一次
+4. 提供连接池指标（新建/复用连接数、进行中请求数）
+5. 记录每个请求等待连接的排队时间和收到响应头的时间（供搜索追踪使用）
+"""
+import time
+from typing import Any, Dict, Optional
+from loguru import logger
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"aiohttp导入失败: {e}")
+    AIOHTTP_AVAILABLE = False
+    aiohttp = None
+
+from fastapi_app.config import settings
+
+
+class AIGatewayClient:
+    """AI网关共享HTTP客户端"""
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: Optional[str],
+        pool_limit: int = 20,
+        keepalive_timeout: int = 60,
+        dns_ttl: int = 300
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.pool_limit = pool_limit
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_ttl = dns_ttl
+
+        self._session = None
+        self._connector = None
+
+        self.stats = {
+            'requests': 0,
+            'in_flight': 0,
+            'errors': 0,
+            'connections_created': 0,
+            'connections_reused': 0,
+            'sessions_created': 0
+        }
+        logger.info(f"AIGatewayClient初始化成功: {self.base_url}")
+
+    @property
+    def is_configured(self) -> bool:
+        """是否配置了API密钥"""
+        return bool(self.api_key)
+
+    @property
+    def chat_completions_url(self) -> str:
+        return f"{self.base_url}/chat/completions"
+
+    async def start(self):
+        """创建连接池（应用启动时调用）"""
+        if not AIOHTTP_AVAILABLE:
+            logger.warning("aiohttp不可用，AI网关客户端未启动")
+            return
+
+        if self._session and not self._session.closed:
+            return
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(self._on_connection_create)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuse)
+        trace_config.on_connection_queued_start.append(self._on_connection_queued_start)
+        trace_config.on_connection_queued_end.append(self._on_connection_queued_end)
+
+        self._connector = aiohttp.TCPConnector(
+            limit=self.pool_limit,
+            limit_per_host=self.pool_limit,
+            ttl_dns_cache=self.dns_ttl,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        self._session = aiohttp.ClientSession(
+            connector=self._connector,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json"
+            },
+            trace_configs=[trace_config]
+        )
+        self.stats['sessions_created'] += 1
+        logger.info(f"✅ AI网关连接池已创建: limit={self.pool_limit}, keepalive={self.keepalive_timeout}s")
+
+    async def close(self):
+        """关闭连接池（应用关闭时调用）"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+            logger.info("AI网关连接池已关闭")
+        self._session = None
+        self._connector = None
+
+    async def get_session(self):
+        """获取共享会话；未在生命周期中启动时（如脚本调用）按需创建"""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    def post_chat_completions(self, payload: Dict[str, Any], timeout: Any = None, headers: Optional[Dict[str, str]] = None):
+        """
+        发送chat/completions请求
+
+        用法: async with client.post_chat_completions(payload, timeout=...) as response
+        """
+        return _TrackedRequest(self, payload, timeout, headers)
+
+    async def _on_connection_create(self, session, trace_config_ctx, params):
+        self.stats['connections_created'] += 1
+
+    async def _on_connection_reuse(self, session, trace_config_ctx, params):
+        self.stats['connections_reused'] += 1
+
+    async def _on_connection_queued_start(self, session, trace_config_ctx, params):
+        request = trace_config_ctx.trace_request_ctx
+        if isinstance(request, _TrackedRequest):
+            request._queued_at = time.perf_counter()
+
+    async def _on_connection_queued_end(self, session, trace_config_ctx, params):
+        request = trace_config_ctx.trace_request_ctx
+        if isinstance(request, _TrackedRequest) and request._queued_at is not None:
+            request.queue_seconds += time.perf_counter() - request._queued_at
+            request._queued_at = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接池指标"""
+        pool = {
+            'limit': self.pool_limit,
+            'active': False
+        }
+        if self._connector is not None and not self._connector.closed:
+            pool['active'] = True
+            # aiohttp未公开以下计数，读取失败时忽略
+            pool['acquired_connections'] = len(getattr(self._connector, '_acquired', ()))
+            pool['idle_connections'] = sum(
+                len(conns) for conns in getattr(self._connector, '_conns', {}).values()
+            )
+
+        created = self.stats['connections_created']
+        reused = self.stats['connections_reused']
+        return {
+            **self.stats,
+            'connection_reuse_rate': reused / (created + reused) if (created + reused) > 0 else 0,
+            'pool': pool
+        }
+
+
+class _TrackedRequest:
+    """
+    记录进行中请求数和错误数的请求上下文
+
+    请求结束后可读取耗时（time.perf_counter()时刻）：
+    - started_at: 开始请求
+    - queue_seconds: 等待连接池空闲连接的时间
+    - response_at: 收到响应头
+    """
+
+    def __init__(self, client: AIGatewayClient, payload: Dict[str, Any], timeout: Any, headers: Optional[Dict[str, str]]):
+        self._client = client
+        self._payload = payload
+        self._timeout = timeout
+        self._headers = headers
+        self._request_ctx = None
+        self._queued_at: Optional[float] = None
+        self.started_at: Optional[float] = None
+        self.queue_seconds = 0.0
+        self.response_at: Optional[float] = None
+
+    async def __aenter__(self):
+        self._client.stats['requests'] += 1
+        self._client.stats['in_flight'] += 1
+        self.started_at = time.perf_counter()
+        try:
+            session = await self._client.get_session()
+            self._request_ctx = session.post(
+                self._client.chat_completions_url,
+                json=self._payload,
+                timeout=self._timeout,
+                headers=self._headers,
+                trace_request_ctx=self
+            )
+            response = await self._request_ctx.__aenter__()
+            self.response_at = time.perf_counter()
+            return response
+        except BaseException:
+            self._client.stats['in_flight'] -= 1
+            self._client.stats['errors'] += 1
+            raise
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._client.stats['in_flight'] -= 1
+        if exc_type is not None:
+            self._client.stats['errors'] += 1
+        return await self._request_ctx.__aexit__(exc_type, exc, tb)
+
+
+# 全局客户端实例
+_ai_gateway_client: Optional[AIGatewayClient] = None
+
+
+def get_ai_gateway_client() -> AIGatewayClient:
+    """获取AI网关客户端实例（单例模式）"""
+    global _ai_gateway_client
+    if _ai_gateway_client is None:
+        _ai_gateway_client = AIGatewayClient(
+            base_url=settings.AI_API_BASE_URL,
+            api_key=settings.AI_API_KEY,
+            pool_limit=settings.AI_GATEWAY_POOL_LIMIT,
+            keepalive_timeout=settings.AI_GATEWAY_KEEPALIVE_TIMEOUT,
+            dns_ttl=settings.AI_GATEWAY_DNS_TTL
+        )
+    return _ai_gateway_client
+
+
+async def start_ai_gateway_client():
+    """启动AI网关客户端"""
+    await get_ai_gateway_client().start()
+
+
+async def close_ai_gateway_client():
+    """关闭AI网关客户端"""
+    global _ai_gateway_client
+    if _ai_gateway_client:
+        await _ai_gateway_client.close()
+        _ai_gateway_client = None
@@ -4,13 +4,13 @@ FastAPI版本的AI服务
 """
 import os
 import json
-import asyncio
 from typing import Dict, Any, Optional, List
 from loguru import logger
 import google.generativeai as genai
 
 from fastapi_app.models.travel import TravelPlanRequest, TravelPlanResponse
 from fastapi_app.config import settings
+from fastapi_app.services.executor_pools import get_executor_pool
 from .amap_mcp_service import get_amap_mcp_service, close_amap_mcp_service
 
 
@@ -238,7 +238,7 @@ class FastAPIAIService:
             logger.info("📡 调用Gemini API...")
             
             # 异步生成内容
-            response = await asyncio.to_thread(
+            response = await get_executor_pool('gemini').run(
                 self.model.generate_content,
                 full_prompt
             )
@@ -0,0 +1,155 @@
+"""
+超大航班数据分片（map-reduce分析）
+提示词超过网关安全大小时，把清理后的航班切成多个分片，分别交给快速模型提取候选航班，再合并生成报告：
+1. 按数据源分组，组内按价格升序排列（缺失价格排在最后），每个分片是"数据源 + 价格区间"
+2. 按序列化大小依次装入分片，单个分片不超过目标token预算
+3. 分片数超过上限时等比放大单个分片的预算，保证并发请求数可控
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+
+from fastapi_app.config import settings
+from fastapi_app.utils.price import extract_prices, sort_by_price
+
+
+# 估算token数时每个token对应的字符数（航班JSON以英文字段为主，混有中文名称，取偏保守的值）
+CHARS_PER_TOKEN = 3.0
+
+# 分片内航班之间的分隔开销（字符）
+_FLIGHT_SEPARATOR_CHARS = 2
+
+
+def _flight_size(flight: Any) -> int:
+    """航班序列化后的字符数"""
+    try:
+        return len(json.dumps(flight, ensure_ascii=False, default=str, separators=(',', ':')))
+    except (TypeError, ValueError):
+        return len(str(flight))
+
+
+def estimate_tokens(chars: int) -> int:
+    """按字符数估算token数"""
+    return int(chars / CHARS_PER_TOKEN) + 1
+
+
+class AnalysisSharder:
+    """按数据源和价格区间切分航班，控制每个分片的token预算"""
+
+    def __init__(self, shard_tokens: int = 24000, max_shards: int = 8):
+        self.shard_tokens = shard_tokens
+        self.max_shards = max_shards
+
+        self.stats = {
+            'shard_calls': 0,
+            'shards_built': 0,
+            'flights_sharded': 0
+        }
+        logger.info(f"AnalysisSharder初始化成功: 每分片{shard_tokens} tokens, 最多{max_shards}个分片")
+
+    def shard(self, flights_by_source: Dict[str, list]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        切分航班
+
+        Args:
+            flights_by_source: {'google': [...], 'kiwi': [...], 'ai': [...]} 清理后的航班
+
+        Returns:
+            (分片列表, 报告)；分片包含source、flights、price_min、price_max、chars、est_tokens
+        """
+        groups = []
+        total_chars = 0
+        for source, flights in flights_by_source.items():
+            flights = [flight for flight in flights or [] if isinstance(flight, dict)]
+            if not flights:
+                continue
+            ordered = sort_by_price(flights)
+            sizes = [_flight_size(flight) + _FLIGHT_SEPARATOR_CHARS for flight in ordered]
+            groups.append((source, ordered, sizes))
+            total_chars += sum(sizes)
+
+        # 分片数不超过上限：总量过大时放大单个分片预算
+        budget_chars = int(self.shard_tokens * CHARS_PER_TOKEN)
+        if self.max_shards > 0:
+            budget_chars = max(budget_chars, -(-total_chars // self.max_shards))
+
+        shards = []
+        for source, ordered, sizes in groups:
+            current: List[Dict[str, Any]] = []
+            current_chars = 0
+            for flight, size in zip(ordered, sizes):
+                if current and current_chars + size > budget_chars:
+                    shards.append(self._make_shard(source, current, current_chars))
+                    current, current_chars = [], 0
+                current.append(flight)
+                current_chars += size
+            if current:
+                shards.append(self._make_shard(source, current, current_chars))
+
+        # 每个数据源至少一个分片，数据源较多时仍可能略超上限：合并同数据源中最小的相邻分片
+        while self.max_shards > 0 and len(shards) > self.max_shards:
+            if not self._merge_smallest_pair(shards):
+                break
+
+        for index, shard in enumerate(shards, 1):
+            shard['index'] = index
+
+        flights_total = sum(len(shard['flights']) for shard in shards)
+        report = {
+            'flights': flights_total,
+            'shards': len(shards),
+            'total_chars': total_chars,
+            'budget_tokens': estimate_tokens(budget_chars),
+            'max_shard_tokens': max((shard['est_tokens'] for shard in shards), default=0)
+        }
+
+        self.stats['shard_calls'] += 1
+        self.stats['shards_built'] += len(shards)
+        self.stats['flights_sharded'] += flights_total
+        return shards, report
+
+    def _make_shard(self, source: str, flights: List[Dict[str, Any]], chars: int) -> Dict[str, Any]:
+        # NaN（缺失价格）不参与价格区间
+        prices = [float(price) for price in extract_prices(flights) if price == price]
+        return {
+            'source': source,
+            'flights': flights,
+            'price_min': min(prices) if prices else None,
+            'price_max': max(prices) if prices else None,
+            'chars': chars,
+            'est_tokens': estimate_tokens(chars)
+        }
+
+    def _merge_smallest_pair(self, shards: List[Dict[str, Any]]) -> bool:
+        """合并同一数据源中合计最小的相邻分片，没有可合并的分片时返回False"""
+        best: Optional[int] = None
+        for i in range(len(shards) - 1):
+            if shards[i]['source'] != shards[i + 1]['source']:
+                continue
+            if best is None or shards[i]['chars'] + shards[i + 1]['chars'] < shards[best]['chars'] + shards[best + 1]['chars']:
+                best = i
+        if best is None:
+            return False
+
+        left, right = shards[best], shards.pop(best + 1)
+        shards[best] = self._make_shard(left['source'], left['flights'] + right['flights'], left['chars'] + right['chars'])
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取分片统计信息"""
+        return dict(self.stats)
+
+
+# 全局分片实例
+_analysis_sharder: Optional[AnalysisSharder] = None
+
+
+def get_analysis_sharder() -> AnalysisSharder:
+    """获取航班分片实例（单例模式）"""
+    global _analysis_sharder
+    if _analysis_sharder is None:
+        _analysis_sharder = AnalysisSharder(
+            shard_tokens=settings.AI_MAP_REDUCE_SHARD_TOKENS,
+            max_shards=settings.AI_MAP_REDUCE_MAX_SHARDS
+        )
+    return _analysis_sharder
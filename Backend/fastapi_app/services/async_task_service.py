@@ -213,13 +213,88 @@ class AsyncTaskService:
             logger.error(f"获取任务结果失败 {task_id}: {e}")
             return None
     
+    async def save_task_stage_results(self, task_id: str, stage_results: Dict[str, Any]) -> bool:
+        """保存已完成数据源阶段的航班和预览排序（AI报告生成前可查询）"""
+        try:
+            await self.cache_service.set(
+                self._get_task_key(task_id, "stages"),
+                stage_results,
+                expire=self.default_ttl
+            )
+            return True
+        except Exception as e:
+            logger.error(f"保存任务分阶段结果失败 {task_id}: {e}")
+            return False
+
+    async def get_task_stage_results(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取已完成数据源阶段的航班和预览排序"""
+        try:
+            return await self.cache_service.get(
+                self._get_task_key(task_id, "stages"),
+                dict
+            )
+        except Exception as e:
+            logger.error(f"获取任务分阶段结果失败 {task_id}: {e}")
+            return None
+
+    async def save_task_trace(self, task_id: str, trace: Dict[str, Any]) -> bool:
+        """保存任务的分阶段耗时记录（搜索trace）"""
+        try:
+            await self.cache_service.set(
+                self._get_task_key(task_id, "trace"),
+                trace,
+                expire=self.default_ttl
+            )
+            return True
+        except Exception as e:
+            logger.error(f"保存任务耗时记录失败 {task_id}: {e}")
+            return False
+
+    async def get_task_trace(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务的分阶段耗时记录"""
+        try:
+            return await self.cache_service.get(
+                self._get_task_key(task_id, "trace"),
+                dict
+            )
+        except Exception as e:
+            logger.error(f"获取任务耗时记录失败 {task_id}: {e}")
+            return None
+
+    async def append_task_result_chunk(self, task_id: str, chunk: str) -> bool:
+        """追加流式结果片段（AI分析报告的Markdown片段）"""
+        try:
+            length = await self.cache_service.append(
+                self._get_task_key(task_id, "stream"),
+                chunk,
+                expire=self.default_ttl
+            )
+            return length > 0
+        except Exception as e:
+            logger.error(f"追加任务流式结果失败 {task_id}: {e}")
+            return False
+
+    async def get_task_partial_result(self, task_id: str) -> Optional[str]:
+        """获取已接收的流式结果（任务完成前的部分报告）"""
+        try:
+            return await self.cache_service.get(
+                self._get_task_key(task_id, "stream"),
+                str
+            )
+        except Exception as e:
+            logger.error(f"获取任务流式结果失败 {task_id}: {e}")
+            return None
+
     async def delete_task(self, task_id: str) -> bool:
         """删除任务（清理资源）"""
         try:
             keys_to_delete = [
                 self._get_task_key(task_id, "info"),
                 self._get_task_key(task_id, "status"),
-                self._get_task_key(task_id, "result")
+                self._get_task_key(task_id, "result"),
+                self._get_task_key(task_id, "stream"),
+                self._get_task_key(task_id, "stages"),
+                self._get_task_key(task_id, "trace")
             ]
             
             for key in keys_to_delete:
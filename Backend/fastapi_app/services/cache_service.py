@@ -135,6 +135,38 @@ class CacheService:
             logger.error(f"设置缓存失败 {key}: {e}")
             return False
     
+    async def set_if_not_exists(self, key: str, value: Any, expire: Optional[int] = None) -> Optional[bool]:
+        """
+        仅当键不存在时设置缓存值（用于分布式租约）
+
+        Returns:
+            True: 设置成功；False: 键已存在；None: Redis不可用或出错（调用方不能当作键已存在）
+        """
+        if not self.redis:
+            return None
+
+        try:
+            serialized_value = self._serialize_value(value)
+            result = await self.redis.set(key, serialized_value, ex=expire, nx=True)
+            return bool(result)
+        except Exception as e:
+            logger.error(f"设置缓存(NX)失败 {key}: {e}")
+            return None
+
+    async def append(self, key: str, value: str, expire: Optional[int] = None) -> int:
+        """追加字符串到缓存值末尾（用于流式结果），返回追加后的长度"""
+        if not self.redis:
+            return 0
+
+        try:
+            length = await self.redis.append(key, value)
+            if expire:
+                await self.redis.expire(key, expire)
+            return length
+        except Exception as e:
+            logger.error(f"追加缓存失败 {key}: {e}")
+            return 0
+
     async def delete(self, key: str) -> bool:
         """删除缓存"""
         if not self.redis:
@@ -0,0 +1,201 @@
+"""
+上游服务熔断器
+为smart-flights、Kiwi、Trip.com、AI网关、邮件等上游提供统一的熔断保护：
+1. 关闭（closed）：正常请求，按滑动时间窗口统计错误率
+2. 打开（open）：错误率超过阈值后直接快速失败，不再等待上游超时
+3. 半开（half_open）：冷却时间结束后放行一个试探请求，成功则关闭，失败则重新打开
+所有服务共享同一组熔断器（按上游名称区分）
+"""
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+from loguru import logger
+
+from fastapi_app.config import settings
+
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时的快速失败异常"""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"{name} 熔断中，{retry_after:.0f}秒后重试")
+
+
+class CircuitBreaker:
+    """单个上游的熔断器"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        window_seconds: float = 60,
+        min_calls: int = 5,
+        open_seconds: float = 30
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+
+        self.state = STATE_CLOSED
+        # 滑动窗口: (时间戳, 是否成功)
+        self._events: deque = deque()
+        self._opened_at = 0.0
+        # 半开状态下正在进行的试探请求开始时间
+        self._trial_started_at: Optional[float] = None
+
+        self.stats = {
+            'successes': 0,
+            'failures': 0,
+            'rejected': 0,
+            'times_opened': 0
+        }
+
+    def allow_request(self) -> bool:
+        """是否放行请求（半开状态下同时只放行一个试探请求）"""
+        now = time.monotonic()
+        if self.state == STATE_OPEN:
+            if now - self._opened_at < self.open_seconds:
+                self.stats['rejected'] += 1
+                return False
+            self._transition(STATE_HALF_OPEN)
+
+        if self.state == STATE_HALF_OPEN:
+            # 试探请求未记录结果且超过冷却时间时，允许新的试探请求
+            if self._trial_started_at is not None and now - self._trial_started_at < self.open_seconds:
+                self.stats['rejected'] += 1
+                return False
+            self._trial_started_at = now
+
+        return True
+
+    def check(self):
+        """放行检查，熔断中抛出CircuitOpenError"""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self.retry_after)
+
+    def record_success(self):
+        self.stats['successes'] += 1
+        self._add_event(True)
+        if self.state == STATE_HALF_OPEN:
+            self._transition(STATE_CLOSED)
+
+    def record_failure(self):
+        self.stats['failures'] += 1
+        self._add_event(False)
+        if self.state == STATE_HALF_OPEN:
+            self._transition(STATE_OPEN)
+        elif self.state == STATE_CLOSED and self._should_open():
+            self._transition(STATE_OPEN)
+
+    def release(self):
+        """请求被取消、没有结果时释放半开试探名额"""
+        if self.state == STATE_HALF_OPEN:
+            self._trial_started_at = None
+
+    @asynccontextmanager
+    async def guard(self, neutral_exceptions: tuple = ()):
+        """
+        用法: async with breaker.guard(): ...
+
+        熔断中抛出CircuitOpenError；代码块抛出异常记为失败，正常结束记为成功
+        neutral_exceptions: 与上游无关的异常（如本地线程池已满），不计入成功或失败
+        """
+        self.check()
+        try:
+            yield self
+        except neutral_exceptions:
+            self.release()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # 任务取消等情况不计入成功或失败
+            self.release()
+            raise
+        self.record_success()
+
+    @property
+    def retry_after(self) -> float:
+        if self.state != STATE_OPEN:
+            return 0.0
+        return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def _add_event(self, success: bool):
+        now = time.monotonic()
+        self._events.append((now, success))
+        while self._events and now - self._events[0][0] > self.window_seconds:
+            self._events.popleft()
+
+    def _window_counts(self) -> tuple:
+        now = time.monotonic()
+        while self._events and now - self._events[0][0] > self.window_seconds:
+            self._events.popleft()
+        failures = sum(1 for _, success in self._events if not success)
+        return len(self._events), failures
+
+    def _should_open(self) -> bool:
+        calls, failures = self._window_counts()
+        return calls >= self.min_calls and failures / calls >= self.failure_rate_threshold
+
+    def _transition(self, state: str):
+        previous = self.state
+        self.state = state
+        self._trial_started_at = None
+
+        if state == STATE_OPEN:
+            self._opened_at = time.monotonic()
+            self.stats['times_opened'] += 1
+            logger.warning(f"⚡ [熔断] {self.name}: {previous} → open，{self.open_seconds:.0f}秒内快速失败")
+        elif state == STATE_HALF_OPEN:
+            logger.info(f"⚡ [熔断] {self.name}: open → half_open，放行试探请求")
+        else:
+            # 恢复后重新统计
+            self._events.clear()
+            logger.info(f"✅ [熔断] {self.name}: {previous} → closed，上游已恢复")
+
+    def get_state(self) -> Dict[str, Any]:
+        """获取熔断器状态"""
+        calls, failures = self._window_counts()
+        return {
+            'state': self.state,
+            'window_calls': calls,
+            'window_failures': failures,
+            'window_error_rate': failures / calls if calls > 0 else 0,
+            'retry_after_seconds': round(self.retry_after, 1),
+            **self.stats
+        }
+
+
+# 全局熔断器（按上游名称共享）
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """获取指定上游的熔断器（不存在时按配置创建）"""
+    breaker = _circuit_breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            name,
+            failure_rate_threshold=settings.CIRCUIT_BREAKER_FAILURE_RATE,
+            window_seconds=settings.CIRCUIT_BREAKER_WINDOW_SECONDS,
+            min_calls=settings.CIRCUIT_BREAKER_MIN_CALLS,
+            open_seconds=settings.CIRCUIT_BREAKER_OPEN_SECONDS
+        )
+        _circuit_breakers[name] = breaker
+    return breaker
+
+
+def get_circuit_breaker_states() -> Dict[str, Dict[str, Any]]:
+    """获取所有熔断器状态"""
+    return {name: breaker.get_state() for name, breaker in sorted(_circuit_breakers.items())}
@@ -0,0 +1,171 @@
+"""
+阻塞调用专用线程池
+按工作负载划分独立的线程池，避免某个慢上游占满默认线程池：
+- google_flights: smart-flights常规搜索
+- hidden_city: 隐藏城市指定中转搜索
+- trip_com: Trip.com监控数据请求
+- email: SMTP邮件发送
+- gemini: Gemini SDK调用（旅行规划）
+每个线程池独立配置线程数和排队上限，并记录排队深度、等待时间
+调用方超时或取消后线程中的阻塞调用仍会继续执行，进行中任务数在线程任务真正结束时才减少
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple
+from loguru import logger
+
+from fastapi_app.config import settings
+
+
+class ExecutorPoolFullError(Exception):
+    """线程池排队已满，拒绝新任务"""
+
+    def __init__(self, name: str, pending: int):
+        self.name = name
+        self.pending = pending
+        super().__init__(f"线程池 {name} 已满（{pending}个任务进行中）")
+
+
+class ExecutorPool:
+    """带准入限制和指标的命名线程池"""
+
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        # 进行中（排队 + 执行）任务上限，0表示不限制
+        self.max_pending = max(0, max_pending)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"pool-{name}")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'cancelled': 0,
+            'abandoned': 0,
+            'total_wait_seconds': 0.0,
+            'max_wait_seconds': 0.0,
+            'total_run_seconds': 0.0
+        }
+        logger.info(f"ExecutorPool初始化成功: {name}, workers={self.max_workers}, max_pending={self.max_pending}")
+
+    async def run(self, func: Callable, *args) -> Any:
+        """
+        在线程池中执行阻塞函数
+
+        Raises:
+            ExecutorPoolFullError: 进行中任务数达到上限
+        """
+        if self.max_pending and self._pending >= self.max_pending:
+            self.stats['rejected'] += 1
+            logger.warning(f"⚠️ [线程池] {self.name} 已满（{self._pending}个任务），拒绝新任务")
+            raise ExecutorPoolFullError(self.name, self._pending)
+
+        submitted_at = time.monotonic()
+
+        def timed_call():
+            started_at = time.monotonic()
+            wait_seconds = started_at - submitted_at
+            with self._lock:
+                self._running += 1
+                self.stats['total_wait_seconds'] += wait_seconds
+                self.stats['max_wait_seconds'] = max(self.stats['max_wait_seconds'], wait_seconds)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self.stats['total_run_seconds'] += time.monotonic() - started_at
+
+        with self._lock:
+            self._pending += 1
+            self.stats['submitted'] += 1
+        future = self._executor.submit(timed_call)
+        # 在线程任务结束（或排队中被取消）时释放准入名额：等待方超时后阻塞调用仍占用线程
+        future.add_done_callback(self._on_done)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                with self._lock:
+                    self.stats['abandoned'] += 1
+            raise
+
+    def _on_done(self, future):
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled():
+                self.stats['cancelled'] += 1
+            elif future.exception() is not None:
+                self.stats['failed'] += 1
+            else:
+                self.stats['completed'] += 1
+
+    def shutdown(self):
+        """关闭线程池（不等待进行中的任务）"""
+        self._executor.shutdown(wait=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取线程池指标"""
+        with self._lock:
+            running = self._running
+            stats = dict(self.stats)
+        started = stats['completed'] + stats['failed']
+        return {
+            **stats,
+            'max_workers': self.max_workers,
+            'max_pending': self.max_pending,
+            'in_flight': self._pending,
+            'running': running,
+            # 已提交但尚未开始执行的任务数
+            'queue_depth': max(0, self._pending - running),
+            'avg_wait_seconds': stats['total_wait_seconds'] / started if started > 0 else 0,
+            'avg_run_seconds': stats['total_run_seconds'] / started if started > 0 else 0
+        }
+
+
+def _pool_config() -> Dict[str, Tuple[int, int]]:
+    """线程池配置: 名称 -> (线程数, 进行中任务上限)"""
+    return {
+        'google_flights': (settings.EXECUTOR_GOOGLE_FLIGHTS_WORKERS, settings.EXECUTOR_GOOGLE_FLIGHTS_MAX_PENDING),
+        'hidden_city': (settings.EXECUTOR_HIDDEN_CITY_WORKERS, settings.EXECUTOR_HIDDEN_CITY_MAX_PENDING),
+        'trip_com': (settings.EXECUTOR_TRIP_COM_WORKERS, settings.EXECUTOR_TRIP_COM_MAX_PENDING),
+        'email': (settings.EXECUTOR_EMAIL_WORKERS, settings.EXECUTOR_EMAIL_MAX_PENDING),
+        'gemini': (settings.EXECUTOR_GEMINI_WORKERS, settings.EXECUTOR_GEMINI_MAX_PENDING)
+    }
+
+
+# 全局线程池（按名称共享）
+_executor_pools: Dict[str, ExecutorPool] = {}
+
+
+def get_executor_pool(name: str) -> ExecutorPool:
+    """获取指定工作负载的线程池（单例模式）"""
+    pool = _executor_pools.get(name)
+    if pool is None:
+        config = _pool_config()
+        if name not in config:
+            raise ValueError(f"未配置的线程池: {name}")
+        max_workers, max_pending = config[name]
+        pool = ExecutorPool(name, max_workers, max_pending)
+        _executor_pools[name] = pool
+    return pool
+
+
+def get_executor_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """获取所有已创建线程池的指标"""
+    return {name: pool.get_stats() for name, pool in sorted(_executor_pools.items())}
+
+
+def shutdown_executor_pools():
+    """关闭所有线程池（应用关闭时调用）"""
+    global _executor_pools
+    for pool in _executor_pools.values():
+        pool.shutdown()
+    _executor_pools = {}
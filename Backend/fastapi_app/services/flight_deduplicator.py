@@ -0,0 +1,243 @@
+"""
+跨数据源航班去重服务
+Google Flights、Kiwi和AI推荐经常返回同一行程，合并后再交给AI分析：
+1. 按航段的航空公司、航班号、出发时间生成行程键
+2. 相同行程只保留一条记录（币种相同时价格取最低，币种不同时保留先出现的记录）
+3. 保留来源标记（search_type、is_hidden_city）
+"""
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+
+
+# 数据源对应的搜索类型（与分析提示词中的search_type一致）
+SOURCE_SEARCH_TYPES = {
+    'google': 'regular',
+    'kiwi': 'hidden_city',
+    'ai': 'ai_recommended'
+}
+
+
+def _normalize_flight_number(carrier: str, flight_number: Any) -> str:
+    """统一航班号格式：去掉空格/连字符、航空公司前缀和前导0（如 "CX 0101" → "101"）"""
+    number = re.sub(r'[^0-9A-Z]', '', str(flight_number or '').upper())
+    if carrier and number.startswith(carrier) and len(number) > len(carrier):
+        number = number[len(carrier):]
+    return number.lstrip('0') or number
+
+
+def _normalize_departure(value: Any) -> str:
+    """统一出发时间到分钟精度的当地时间"""
+    if not value:
+        return ''
+    if isinstance(value, (int, float)):
+        try:
+            value = datetime.fromtimestamp(value)
+        except (OverflowError, OSError, ValueError):
+            return ''
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return value.strip()
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None).strftime('%Y-%m-%dT%H:%M')
+    return str(value)
+
+
+def _to_price(value: Any) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    digits = ''.join(ch for ch in str(value) if ch.isdigit() or ch == '.')
+    try:
+        return float(digits) if digits else None
+    except ValueError:
+        return None
+
+
+def _to_currency(flight: Dict[str, Any]) -> str:
+    """航班价格币种（大写），没有币种字段时为空字符串"""
+    return str(flight.get('currency') or '').strip().upper()
+
+
+class FlightDeduplicator:
+    """跨数据源航班去重"""
+
+    def __init__(self):
+        self.stats = {
+            'dedup_calls': 0,
+            'flights_in': 0,
+            'flights_out': 0,
+            'cross_source_merges': 0,
+            'currency_mismatches': 0
+        }
+        logger.info("FlightDeduplicator初始化成功")
+
+    def build_key(self, flight: Dict[str, Any]) -> Optional[Tuple]:
+        """
+        生成行程键：每个航段的 (航空公司, 航班号, 出发时间)
+
+        兼容Google/AI推荐的legs和Kiwi的route_segments，缺少航段信息时返回None（不参与去重）
+        """
+        segments = flight.get('legs') or flight.get('route_segments') or []
+        if not isinstance(segments, list):
+            segments = []
+
+        key = []
+        for segment in segments:
+            if not isinstance(segment, dict):
+                continue
+            carrier = str(segment.get('airline') or segment.get('carrier') or '').strip().upper()
+            departure = segment.get('departure_datetime') or segment.get('departure_time')
+            key.append((
+                carrier,
+                _normalize_flight_number(carrier, segment.get('flight_number')),
+                _normalize_departure(departure)
+            ))
+
+        if not key:
+            carrier = str(flight.get('carrier_code') or flight.get('airline') or '').strip().upper()
+            key.append((
+                carrier,
+                _normalize_flight_number(carrier, flight.get('flight_number') or flight.get('flightNumber')),
+                _normalize_departure(flight.get('departure_time') or flight.get('departureTime'))
+            ))
+
+        # 任一航段缺少航班号或出发时间时无法可靠判断是否重复
+        if any(not number or not departure for _, number, departure in key):
+            return None
+        return tuple(key)
+
+    def deduplicate(self, flights_by_source: Dict[str, list]) -> Tuple[Dict[str, list], Dict[str, Any]]:
+        """
+        合并各数据源中的重复行程
+
+        币种相同时保留价格最低的记录，放回其所属数据源列表；币种不同的价格无法比较（如Kiwi的USD与Google的CNY），
+        保留先出现的记录。合并了多个来源时记录search_type和search_types，任一来源是隐藏城市航班则保留is_hidden_city=True
+
+        Args:
+            flights_by_source: {数据源('google'/'kiwi'/'ai'): 清理后的航班列表}
+
+        Returns:
+            tuple: (去重后的按数据源拆分的航班, 去重报告)
+        """
+        # 行程键 -> 合并组 {'source', 'flight', 'price', 'currency', 'search_types', 'is_hidden_city', 'count'}
+        groups: Dict[Tuple, Dict[str, Any]] = {}
+        # 每个数据源保留的条目：无法去重的记录原样保留，行程键表示该位置由合并组决定
+        slots: Dict[str, List[Any]] = {}
+        total = 0
+        currency_mismatches = 0
+
+        for source, flights in flights_by_source.items():
+            slots[source] = []
+            if not isinstance(flights, list):
+                continue
+            for flight in flights:
+                if not isinstance(flight, dict):
+                    slots[source].append(flight)
+                    continue
+
+                total += 1
+                key = self.build_key(flight)
+                if key is None:
+                    slots[source].append(flight)
+                    continue
+
+                search_type = SOURCE_SEARCH_TYPES.get(source, source)
+                price = _to_price(flight.get('price'))
+                currency = _to_currency(flight)
+                group = groups.get(key)
+                if group is None:
+                    groups[key] = {
+                        'source': source,
+                        'flight': flight,
+                        'price': price,
+                        'currency': currency,
+                        'search_types': [search_type],
+                        'is_hidden_city': bool(flight.get('is_hidden_city')),
+                        'count': 1
+                    }
+                    slots[source].append(key)
+                    continue
+
+                group['count'] += 1
+                group['is_hidden_city'] = group['is_hidden_city'] or bool(flight.get('is_hidden_city'))
+                if search_type not in group['search_types']:
+                    group['search_types'].append(search_type)
+                if currency != group['currency']:
+                    # 币种不同的价格不可比较，保留原记录，只合并来源标记
+                    currency_mismatches += 1
+                    continue
+                if price is not None and (group['price'] is None or price < group['price']):
+                    # 更便宜的记录替换原记录，并移动到其所属的数据源
+                    slots[group['source']].remove(key)
+                    slots[source].append(key)
+                    group.update({'source': source, 'flight': flight, 'price': price})
+
+        merged_by_source: Dict[str, list] = {}
+        cross_source_merges = 0
+        for source, items in slots.items():
+            if not isinstance(flights_by_source.get(source), list):
+                merged_by_source[source] = flights_by_source.get(source)
+                continue
+
+            merged = []
+            for item in items:
+                if not isinstance(item, tuple):
+                    merged.append(item)
+                    continue
+                group = groups[item]
+                flight = group['flight']
+                if group['count'] > 1:
+                    flight = dict(flight)
+                    if group['is_hidden_city']:
+                        flight['is_hidden_city'] = True
+                    if len(group['search_types']) > 1:
+                        cross_source_merges += 1
+                        flight['search_type'] = SOURCE_SEARCH_TYPES.get(source, source)
+                        flight['search_types'] = group['search_types']
+                merged.append(flight)
+            merged_by_source[source] = merged
+
+        flights_out = sum(
+            1 for flights in merged_by_source.values() if isinstance(flights, list)
+            for flight in flights if isinstance(flight, dict)
+        )
+        report = {
+            'flights_in': total,
+            'flights_out': flights_out,
+            'duplicates_removed': total - flights_out,
+            'cross_source_merges': cross_source_merges,
+            'currency_mismatches': currency_mismatches,
+            'dedup_ratio': (total - flights_out) / total if total > 0 else 0
+        }
+
+        self.stats['dedup_calls'] += 1
+        self.stats['flights_in'] += total
+        self.stats['flights_out'] += flights_out
+        self.stats['cross_source_merges'] += cross_source_merges
+        self.stats['currency_mismatches'] += currency_mismatches
+        return merged_by_source, report
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取去重统计信息"""
+        flights_in = self.stats['flights_in']
+        return {
+            **self.stats,
+            'dedup_ratio': 1 - self.stats['flights_out'] / flights_in if flights_in > 0 else 0
+        }
+
+
+# 全局去重实例
+_flight_deduplicator: Optional[FlightDeduplicator] = None
+
+
+def get_flight_deduplicator() -> FlightDeduplicator:
+    """获取航班去重实例（单例模式）"""
+    global _flight_deduplicator
+    if _flight_deduplicator is None:
+        _flight_deduplicator = FlightDeduplicator()
+    return _flight_deduplicator
@@ -0,0 +1,327 @@
+"""
+航班本地预排序服务
+在发送给AI之前对清理后的航班做本地筛选，减少提示词中的航班数量：
+1. 提取价格、总时长、中转次数、出发时段四个指标，组成二维数组
+2. 计算帕累托前沿（没有任何航班在所有指标上都不差于它）
+3. 对其余航班按归一化加权得分排序
+4. 只保留前沿航班 + 得分前K的航班（每个数据源至少保留少量航班）
+不同币种的价格不可比较（Kiwi返回USD，Google/AI推荐为请求币种），前沿和归一化得分在各币种组内分别计算
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"numpy导入失败: {e}")
+    NUMPY_AVAILABLE = False
+    np = None
+
+from fastapi_app.config import settings
+
+
+# 指标列：价格、总时长（分钟）、中转次数、出发时段不便程度（分钟）
+RANKING_COLUMNS = ('price', 'duration_minutes', 'stops', 'departure_penalty')
+
+# 默认指标权重（数值越小越好）
+DEFAULT_WEIGHTS = (0.5, 0.25, 0.15, 0.1)
+
+# 出发时段舒适区间（分钟），区间外按距离计算不便程度
+_COMFORT_START_MINUTES = 7 * 60
+_COMFORT_END_MINUTES = 22 * 60
+
+
+def _to_float(value: Any) -> Optional[float]:
+    """将价格/时长等字段转换为浮点数，无法识别时返回None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        digits = ''.join(ch for ch in value if ch.isdigit() or ch == '.')
+        try:
+            return float(digits) if digits else None
+        except ValueError:
+            return None
+    return None
+
+
+def _to_currency(flight: Dict[str, Any]) -> str:
+    """航班价格币种（大写），没有币种字段时为空字符串"""
+    return str(flight.get('currency') or '').strip().upper()
+
+
+def _to_datetime(value: Any) -> Optional[datetime]:
+    """将ISO字符串或时间戳转换为datetime"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(value)
+        except (OverflowError, OSError, ValueError):
+            return None
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    return None
+
+
+def _departure_penalty(departure: Optional[datetime]) -> Optional[float]:
+    """出发时间距离舒适区间的分钟数（区间内为0）"""
+    if departure is None:
+        return None
+    minute_of_day = departure.hour * 60 + departure.minute
+    if minute_of_day < _COMFORT_START_MINUTES:
+        return float(_COMFORT_START_MINUTES - minute_of_day)
+    if minute_of_day > _COMFORT_END_MINUTES:
+        return float(minute_of_day - _COMFORT_END_MINUTES)
+    return 0.0
+
+
+class FlightRanker:
+    """航班帕累托前沿 + 加权得分预排序"""
+
+    def __init__(self, top_k: int = 40, min_per_source: int = 5, weights: Tuple[float, ...] = DEFAULT_WEIGHTS):
+        self.top_k = top_k
+        self.min_per_source = min_per_source
+        self.weights = weights
+
+        self.stats = {
+            'rank_calls': 0,
+            'flights_in': 0,
+            'flights_out': 0,
+            'frontier_flights': 0
+        }
+        logger.info(f"FlightRanker初始化成功: top_k={top_k}, min_per_source={min_per_source}")
+
+    def extract_features(self, flight: Dict[str, Any]) -> Tuple[Optional[float], ...]:
+        """
+        从清理后的航班字典中提取排序指标
+
+        兼容两种结构：
+        - Google/AI推荐: price, stops, legs[departure_datetime, arrival_datetime, duration]
+        - Kiwi: price, duration_minutes, segment_count, departure_time, route_segments
+        """
+        price = _to_float(flight.get('price'))
+        if price is None:
+            price = _to_float(flight.get('price_numeric'))
+
+        legs = flight.get('legs') or flight.get('route_segments') or []
+        if not isinstance(legs, list):
+            legs = []
+        legs = [leg for leg in legs if isinstance(leg, dict)]
+
+        # 总时长：优先使用首段出发到末段到达（包含中转等待），其次使用各航段时长之和
+        duration = _to_float(flight.get('duration_minutes'))
+        first_departure = None
+        if legs:
+            first_departure = _to_datetime(legs[0].get('departure_datetime') or legs[0].get('departure_time'))
+            last_arrival = _to_datetime(legs[-1].get('arrival_datetime') or legs[-1].get('arrival_time'))
+            if not duration and first_departure and last_arrival:
+                try:
+                    duration = (last_arrival - first_departure).total_seconds() / 60
+                except TypeError:
+                    # 时区感知与非感知时间混用
+                    duration = None
+            if not duration:
+                leg_durations = [_to_float(leg.get('duration')) for leg in legs]
+                if all(d is not None for d in leg_durations):
+                    duration = sum(leg_durations)
+        if not duration:
+            duration = _to_float(flight.get('duration'))
+
+        stops = _to_float(flight.get('stops'))
+        if stops is None:
+            segment_count = _to_float(flight.get('segment_count'))
+            if segment_count:
+                stops = max(segment_count - 1, 0)
+            elif legs:
+                stops = float(len(legs) - 1)
+
+        departure = _to_datetime(flight.get('departure_time')) or first_departure
+        return price, duration or None, stops, _departure_penalty(departure)
+
+    def build_matrix(self, flights: List[Dict[str, Any]]):
+        """构建指标矩阵，缺失值用该列最差值+1填充（缺失数据不会进入前沿）"""
+        matrix = np.array(
+            [[np.nan if v is None else v for v in self.extract_features(flight)] for flight in flights],
+            dtype=float
+        ).reshape(len(flights), len(RANKING_COLUMNS))
+
+        missing = np.isnan(matrix)
+        if missing.any():
+            column_worst = np.where(missing, -np.inf, matrix).max(axis=0)
+            column_worst[np.isinf(column_worst)] = 0.0
+            matrix = np.where(missing, column_worst + 1, matrix)
+        return matrix
+
+    def pareto_mask(self, matrix) -> Any:
+        """
+        计算帕累托前沿（所有指标越小越好）
+
+        Returns:
+            bool数组，True表示该航班不被任何其他航班支配
+        """
+        # dominates[i, j]: 航班i在所有指标上不差于j，且至少一项严格更好
+        not_worse = (matrix[:, None, :] <= matrix[None, :, :]).all(axis=2)
+        strictly_better = (matrix[:, None, :] < matrix[None, :, :]).any(axis=2)
+        dominated = (not_worse & strictly_better).any(axis=0)
+        return ~dominated
+
+    def score(self, matrix) -> Any:
+        """按列最小-最大归一化后加权求和（越小越好）"""
+        column_min = matrix.min(axis=0)
+        column_range = matrix.max(axis=0) - column_min
+        column_range[column_range == 0] = 1
+        normalized = (matrix - column_min) / column_range
+        return normalized @ np.asarray(self.weights, dtype=float)
+
+    def frontier_and_scores(self, flights: List[Dict[str, Any]]) -> Tuple[Any, Any]:
+        """
+        按币种分组计算帕累托前沿和得分
+
+        得分是组内最小-最大归一化后的加权和（0~1），不同币种组之间可以直接比较排序
+
+        Returns:
+            (前沿bool数组, 得分数组)，与flights一一对应
+        """
+        currencies = [_to_currency(flight) for flight in flights]
+        frontier = np.zeros(len(flights), dtype=bool)
+        scores = np.zeros(len(flights), dtype=float)
+        for currency in dict.fromkeys(currencies):
+            indexes = np.array([i for i, c in enumerate(currencies) if c == currency])
+            matrix = self.build_matrix([flights[i] for i in indexes])
+            frontier[indexes] = self.pareto_mask(matrix)
+            scores[indexes] = self.score(matrix)
+        return frontier, scores
+
+    def rank(self, flights_by_source: Dict[str, list]) -> Tuple[Dict[str, list], Dict[str, Any]]:
+        """
+        跨数据源预排序
+
+        Args:
+            flights_by_source: {数据源: 清理后的航班列表}
+
+        Returns:
+            tuple: (按数据源拆分的保留航班（保持原顺序）, 排序报告)
+        """
+        entries = [
+            (source, index, flight)
+            for source, flights in flights_by_source.items()
+            for index, flight in enumerate(flights or [])
+            if isinstance(flight, dict)
+        ]
+        total = len(entries)
+        report = {'flights_in': total, 'flights_out': total, 'frontier': 0, 'ranked': False}
+
+        if not NUMPY_AVAILABLE or total <= self.top_k:
+            return flights_by_source, report
+
+        frontier, scores = self.frontier_and_scores([flight for _, _, flight in entries])
+        # 稳定排序：同分时保持原顺序
+        order = np.argsort(scores, kind='stable')
+
+        keep = frontier.copy()
+        keep[order[:self.top_k]] = True
+
+        # 每个数据源至少保留得分最好的若干航班，保证报告中各类航班都有候选
+        sources = np.array([source for source, _, _ in entries])
+        for source in flights_by_source:
+            source_order = order[sources[order] == source]
+            keep[source_order[:self.min_per_source]] = True
+
+        kept = {source: [] for source in flights_by_source}
+        kept_indexes = {source: set() for source in flights_by_source}
+        for position in np.flatnonzero(keep):
+            source, index, _ = entries[position]
+            kept_indexes[source].add(index)
+
+        for source, flights in flights_by_source.items():
+            if not flights:
+                kept[source] = flights
+                continue
+            # 非字典数据不参与排序，原样保留
+            kept[source] = [
+                flight for index, flight in enumerate(flights)
+                if not isinstance(flight, dict) or index in kept_indexes[source]
+            ]
+
+        flights_out = int(keep.sum())
+        report.update({
+            'flights_out': flights_out,
+            'frontier': int(frontier.sum()),
+            'ranked': True,
+            'per_source': {source: len(kept[source] or []) for source in flights_by_source}
+        })
+
+        self.stats['rank_calls'] += 1
+        self.stats['flights_in'] += total
+        self.stats['flights_out'] += flights_out
+        self.stats['frontier_flights'] += report['frontier']
+        return kept, report
+
+    def preview(self, flights_by_source: Dict[str, list], limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        快速预览排序（AI报告生成前展示）：按加权得分取前limit个航班
+
+        稳定排序，同分时保持数据源和原顺序，相同输入总是得到相同结果
+
+        Returns:
+            航班字典副本列表，附带data_source和preview_rank
+        """
+        entries = [
+            (source, flight)
+            for source, flights in flights_by_source.items()
+            for flight in flights or []
+            if isinstance(flight, dict)
+        ]
+        if not entries or limit <= 0:
+            return []
+
+        if NUMPY_AVAILABLE:
+            _, scores = self.frontier_and_scores([flight for _, flight in entries])
+            order = np.argsort(scores, kind='stable')[:limit].tolist()
+        else:
+            # 没有numpy时按币种组（首次出现顺序）内的价格排序，缺失价格排在最后
+            prices = [self.extract_features(flight)[0] for _, flight in entries]
+            currencies = [_to_currency(flight) for _, flight in entries]
+            currency_rank = {currency: rank for rank, currency in enumerate(dict.fromkeys(currencies))}
+            order = sorted(
+                range(len(entries)),
+                key=lambda i: (prices[i] is None, currency_rank[currencies[i]], prices[i] or 0.0, i)
+            )[:limit]
+
+        return [
+            dict(entries[index][1], data_source=entries[index][0], preview_rank=rank)
+            for rank, index in enumerate(order, 1)
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取预排序统计信息"""
+        flights_in = self.stats['flights_in']
+        return {
+            **self.stats,
+            'numpy_available': NUMPY_AVAILABLE,
+            'reduction_rate': 1 - self.stats['flights_out'] / flights_in if flights_in > 0 else 0
+        }
+
+
+# 全局预排序实例
+_flight_ranker: Optional[FlightRanker] = None
+
+
+def get_flight_ranker() -> FlightRanker:
+    """获取航班预排序实例（单例模式）"""
+    global _flight_ranker
+    if _flight_ranker is None:
+        _flight_ranker = FlightRanker(
+            top_k=settings.AI_PRERANK_TOP_K,
+            min_per_source=settings.AI_PRERANK_MIN_PER_SOURCE
+        )
+    return _flight_ranker
@@ -6,7 +6,6 @@
 3. 监控任务执行
 4. 价格监控功能
 """
-import asyncio
 import os
 import hashlib
 import json
@@ -80,6 +79,9 @@ except Exception as e:
     logger.warning(f"SSL配置失败: {e}")
 
 from fastapi_app.services.cache_service import get_cache_service
+from fastapi_app.services.circuit_breaker import get_circuit_breaker
+from fastapi_app.services.executor_pools import ExecutorPoolFullError, get_executor_pool
+from fastapi_app.utils.price import extract_prices, min_price as get_min_price, sort_by_price
 
 
 class MonitorFlightService:
@@ -205,12 +207,12 @@ class MonitorFlightService:
                 logger.info(f"黑名单过滤: {original_count} → {len(flights)} 个航班")
 
             # 按价格排序，返回所有航班
-            all_available_flights = flights
-            all_available_flights.sort(key=lambda x: x.get('价格', float('inf')))
+            prices = extract_prices(flights, fields=('价格',))
+            all_available_flights = sort_by_price(flights, prices=prices)
 
             # 计算统计信息
             total_flights = len(all_available_flights)
-            min_price = min([f.get('价格', 0) for f in all_available_flights]) if all_available_flights else 0
+            min_price = get_min_price(prices)
 
             # 获取城市显示信息
             city_info = self._get_city_info(city_code)
@@ -308,13 +310,26 @@ class MonitorFlightService:
             headers = self._get_trip_headers()
             payload = self._update_trip_payload(departure_code, destination_code, depart_date, return_date)
 
-            # 在线程池中执行同步请求
-            loop = asyncio.get_event_loop()
-            response_data = await loop.run_in_executor(
-                None,
-                self._sync_trip_request,
-                url, headers, payload
-            )
+            # Trip.com熔断中直接返回空结果，不再等待30秒超时
+            breaker = get_circuit_breaker('trip_com')
+            if not breaker.allow_request():
+                logger.warning(f"⚡ Trip.com熔断中，跳过请求（{breaker.retry_after:.0f}秒后重试）")
+                return []
+
+            # 在Trip.com专用线程池中执行同步请求
+            try:
+                response_data = await get_executor_pool('trip_com').run(
+                    self._sync_trip_request,
+                    url, headers, payload
+                )
+            except ExecutorPoolFullError as e:
+                breaker.release()
+                logger.warning(f"Trip.com请求被拒绝: {e}")
+                return []
+            if response_data is None:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
 
             if response_data:
                 # 清洗数据
@@ -0,0 +1,107 @@
+"""
+AI模型延迟统计服务
+按模型记录成功请求的耗时直方图，用于对冲请求（hedged request）的触发时机：
+主模型耗时超过其历史P90（可配置）仍未返回时，再并发请求更快的模型
+"""
+import bisect
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+from fastapi_app.config import settings
+
+
+# 直方图桶上界（秒），最后一个桶收集超过300秒的请求
+LATENCY_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 240, 300)
+
+
+class ModelLatencyTracker:
+    """按模型统计的延迟直方图"""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS, min_samples: int = 10):
+        self.buckets = buckets
+        self.min_samples = min_samples
+        self._models: Dict[str, Dict[str, Any]] = {}
+        logger.info(f"ModelLatencyTracker初始化成功: {len(buckets) + 1}个桶")
+
+    def _get_model(self, model_name: str) -> Dict[str, Any]:
+        if model_name not in self._models:
+            self._models[model_name] = {
+                'counts': [0] * (len(self.buckets) + 1),
+                'samples': 0,
+                'total_seconds': 0.0,
+                'failures': 0,
+                'cancelled': 0
+            }
+        return self._models[model_name]
+
+    def record_success(self, model_name: str, seconds: float):
+        """记录一次成功请求的耗时"""
+        model = self._get_model(model_name)
+        model['counts'][bisect.bisect_left(self.buckets, seconds)] += 1
+        model['samples'] += 1
+        model['total_seconds'] += seconds
+
+    def record_failure(self, model_name: str):
+        model = self._get_model(model_name)
+        model['failures'] += 1
+
+    def record_cancelled(self, model_name: str):
+        """对冲中落败被取消的请求（耗时未知，不计入直方图）"""
+        model = self._get_model(model_name)
+        model['cancelled'] += 1
+
+    def percentile(self, model_name: str, percent: float) -> Optional[float]:
+        """
+        估算延迟百分位（返回所在桶的上界）
+
+        Returns:
+            秒数；样本不足时返回None
+        """
+        model = self._models.get(model_name)
+        if not model or model['samples'] < self.min_samples:
+            return None
+
+        target = model['samples'] * percent / 100
+        cumulative = 0
+        for index, count in enumerate(model['counts']):
+            cumulative += count
+            if cumulative >= target:
+                return float(self.buckets[index]) if index < len(self.buckets) else float(self.buckets[-1])
+        return float(self.buckets[-1])
+
+    def hedge_delay(self, model_name: str) -> float:
+        """主模型请求发出后多久发送对冲请求"""
+        observed = self.percentile(model_name, settings.AI_HEDGE_PERCENTILE)
+        if observed is None:
+            return settings.AI_HEDGE_DEFAULT_DELAY
+        return min(max(observed, settings.AI_HEDGE_MIN_DELAY), settings.AI_HEDGE_MAX_DELAY)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各模型延迟统计"""
+        labels: List[str] = [f"<={bound}s" for bound in self.buckets] + [f">{self.buckets[-1]}s"]
+        models = {}
+        for model_name, model in self._models.items():
+            samples = model['samples']
+            models[model_name] = {
+                'samples': samples,
+                'failures': model['failures'],
+                'cancelled': model['cancelled'],
+                'avg_seconds': model['total_seconds'] / samples if samples > 0 else 0,
+                'p50_seconds': self.percentile(model_name, 50),
+                'p90_seconds': self.percentile(model_name, 90),
+                'hedge_delay_seconds': self.hedge_delay(model_name),
+                'histogram': {label: count for label, count in zip(labels, model['counts']) if count}
+            }
+        return {'models': models}
+
+
+# 全局统计实例
+_model_latency_tracker: Optional[ModelLatencyTracker] = None
+
+
+def get_model_latency_tracker() -> ModelLatencyTracker:
+    """获取模型延迟统计实例（单例模式）"""
+    global _model_latency_tracker
+    if _model_latency_tracker is None:
+        _model_latency_tracker = ModelLatencyTracker(min_samples=settings.AI_HEDGE_MIN_SAMPLES)
+    return _model_latency_tracker
@@ -5,9 +5,10 @@ FastAPI版本的监控任务服务
 import asyncio
 import os
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 from loguru import logger
 
+from fastapi_app.config import settings
 from fastapi_app.models.monitor import (
     MonitorTaskCreate, MonitorTaskUpdate, MonitorTaskResponse,
     MonitorTaskExecutionResult, MonitorSystemStatus
@@ -15,6 +16,7 @@ from fastapi_app.models.monitor import (
 from fastapi_app.services.flight_service import get_flight_service
 from fastapi_app.services.notification_service import get_notification_service
 from fastapi_app.services.supabase_service import get_supabase_service
+from fastapi_app.utils.price import filter_by_price
 
 
 class FastAPIMonitorService:
@@ -34,7 +36,9 @@ class FastAPIMonitorService:
             'successful_executions': 0,
             'failed_executions': 0,
             'start_time': None,
-            'last_execution': None
+            'last_execution': None,
+            'snapshot_fetches': 0,
+            'snapshot_tasks': 0
         }
         # 固定爬取的城市列表
         self.fixed_cities = ['HKG', 'SZX', 'CAN', 'MFM']
@@ -115,11 +119,24 @@ class FastAPIMonitorService:
             # 获取所有活跃的监控任务
             active_tasks = await self._get_active_monitor_tasks()
             logger.info(f"找到 {len(active_tasks)} 个活跃监控任务")
-            
+
+            # 冷却期外的任务按(出发地, 日期)分组，每组只查询一次Trip.com
+            now = datetime.now(timezone.utc)
+            due_tasks = []
+            for task in active_tasks:
+                try:
+                    if self._in_notification_cooldown(task, now):
+                        continue
+                except (TypeError, ValueError):
+                    # 冷却时间无法解析，由任务执行时报告错误
+                    pass
+                due_tasks.append(task)
+            snapshots = await self._fetch_cycle_snapshots(due_tasks)
+
             # 并发执行监控任务
             tasks = []
             for task in active_tasks:
-                tasks.append(self._execute_monitor_task(task))
+                tasks.append(self._execute_monitor_task(task, snapshots.get(self._snapshot_key(task))))
             
             if tasks:
                 results = await asyncio.gather(*tasks, return_exceptions=True)
@@ -152,8 +169,82 @@ class FastAPIMonitorService:
             logger.error(f"获取活跃监控任务失败: {e}")
             return []
     
-    async def _execute_monitor_task(self, task: Dict[str, Any]) -> Dict[str, Any]:
-        """执行单个监控任务"""
+    def _in_notification_cooldown(self, task: Dict[str, Any], now: datetime) -> bool:
+        """任务是否在通知冷却期内（避免重复通知）"""
+        if not task.get('last_notification'):
+            return False
+        last_notification = datetime.fromisoformat(task['last_notification'])
+        cooldown = timedelta(hours=int(os.environ.get('NOTIFICATION_COOLDOWN', '24')))
+        return (now - last_notification) < cooldown
+
+    def _snapshot_key(self, task: Dict[str, Any]) -> Tuple[str, Optional[str], Optional[str]]:
+        """监控周期快照分组键：(出发地, 出发日期, 返程日期)"""
+        return (
+            str(task.get('departure_code') or '').upper(),
+            task.get('depart_date') or None,
+            task.get('return_date') or None
+        )
+
+    async def _fetch_cycle_snapshots(
+        self,
+        tasks: List[Dict[str, Any]]
+    ) -> Dict[Tuple[str, Optional[str], Optional[str]], Dict[str, Any]]:
+        """
+        获取本监控周期的Trip.com城市快照
+
+        相同(出发地, 日期)的任务只查询一次，Trip.com请求数随不同城市和日期增长，而不是随任务数增长；
+        每个出发城市先清除一次缓存以获取最新数据。快照在任务间共享，各任务过滤时复制航班字典，不会修改其他任务看到的数据
+
+        Returns:
+            {分组键: {'success', 'flights', 'error', 'fetched_at'}}
+        """
+        keys = list(dict.fromkeys(self._snapshot_key(task) for task in tasks if task.get('departure_code')))
+        if not keys:
+            return {}
+
+        # 在监控周期开始时，清除相关城市的缓存以获取最新数据
+        for departure_code in dict.fromkeys(key[0] for key in keys):
+            await self.flight_service.clear_flight_cache(departure_code)
+            logger.info(f"已清除城市 {departure_code} 的缓存，确保获取最新数据")
+
+        semaphore = asyncio.Semaphore(max(1, settings.MONITOR_SNAPSHOT_CONCURRENCY))
+
+        async def fetch(key: Tuple[str, Optional[str], Optional[str]]) -> Dict[str, Any]:
+            departure_code, depart_date, return_date = key
+            async with semaphore:
+                monitor_result = await self.flight_service.get_monitor_data_async(
+                    city_code=departure_code,
+                    depart_date=depart_date,
+                    return_date=return_date
+                )
+            if not monitor_result.get('success'):
+                logger.warning(f"获取监控数据失败 {key}: {monitor_result.get('error', 'Unknown error')}")
+            return {
+                'success': bool(monitor_result.get('success')),
+                'flights': tuple(monitor_result.get('flights') or ()),
+                'error': monitor_result.get('error'),
+                'fetched_at': datetime.now(timezone.utc).isoformat()
+            }
+
+        snapshots = dict(zip(keys, await asyncio.gather(*(fetch(key) for key in keys))))
+
+        self.stats['snapshot_fetches'] += len(keys)
+        self.stats['snapshot_tasks'] += len(tasks)
+        logger.info(f"📸 本周期 {len(tasks)} 个任务共享 {len(keys)} 个Trip.com城市快照")
+        return snapshots
+
+    async def _execute_monitor_task(
+        self,
+        task: Dict[str, Any],
+        snapshot: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        执行单个监控任务
+
+        Args:
+            task: 监控任务
+            snapshot: 本周期共享的Trip.com城市快照（为空时单独为该任务查询）
+        """
         start_time = datetime.now(timezone.utc)
         task_id = task.get('id', 0)
         
@@ -161,72 +252,47 @@ class FastAPIMonitorService:
             logger.info(f"执行监控任务 {task_id}: {task.get('name', 'Unknown')}")
             
             # 检查是否需要发送通知（避免重复通知）
-            if task.get('last_notification'):
-                last_notification = datetime.fromisoformat(task['last_notification'])
-                cooldown = timedelta(hours=int(os.environ.get('NOTIFICATION_COOLDOWN', '24')))
-                if (start_time - last_notification) < cooldown:
-                    logger.info(f"任务 {task_id} 在冷却期内，跳过通知")
-                    return {'success': True, 'skipped': True, 'reason': 'cooldown'}
+            if self._in_notification_cooldown(task, start_time):
+                logger.info(f"任务 {task_id} 在冷却期内，跳过通知")
+                return {'success': True, 'skipped': True, 'reason': 'cooldown'}
             
             # 执行航班搜索
             # 如果没有指定目的地，搜索热门目的地
             destination_code = task.get('destination_code')
             logger.info(f"任务目的地代码: '{destination_code}' (类型: {type(destination_code)})")
 
-            # 在监控任务执行时，清除相关城市的缓存以获取最新数据
-            departure_code = task['departure_code']
-            await self.flight_service.clear_flight_cache(departure_code)
-            logger.info(f"已清除城市 {departure_code} 的缓存，确保获取最新数据")
-
-            if not destination_code or destination_code in ['', 'null', 'NULL', 'ANY']:
-                logger.info(f"任务 {task_id} 没有指定目的地，使用监控数据API获取所有航班")
-                # 无指定目的地，使用监控数据API获取所有可用航班
-                monitor_result = await self.flight_service.get_monitor_data_async(
-                    city_code=task['departure_code']
-                )
+            if snapshot is None:
+                snapshot = (await self._fetch_cycle_snapshots([task]))[self._snapshot_key(task)]
 
-                if monitor_result['success']:
-                    # 修复数据格式问题：直接使用 flights 键
-                    all_flights = monitor_result.get('flights', [])
-                    logger.info(f"任务 {task_id} 从监控数据获取到 {len(all_flights)} 个航班")
-                    search_result = {
-                        'success': True,
-                        'flights': all_flights
-                    }
-                else:
-                    logger.warning(f"获取监控数据失败: {monitor_result.get('error', 'Unknown error')}")
-                    search_result = {
-                        'success': False,
-                        'flights': []
-                    }
+            if not snapshot['success']:
+                search_result = {
+                    'success': False,
+                    'flights': [],
+                    'error': snapshot.get('error')
+                }
+            elif not destination_code or destination_code in ['', 'null', 'NULL', 'ANY']:
+                # 无指定目的地，使用城市快照中的所有可用航班
+                all_flights = [dict(flight) for flight in snapshot['flights']]
+                logger.info(f"任务 {task_id} 没有指定目的地，从城市快照获取到 {len(all_flights)} 个航班")
+                search_result = {
+                    'success': True,
+                    'flights': all_flights
+                }
             else:
-                logger.info(f"任务 {task_id} 有指定目的地 {destination_code}，使用监控数据API搜索")
-                # 有指定目的地，使用监控数据API（类似仪表板）
-                monitor_result = await self.flight_service.get_monitor_data_async(
-                    city_code=task['departure_code']
-                )
-
-                if monitor_result['success']:
-                    # 修复数据格式问题：直接使用 flights 键
-                    all_flights = monitor_result.get('flights', [])
-                    filtered_flights = [
-                        flight for flight in all_flights
-                        if (flight.get('代码') == destination_code or
-                            flight.get('destination_code') == destination_code or
-                            flight.get('code') == destination_code)
-                    ]
-
-                    logger.info(f"从 {len(all_flights)} 个航班中过滤出 {len(filtered_flights)} 个目标航班")
-                    search_result = {
-                        'success': True,
-                        'flights': filtered_flights
-                    }
-                else:
-                    logger.warning(f"获取监控数据失败: {monitor_result.get('error', 'Unknown error')}")
-                    search_result = {
-                        'success': False,
-                        'flights': []
-                    }
+                # 有指定目的地，从城市快照中过滤目标航班（类似仪表板）
+                all_flights = snapshot['flights']
+                filtered_flights = [
+                    dict(flight) for flight in all_flights
+                    if (flight.get('代码') == destination_code or
+                        flight.get('destination_code') == destination_code or
+                        flight.get('code') == destination_code)
+                ]
+
+                logger.info(f"任务 {task_id} 从 {len(all_flights)} 个航班中过滤出 {len(filtered_flights)} 个目标航班")
+                search_result = {
+                    'success': True,
+                    'flights': filtered_flights
+                }
             
             if not search_result['success']:
                 logger.warning(f"任务 {task_id} 航班搜索失败: {search_result.get('error', 'Unknown error')}")
@@ -241,12 +307,8 @@ class FastAPIMonitorService:
             flights = search_result.get('flights', [])
             price_threshold = task.get('price_threshold', 1000.0)
 
-            low_price_flights = []
-            for flight in flights:
-                # Trip.com API返回的价格格式处理
-                price = self._extract_flight_price(flight)
-                if price <= price_threshold:
-                    low_price_flights.append(flight)
+            # 统一解析Trip.com/smart-flights等格式的价格，无法解析价格的航班不计入低价航班
+            low_price_flights = filter_by_price(flights, max_price=price_threshold)
             
             logger.info(f"任务 {task_id} 找到 {len(flights)} 个航班，其中 {len(low_price_flights)} 个低价航班")
             
@@ -323,45 +385,6 @@ class FastAPIMonitorService:
             logger.error(f"发送通知失败: {e}")
             return False
 
-    def _extract_flight_price(self, flight: Dict[str, Any]) -> float:
-        """从航班数据中提取价格"""
-        try:
-            # 1. Trip.com格式 - 中文字段
-            if '价格' in flight and flight['价格'] is not None:
-                return float(flight['价格'])
-
-            # 2. Trip.com格式 - 英文字段
-            if 'price' in flight and flight['price'] is not None:
-                if isinstance(flight['price'], dict):
-                    # smart-flights格式
-                    return float(flight['price'].get('amount', float('inf')))
-                else:
-                    # 直接数值
-                    return float(flight['price'])
-
-            # 3. 其他可能的价格字段
-            for price_field in ['Price', 'amount', 'cost']:
-                if price_field in flight and flight[price_field] is not None:
-                    try:
-                        price_value = flight[price_field]
-                        if isinstance(price_value, str):
-                            # 提取数字部分
-                            import re
-                            numbers = re.findall(r'\d+\.?\d*', price_value)
-                            if numbers:
-                                return float(numbers[0])
-                        elif isinstance(price_value, (int, float)):
-                            return float(price_value)
-                    except (ValueError, TypeError):
-                        continue
-
-            logger.warning(f"无法提取航班价格，可用字段: {list(flight.keys())}")
-            return float('inf')
-
-        except Exception as e:
-            logger.error(f"提取航班价格失败: {e}")
-            return float('inf')
-    
     async def _update_task_stats(
         self,
         task_id: int,
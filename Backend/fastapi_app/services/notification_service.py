@@ -2,7 +2,6 @@
 FastAPI版本的通知服务
 基于原有NotificationService，优化为纯异步实现
 """
-import asyncio
 import aiohttp
 import smtplib
 import os
@@ -12,6 +11,21 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from loguru import logger
 
+from fastapi_app.services.circuit_breaker import CircuitOpenError, get_circuit_breaker
+from fastapi_app.services.executor_pools import ExecutorPoolFullError, get_executor_pool
+
+
+def _is_smtp_unavailable(error: Exception) -> bool:
+    """
+    是否为邮件服务不可用（连接、认证、超时等网络错误），只有这类错误计入SMTP熔断
+
+    收件人被拒、地址格式错误等单封邮件的问题不代表服务故障
+    （smtplib.SMTPException是OSError的子类，需要先排除）
+    """
+    if isinstance(error, (smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected, smtplib.SMTPAuthenticationError)):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
 
 class FastAPINotificationService:
     """FastAPI版本的通知服务"""
@@ -55,6 +69,11 @@ class FastAPINotificationService:
         Returns:
             bool: 推送是否成功
         """
+        breaker = get_circuit_breaker('pushplus')
+        if not breaker.allow_request():
+            logger.warning(f"⚡ PushPlus熔断中，跳过推送: {title}")
+            return False
+
         try:
             data = {
                 "token": token,
@@ -74,6 +93,7 @@ class FastAPINotificationService:
                 async with session.post(self.pushplus_url, json=data) as response:
                     response.raise_for_status()
                     result = await response.json()
+                    breaker.record_success()
                     
                     if result.get("code") == 200:
                         if topic:
@@ -86,6 +106,7 @@ class FastAPINotificationService:
                         return False
                         
         except Exception as e:
+            breaker.record_failure()
             logger.error(f"PushPlus推送出错: {e}")
             return False
 
@@ -109,14 +130,19 @@ class FastAPINotificationService:
             bool: 发送是否成功
         """
         try:
-            # 在线程池中执行同步的邮件发送操作
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(
-                None,
-                self._sync_send_email,
-                to_email, subject, html_content, text_content
-            )
-            
+            # 在邮件专用线程池中执行同步的邮件发送操作；服务不可用的错误由_sync_send_email抛出，计入熔断
+            async with get_circuit_breaker('smtp').guard(neutral_exceptions=(ExecutorPoolFullError,)):
+                return await get_executor_pool('email').run(
+                    self._sync_send_email,
+                    to_email, subject, html_content, text_content
+                )
+
+        except CircuitOpenError:
+            logger.warning(f"⚡ 邮件服务熔断中，跳过发送: {to_email} - {subject}")
+            return False
+        except ExecutorPoolFullError as e:
+            logger.warning(f"邮件发送被拒绝: {e}")
+            return False
         except Exception as e:
             logger.error(f"异步邮件发送失败: {e}")
             return False
@@ -130,6 +156,8 @@ class FastAPINotificationService:
     ) -> bool:
         """
         同步版本的邮件发送，用于在线程池中执行
+
+        单封邮件的问题（收件人被拒等）返回False；邮件服务不可用（连接、认证、超时）时抛出异常
         """
         try:
             # 创建邮件对象
@@ -164,6 +192,8 @@ class FastAPINotificationService:
             
         except Exception as e:
             logger.error(f"邮件发送失败: {e}")
+            if _is_smtp_unavailable(e):
+                raise
             return False
 
     async def send_flight_notification(
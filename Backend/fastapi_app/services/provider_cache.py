@@ -0,0 +1,314 @@
+"""
+航班数据源原始结果缓存服务（Stale-While-Revalidate）
+为smart-flights / Kiwi等上游数据源提供按规范化参数的结果缓存：
+1. 新鲜期内直接返回缓存
+2. 过期但仍在陈旧期内时立即返回陈旧数据，并在后台刷新
+3. 缓存内容统一为纯字典/列表（不缓存FlightResult等对象）
+Redis不可用时使用进程内LRU缓存作为降级方案
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Optional
+from loguru import logger
+
+from fastapi_app.config import settings
+from fastapi_app.services.cache_service import get_cache_service
+
+# 当前请求所用原始数据中最早的数据时间（同一请求内并发的协程共享同一个字典）
+_data_age_scope: ContextVar[Optional[Dict[str, float]]] = ContextVar('provider_data_age_scope', default=None)
+
+
+def begin_data_age_tracking():
+    """开始记录当前请求所用原始数据的时间（收集数据前调用）"""
+    _data_age_scope.set({})
+
+
+def get_tracked_data_age() -> Optional[float]:
+    """获取当前请求所用原始数据中最旧一份的数据年龄（秒），未记录时返回None"""
+    scope = _data_age_scope.get()
+    if not scope or 'oldest_at' not in scope:
+        return None
+    return max(0.0, time.time() - scope['oldest_at'])
+
+
+def _track_data_time(data_time: float):
+    scope = _data_age_scope.get()
+    if scope is not None and data_time < scope.get('oldest_at', float('inf')):
+        scope['oldest_at'] = data_time
+
+
+def to_plain_data(value: Any) -> Any:
+    """
+    将数据源返回的对象递归转换为纯字典/列表
+
+    - pydantic模型/普通对象 → dict
+    - 枚举 → 枚举名（如 Airport.HKG → "HKG"）
+    - datetime → ISO格式字符串
+    - tuple → list
+    """
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {str(k): to_plain_data(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [to_plain_data(item) for item in value]
+    if hasattr(value, '__dict__'):
+        return {
+            k: to_plain_data(v) for k, v in vars(value).items()
+            if not k.startswith('_')
+        }
+    return str(value)
+
+
+class ProviderResultCache:
+    """数据源结果缓存（SWR策略）"""
+
+    def __init__(
+        self,
+        namespace: str = "provider_cache",
+        fresh_ttl: int = 600,
+        stale_ttl: int = 3600,
+        max_local_entries: int = 256,
+        track_data_age: bool = True
+    ):
+        self.namespace = namespace
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = max(stale_ttl, fresh_ttl)
+        self.max_local_entries = max_local_entries
+        # 是否计入请求的原始数据年龄（用于AI报告缓存时长）
+        self.track_data_age = track_data_age
+
+        # 进程内降级缓存: key -> (过期时间戳, 序列化后的条目)
+        self._local_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        # 正在后台刷新的键，避免重复刷新
+        self._refreshing: set = set()
+        self._background_tasks: set = set()
+
+        self.stats: Dict[str, Dict[str, int]] = {}
+        logger.info(f"ProviderResultCache初始化成功: fresh={fresh_ttl}s, stale={self.stale_ttl}s")
+
+    def _get_provider_stats(self, provider: str) -> Dict[str, int]:
+        if provider not in self.stats:
+            self.stats[provider] = {
+                'fresh_hits': 0,
+                'stale_hits': 0,
+                'misses': 0,
+                'background_refreshes': 0,
+                'refresh_errors': 0
+            }
+        return self.stats[provider]
+
+    def build_key(self, provider: str, params: Dict[str, Any]) -> str:
+        """根据数据源名称和规范化后的参数生成缓存键"""
+        normalized = {}
+        for name, value in params.items():
+            if isinstance(value, str):
+                value = value.strip()
+                if name.endswith('_code') or name.endswith('_airport') or name in ('seat_class', 'currency'):
+                    value = value.upper()
+            normalized[name] = value
+
+        params_str = json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+        params_hash = hashlib.md5(params_str.encode('utf-8')).hexdigest()
+        return f"{self.namespace}:{provider}:{params_hash}"
+
+    async def get_or_fetch(
+        self,
+        provider: str,
+        params: Dict[str, Any],
+        fetcher: Callable[[], Awaitable[Any]],
+        should_cache: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """
+        获取缓存结果，未命中时调用fetcher获取
+
+        Args:
+            provider: 数据源名称（如 'google', 'kiwi', 'google_layover'）
+            params: 搜索参数
+            fetcher: 从上游获取数据的协程工厂，返回值应为纯字典/列表
+            should_cache: 判断结果是否可缓存（默认只缓存非空结果）
+
+        Returns:
+            缓存或新获取的数据
+        """
+        key = self.build_key(provider, params)
+        provider_stats = self._get_provider_stats(provider)
+
+        entry = await self._read_entry(key)
+        if entry is not None:
+            age = time.time() - entry.get('cached_at', 0)
+            if self.track_data_age:
+                _track_data_time(entry.get('cached_at', 0))
+            if age < self.fresh_ttl:
+                provider_stats['fresh_hits'] += 1
+                logger.info(f"💾 [数据源缓存] {provider} 命中新鲜缓存 (缓存{age:.0f}秒)")
+                return entry.get('data')
+
+            # 陈旧数据：立即返回，并在后台刷新
+            provider_stats['stale_hits'] += 1
+            logger.info(f"💾 [数据源缓存] {provider} 命中陈旧缓存 (缓存{age:.0f}秒)，后台刷新")
+            self._schedule_refresh(provider, key, fetcher, should_cache)
+            return entry.get('data')
+
+        provider_stats['misses'] += 1
+        fetched_at = time.time()
+        data = await fetcher()
+        if self.track_data_age:
+            _track_data_time(fetched_at)
+        await self._write_entry(key, data, should_cache)
+        return data
+
+    def _schedule_refresh(
+        self,
+        provider: str,
+        key: str,
+        fetcher: Callable[[], Awaitable[Any]],
+        should_cache: Optional[Callable[[Any], bool]] = None
+    ):
+        """在后台刷新缓存条目（同一键同时只刷新一次）"""
+        if key in self._refreshing:
+            return
+
+        self._refreshing.add(key)
+        task = asyncio.create_task(self._refresh(provider, key, fetcher, should_cache))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _refresh(
+        self,
+        provider: str,
+        key: str,
+        fetcher: Callable[[], Awaitable[Any]],
+        should_cache: Optional[Callable[[Any], bool]] = None
+    ):
+        """执行后台刷新"""
+        provider_stats = self._get_provider_stats(provider)
+        try:
+            data = await fetcher()
+            if await self._write_entry(key, data, should_cache):
+                provider_stats['background_refreshes'] += 1
+                logger.debug(f"💾 [数据源缓存] {provider} 后台刷新完成: {key}")
+        except Exception as e:
+            provider_stats['refresh_errors'] += 1
+            logger.warning(f"⚠️ [数据源缓存] {provider} 后台刷新失败: {e}")
+        finally:
+            self._refreshing.discard(key)
+
+    async def _read_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存条目（优先Redis，降级到进程内缓存）"""
+        cache_service = await self._get_redis_cache()
+        if cache_service:
+            return await cache_service.get(key, dict)
+
+        local_item = self._local_cache.get(key)
+        if local_item is None:
+            return None
+
+        expires_at, serialized = local_item
+        if expires_at < time.time():
+            self._local_cache.pop(key, None)
+            return None
+
+        self._local_cache.move_to_end(key)
+        # 每次返回新的对象，调用方修改结果不会污染缓存
+        return json.loads(serialized)
+
+    async def _write_entry(self, key: str, data: Any, should_cache: Optional[Callable[[Any], bool]] = None) -> bool:
+        """写入缓存条目；空结果不缓存（通常是上游临时失败）"""
+        if not data:
+            return False
+        if should_cache is not None and not should_cache(data):
+            return False
+
+        entry = {
+            'data': data,
+            'cached_at': time.time()
+        }
+
+        cache_service = await self._get_redis_cache()
+        if cache_service:
+            return await cache_service.set(key, entry, expire=self.stale_ttl)
+
+        try:
+            serialized = json.dumps(entry, ensure_ascii=False, default=str)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"⚠️ [数据源缓存] 数据无法序列化，跳过缓存: {e}")
+            return False
+
+        self._local_cache[key] = (time.time() + self.stale_ttl, serialized)
+        self._local_cache.move_to_end(key)
+        while len(self._local_cache) > self.max_local_entries:
+            self._local_cache.popitem(last=False)
+        return True
+
+    async def _get_redis_cache(self):
+        """获取可用的Redis缓存服务，不可用时返回None"""
+        try:
+            cache_service = await get_cache_service()
+        except Exception:
+            return None
+        if cache_service and cache_service.redis:
+            return cache_service
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        providers = {}
+        for provider, provider_stats in self.stats.items():
+            lookups = provider_stats['fresh_hits'] + provider_stats['stale_hits'] + provider_stats['misses']
+            hits = provider_stats['fresh_hits'] + provider_stats['stale_hits']
+            providers[provider] = {
+                **provider_stats,
+                'hit_rate': hits / lookups if lookups > 0 else 0
+            }
+
+        return {
+            'providers': providers,
+            'local_entries': len(self._local_cache),
+            'refreshing': len(self._refreshing)
+        }
+
+
+# 全局缓存实例
+_provider_cache: Optional[ProviderResultCache] = None
+
+
+def get_provider_cache() -> ProviderResultCache:
+    """获取数据源结果缓存实例（单例模式）"""
+    global _provider_cache
+    if _provider_cache is None:
+        _provider_cache = ProviderResultCache(
+            namespace="provider_cache",
+            fresh_ttl=settings.PROVIDER_CACHE_FRESH_TTL,
+            stale_ttl=settings.PROVIDER_CACHE_STALE_TTL,
+            max_local_entries=settings.PROVIDER_CACHE_LOCAL_MAX_ENTRIES
+        )
+    return _provider_cache
+
+
+# 隐藏目的地候选缓存实例（按航线缓存AI推荐结果）
+_suggestion_cache: Optional[ProviderResultCache] = None
+
+
+def get_suggestion_cache() -> ProviderResultCache:
+    """获取隐藏目的地候选缓存实例（单例模式）"""
+    global _suggestion_cache
+    if _suggestion_cache is None:
+        _suggestion_cache = ProviderResultCache(
+            namespace="hidden_city_suggestions",
+            fresh_ttl=settings.HIDDEN_CITY_SUGGESTION_FRESH_TTL,
+            stale_ttl=settings.HIDDEN_CITY_SUGGESTION_STALE_TTL,
+            max_local_entries=settings.PROVIDER_CACHE_LOCAL_MAX_ENTRIES,
+            track_data_age=False
+        )
+    return _suggestion_cache
@@ -0,0 +1,164 @@
+"""
+AI分析报告缓存服务
+相同航线、相同航班数据生成的提示词完全一致，直接复用已生成的Markdown报告：
+1. 缓存键为 模型 + 系统提示词 + 语言 + 用户提示词（含清理后的航班数据）的哈希
+2. 缓存时长跟随原始航班数据的缓存时长，数据越旧报告保留越短
+3. 报告压缩后存储
+Redis不可用时使用进程内LRU缓存作为降级方案
+"""
+import base64
+import hashlib
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from loguru import logger
+
+from fastapi_app.config import settings
+from fastapi_app.services.cache_service import get_cache_service
+
+
+class AnalysisReportCache:
+    """AI分析报告缓存（内容寻址）"""
+
+    def __init__(self, max_ttl: int = 600, min_ttl: int = 60, max_local_entries: int = 64):
+        self.max_ttl = max_ttl
+        self.min_ttl = min(min_ttl, max_ttl)
+        self.max_local_entries = max_local_entries
+
+        # 进程内降级缓存: key -> (过期时间戳, 条目)
+        self._local_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'writes': 0,
+            'original_bytes': 0,
+            'compressed_bytes': 0
+        }
+        logger.info(f"AnalysisReportCache初始化成功: ttl={self.min_ttl}-{self.max_ttl}s")
+
+    def build_key(self, model_name: str, system_prompt: str, language: str, prompt: str) -> str:
+        """根据请求内容生成缓存键"""
+        digest = hashlib.sha256()
+        for part in (model_name, system_prompt, language, prompt):
+            digest.update((part or '').encode('utf-8'))
+            digest.update(b'\x00')
+        return f"ai_report:{digest.hexdigest()}"
+
+    def compute_ttl(self, data_age: Optional[float]) -> int:
+        """报告缓存时长 = 原始数据剩余新鲜时间（不低于最小缓存时长）"""
+        if data_age is None:
+            return self.max_ttl
+        return int(max(self.min_ttl, self.max_ttl - data_age))
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取缓存的报告
+
+        Returns:
+            {'report': Markdown报告, 'model': 生成报告的模型, 'cached_at': 时间戳}，未命中返回None
+        """
+        entry = await self._read_entry(key)
+        if not entry:
+            self.stats['misses'] += 1
+            return None
+
+        try:
+            report = zlib.decompress(base64.b64decode(entry['report'])).decode('utf-8')
+        except Exception as e:
+            logger.warning(f"⚠️ [报告缓存] 缓存内容解压失败: {e}")
+            self.stats['misses'] += 1
+            return None
+
+        self.stats['hits'] += 1
+        return {
+            'report': report,
+            'model': entry.get('model'),
+            'cached_at': entry.get('cached_at')
+        }
+
+    async def set(self, key: str, report: str, model_name: str, data_age: Optional[float] = None) -> bool:
+        """压缩并写入报告"""
+        if not report:
+            return False
+
+        raw = report.encode('utf-8')
+        compressed = base64.b64encode(zlib.compress(raw, 6)).decode('ascii')
+        entry = {
+            'report': compressed,
+            'model': model_name,
+            'cached_at': time.time()
+        }
+        ttl = self.compute_ttl(data_age)
+
+        cache_service = await self._get_redis_cache()
+        if cache_service:
+            written = await cache_service.set(key, entry, expire=ttl)
+        else:
+            self._local_cache[key] = (time.time() + ttl, entry)
+            self._local_cache.move_to_end(key)
+            while len(self._local_cache) > self.max_local_entries:
+                self._local_cache.popitem(last=False)
+            written = True
+
+        if written:
+            self.stats['writes'] += 1
+            self.stats['original_bytes'] += len(raw)
+            self.stats['compressed_bytes'] += len(compressed)
+            logger.info(f"💾 [报告缓存] 已缓存报告: {len(raw):,} → {len(compressed):,} 字节, TTL {ttl}秒")
+        return written
+
+    async def _read_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        cache_service = await self._get_redis_cache()
+        if cache_service:
+            return await cache_service.get(key, dict)
+
+        local_item = self._local_cache.get(key)
+        if local_item is None:
+            return None
+
+        expires_at, entry = local_item
+        if expires_at < time.time():
+            self._local_cache.pop(key, None)
+            return None
+
+        self._local_cache.move_to_end(key)
+        return entry
+
+    async def _get_redis_cache(self):
+        """获取可用的Redis缓存服务，不可用时返回None"""
+        try:
+            cache_service = await get_cache_service()
+        except Exception:
+            return None
+        if cache_service and cache_service.redis:
+            return cache_service
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        lookups = self.stats['hits'] + self.stats['misses']
+        original = self.stats['original_bytes']
+        return {
+            **self.stats,
+            'hit_rate': self.stats['hits'] / lookups if lookups > 0 else 0,
+            'compression_ratio': self.stats['compressed_bytes'] / original if original > 0 else 0,
+            'local_entries': len(self._local_cache)
+        }
+
+
+# 全局缓存实例
+_report_cache: Optional[AnalysisReportCache] = None
+
+
+def get_report_cache() -> AnalysisReportCache:
+    """获取AI分析报告缓存实例（单例模式）"""
+    global _report_cache
+    if _report_cache is None:
+        _report_cache = AnalysisReportCache(
+            max_ttl=settings.PROVIDER_CACHE_FRESH_TTL,
+            min_ttl=settings.AI_REPORT_CACHE_MIN_TTL,
+            max_local_entries=settings.AI_REPORT_CACHE_LOCAL_MAX_ENTRIES
+        )
+    return _report_cache
@@ -0,0 +1,435 @@
+"""
+航线图索引服务
+从已搜索到的航班航段增量构建航线图，为隐藏城市搜索提供候选目的地（冷门航线才询问AI）：
+1. 机场代码编码为整数，有向边的起点、终点、出现次数、最低价格存储在紧凑数组中
+2. 航段边: 实际飞行的航段 A → B
+3. 中转边: 行程经过X中转最终到达Y，记为 X → Y（隐藏城市票的直接依据）
+4. 查询目的地D的候选: D出发的中转边和航段边，按出现频次和价格加权排序
+索引定期在线程池中持久化到磁盘，重启后自动加载：
+- 每个worker只写入上次保存后新增的观察（增量），在文件锁内与磁盘上的图合并，多个worker不会互相覆盖
+- 边价格只记录航线图币种的票价（Kiwi返回USD，与CNY票价不可比较）
+"""
+import asyncio
+import math
+import os
+import tempfile
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:
+    # Windows开发环境：单进程运行，不加文件锁
+    fcntl = None
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"numpy导入失败: {e}")
+    NUMPY_AVAILABLE = False
+    np = None
+
+from fastapi_app.config import settings
+from fastapi_app.services.flight_deduplicator import get_flight_deduplicator
+from fastapi_app.utils.price import extract_price
+
+
+# 默认候选权重: (出现频次, 价格)
+DEFAULT_WEIGHTS = (0.7, 0.3)
+
+# 边键: 起点编号 << _KEY_SHIFT | 终点编号
+_KEY_SHIFT = 20
+
+_INF = float('inf')
+
+
+class _EdgeSet:
+    """有向边集合：紧凑数组存储边属性，按起点维护邻接表"""
+
+    def __init__(self):
+        self.src = array('i')
+        self.dst = array('i')
+        self.count = array('I')
+        self.min_price = array('f')
+        # 边键 -> 边编号
+        self._index: Dict[int, int] = {}
+        # 起点编号 -> 边编号列表
+        self._adjacency: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.src)
+
+    def add(self, src: int, dst: int, price: float = _INF, count: int = 1):
+        key = (src << _KEY_SHIFT) | dst
+        edge = self._index.get(key)
+        if edge is None:
+            edge = len(self.src)
+            self._index[key] = edge
+            self._adjacency.setdefault(src, []).append(edge)
+            self.src.append(src)
+            self.dst.append(dst)
+            self.count.append(count)
+            self.min_price.append(price)
+            return
+
+        self.count[edge] += count
+        if price < self.min_price[edge]:
+            self.min_price[edge] = price
+
+    def edges(self) -> Iterable[Tuple[int, int, int, float]]:
+        """所有边: (起点编号, 终点编号, 次数, 最低价格)"""
+        return zip(self.src, self.dst, self.count, self.min_price)
+
+    def neighbors(self, src: int) -> List[Tuple[int, int, float]]:
+        """起点出发的所有边: [(终点编号, 次数, 最低价格)]"""
+        return [(self.dst[edge], self.count[edge], self.min_price[edge]) for edge in self._adjacency.get(src, ())]
+
+    def to_arrays(self, prefix: str) -> Dict[str, Any]:
+        return {
+            f"{prefix}_src": np.frombuffer(self.src, dtype=np.int32),
+            f"{prefix}_dst": np.frombuffer(self.dst, dtype=np.int32),
+            f"{prefix}_count": np.frombuffer(self.count, dtype=np.uint32),
+            f"{prefix}_min_price": np.frombuffer(self.min_price, dtype=np.float32)
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Any, prefix: str) -> "_EdgeSet":
+        edges = cls()
+        edges.src = array('i', arrays[f"{prefix}_src"].astype(np.int32).tobytes())
+        edges.dst = array('i', arrays[f"{prefix}_dst"].astype(np.int32).tobytes())
+        edges.count = array('I', arrays[f"{prefix}_count"].astype(np.uint32).tobytes())
+        edges.min_price = array('f', arrays[f"{prefix}_min_price"].astype(np.float32).tobytes())
+        for edge, (src, dst) in enumerate(zip(edges.src, edges.dst)):
+            edges._index[(src << _KEY_SHIFT) | dst] = edge
+            edges._adjacency.setdefault(src, []).append(edge)
+        return edges
+
+
+class RouteGraph:
+    """已观察航线的增量索引"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        save_every: int = 500,
+        max_seen_itineraries: int = 50000,
+        weights: Tuple[float, float] = DEFAULT_WEIGHTS,
+        currency: str = "CNY"
+    ):
+        self.path = path
+        self.save_every = save_every
+        self.max_seen_itineraries = max_seen_itineraries
+        self.weights = weights
+        self.currency = currency.upper()
+
+        self._codes: List[str] = []
+        self._code_index: Dict[str, int] = {}
+        self.legs = _EdgeSet()
+        self.connections = _EdgeSet()
+        # 上次保存后新增的观察（保存时与磁盘上的图合并）
+        self._delta_legs = _EdgeSet()
+        self._delta_connections = _EdgeSet()
+
+        # 最近记录过的行程（数据源缓存命中时同一行程会被重复看到，不重复计数）
+        self._seen: "OrderedDict[Any, None]" = OrderedDict()
+        self._unsaved = 0
+        self._save_task: Optional[asyncio.Task] = None
+
+        self.stats = {
+            'itineraries_observed': 0,
+            'itineraries_skipped': 0,
+            'queries': 0,
+            'cold_queries': 0,
+            'saves': 0,
+            'save_failures': 0,
+            'foreign_currency_prices': 0
+        }
+
+        if self.path:
+            self.load()
+        logger.info(f"RouteGraph初始化成功: {len(self._codes)}个机场, {len(self.legs)}条航段边, {len(self.connections)}条中转边")
+
+    def _encode(self, code: str) -> int:
+        index = self._code_index.get(code)
+        if index is None:
+            index = len(self._codes)
+            self._codes.append(code)
+            self._code_index[code] = index
+        return index
+
+    @staticmethod
+    def _airport_code(value: Any) -> Optional[str]:
+        if isinstance(value, dict):
+            value = value.get('code') or value.get('iata')
+        if not isinstance(value, str):
+            return None
+        code = value.strip().upper()
+        return code if len(code) == 3 and code.isalpha() else None
+
+    def extract_segments(self, flight: Dict[str, Any]) -> List[Tuple[str, str]]:
+        """
+        提取行程中的航段 [(出发机场, 到达机场)]
+
+        兼容Google/AI推荐的legs（departure_airport/arrival_airport）和Kiwi的route_segments（from/to）
+        """
+        segments = flight.get('legs') or flight.get('route_segments') or []
+        if not isinstance(segments, list):
+            return []
+
+        result = []
+        for segment in segments:
+            if not isinstance(segment, dict):
+                continue
+            origin = self._airport_code(segment.get('departure_airport') or segment.get('from'))
+            destination = self._airport_code(segment.get('arrival_airport') or segment.get('to'))
+            if origin and destination and origin != destination:
+                result.append((origin, destination))
+        return result
+
+    def observe(self, flights: Iterable[Any]) -> int:
+        """
+        记录一批航班的航段和中转关系
+
+        Returns:
+            新记录的行程数
+        """
+        deduplicator = get_flight_deduplicator()
+        observed = 0
+
+        for flight in flights or []:
+            if not isinstance(flight, dict):
+                continue
+            segments = self.extract_segments(flight)
+            if not segments:
+                continue
+
+            price = extract_price(flight, ('price', 'price_numeric', 'total_price'))
+            currency = str(flight.get('currency') or '').strip().upper()
+            if currency and currency != self.currency and price == price:
+                # 其他币种的票价不参与价格比较，只记录出现次数
+                self.stats['foreign_currency_prices'] += 1
+                price = float('nan')
+            seen_key = deduplicator.build_key(flight) or (tuple(segments), price)
+            if seen_key in self._seen:
+                self._seen.move_to_end(seen_key)
+                self.stats['itineraries_skipped'] += 1
+                continue
+            self._seen[seen_key] = None
+            while len(self._seen) > self.max_seen_itineraries:
+                self._seen.popitem(last=False)
+
+            encoded = [(self._encode(origin), self._encode(destination)) for origin, destination in segments]
+            for origin, destination in encoded:
+                self.legs.add(origin, destination)
+                self._delta_legs.add(origin, destination)
+
+            # 中转点 → 最终目的地（行程价格即"经过中转点飞往最终目的地"的票价）
+            final_destination = encoded[-1][1]
+            edge_price = price if price == price else _INF
+            for _, via in encoded[:-1]:
+                if via != final_destination:
+                    self.connections.add(via, final_destination, edge_price)
+                    self._delta_connections.add(via, final_destination, edge_price)
+            observed += 1
+
+        if observed:
+            self.stats['itineraries_observed'] += observed
+            self._unsaved += observed
+            if self.path and self._unsaved >= self.save_every:
+                self._schedule_save()
+        return observed
+
+    def _schedule_save(self):
+        """在线程池中保存（不阻塞事件循环）；没有事件循环时直接保存"""
+        if self._save_task is not None and not self._save_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+        self._save_task = loop.create_task(self.save_async())
+
+    def candidates(self, destination_code: str, exclude: Iterable[str] = (), limit: int = 10) -> List[str]:
+        """
+        经过destination_code中转可以到达的候选最终目的地（按频次和价格加权排序）
+
+        Returns:
+            机场代码列表；航线图中没有该机场时返回空列表
+        """
+        self.stats['queries'] += 1
+        via = self._code_index.get(destination_code.upper())
+        if via is None:
+            self.stats['cold_queries'] += 1
+            return []
+
+        excluded = {self._code_index[code.upper()] for code in exclude if code.upper() in self._code_index}
+        excluded.add(via)
+
+        # 终点 -> [中转次数, 航段次数, 最低价格]
+        observed: Dict[int, List[float]] = {}
+        for final_destination, count, price in self.connections.neighbors(via):
+            observed.setdefault(final_destination, [0, 0, _INF])
+            observed[final_destination][0] = count
+            observed[final_destination][2] = price
+        for next_airport, count, _ in self.legs.neighbors(via):
+            observed.setdefault(next_airport, [0, 0, _INF])[1] = count
+
+        for index in excluded:
+            observed.pop(index, None)
+        if not observed:
+            self.stats['cold_queries'] += 1
+            return []
+
+        # 中转边直接证明存在经停行程，权重高于单独的航段边
+        frequencies = {index: math.log1p(2 * conn + leg) for index, (conn, leg, _) in observed.items()}
+        max_frequency = max(frequencies.values()) or 1.0
+        prices = [price for _, _, price in observed.values() if price < _INF]
+        min_price = min(prices) if prices else 0.0
+        price_range = (max(prices) - min_price) if prices else 0.0
+
+        frequency_weight, price_weight = self.weights
+        scores = []
+        for index, (_, _, price) in observed.items():
+            if price < _INF:
+                price_score = 1.0 - (price - min_price) / price_range if price_range > 0 else 1.0
+            else:
+                price_score = 0.0
+            score = frequency_weight * frequencies[index] / max_frequency + price_weight * price_score
+            scores.append((score, self._codes[index]))
+
+        scores.sort(key=lambda item: (-item[0], item[1]))
+        return [code for _, code in scores[:limit]]
+
+    def _take_delta(self) -> Optional[Tuple[List[str], _EdgeSet, _EdgeSet, int]]:
+        """取出待保存的增量（在事件循环线程中调用，之后的观察写入新的增量）"""
+        if not self.path or not NUMPY_AVAILABLE or not self._unsaved:
+            return None
+        delta = (list(self._codes), self._delta_legs, self._delta_connections, self._unsaved)
+        self._delta_legs = _EdgeSet()
+        self._delta_connections = _EdgeSet()
+        self._unsaved = 0
+        return delta
+
+    def _restore_delta(self, delta: Tuple[List[str], _EdgeSet, _EdgeSet, int]):
+        """保存失败时把增量放回，下次保存重试"""
+        _, legs, connections, unsaved = delta
+        for src, dst, count, price in legs.edges():
+            self._delta_legs.add(src, dst, price, count)
+        for src, dst, count, price in connections.edges():
+            self._delta_connections.add(src, dst, price, count)
+        self._unsaved += unsaved
+
+    def save(self) -> bool:
+        """同步保存增量（应用关闭时调用）"""
+        delta = self._take_delta()
+        if delta is None:
+            return False
+        saved = self._merge_into_file(delta)
+        if not saved:
+            self._restore_delta(delta)
+        return saved
+
+    async def save_async(self) -> bool:
+        """在线程池中保存增量，压缩和写文件不阻塞事件循环"""
+        delta = self._take_delta()
+        if delta is None:
+            return False
+        saved = await asyncio.get_running_loop().run_in_executor(None, self._merge_into_file, delta)
+        if not saved:
+            self._restore_delta(delta)
+        return saved
+
+    def _merge_into_file(self, delta: Tuple[List[str], _EdgeSet, _EdgeSet, int]) -> bool:
+        """
+        在文件锁内读取磁盘上的图（其他worker保存的观察），加上本worker的增量后写回
+
+        先写临时文件再替换；只读写按机场代码转换后的数据，不访问内存中的图
+        """
+        codes, delta_legs, delta_connections, _ = delta
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            with open(f"{self.path}.lock", 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+
+                merged = RouteGraph(weights=self.weights, currency=self.currency)
+                merged.path = self.path
+                merged.load()
+                merged.path = None
+                for target, source in ((merged.legs, delta_legs), (merged.connections, delta_connections)):
+                    for src, dst, count, price in source.edges():
+                        target.add(merged._encode(codes[src]), merged._encode(codes[dst]), price, count)
+
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez_compressed(
+                        f,
+                        codes=np.array(merged._codes, dtype='U3'),
+                        **merged.legs.to_arrays('leg'),
+                        **merged.connections.to_arrays('conn')
+                    )
+                os.replace(tmp_path, self.path)
+
+            self.stats['saves'] += 1
+            logger.info(f"💾 [航线图] 已保存: {len(merged._codes)}个机场, {len(merged.connections)}条中转边")
+            return True
+        except Exception as e:
+            self.stats['save_failures'] += 1
+            logger.warning(f"⚠️ [航线图] 保存失败: {e}")
+            return False
+
+    def load(self) -> bool:
+        """从磁盘加载（文件不存在或损坏时从空图开始）"""
+        if not self.path or not NUMPY_AVAILABLE or not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path) as arrays:
+                codes = [str(code) for code in arrays['codes']]
+                legs = _EdgeSet.from_arrays(arrays, 'leg')
+                connections = _EdgeSet.from_arrays(arrays, 'conn')
+        except Exception as e:
+            logger.warning(f"⚠️ [航线图] 加载失败，从空图开始: {e}")
+            return False
+
+        self._codes = codes
+        self._code_index = {code: index for index, code in enumerate(codes)}
+        self.legs = legs
+        self.connections = connections
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取航线图统计信息"""
+        return {
+            **self.stats,
+            'airports': len(self._codes),
+            'leg_edges': len(self.legs),
+            'connection_edges': len(self.connections),
+            'unsaved_itineraries': self._unsaved
+        }
+
+
+# 全局航线图实例
+_route_graph: Optional[RouteGraph] = None
+
+
+def get_route_graph() -> RouteGraph:
+    """获取航线图实例（单例模式）"""
+    global _route_graph
+    if _route_graph is None:
+        _route_graph = RouteGraph(
+            path=settings.ROUTE_GRAPH_PATH or None,
+            save_every=settings.ROUTE_GRAPH_SAVE_EVERY,
+            currency=settings.ROUTE_GRAPH_CURRENCY
+        )
+    return _route_graph
+
+
+def save_route_graph():
+    """保存航线图（应用关闭时调用）"""
+    if _route_graph is not None and _route_graph._unsaved:
+        _route_graph.save()
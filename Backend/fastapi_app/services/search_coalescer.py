@@ -0,0 +1,316 @@
+"""
+搜索请求合并服务（Single-flight）
+相同参数的并发AI增强搜索只执行一次，其余请求等待同一个进行中的结果：
+1. 进程内：同一个worker中的并发请求共享同一个asyncio.Task
+2. 跨worker：通过Redis租约（SET NX）选出唯一执行者，其他worker轮询交接结果
+3. 数据源阶段结果（分阶段结果）同样转发给所有等待者：进程内直接回调，跨worker写入Redis后由等待方轮询
+"""
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+from fastapi_app.config import settings
+from fastapi_app.services.cache_service import get_cache_service
+from fastapi_app.services.provider_cache import to_plain_data
+
+
+# 数据收集阶段完成回调: (阶段, 该阶段原始航班列表)
+StageCallback = Callable[[str, list], Awaitable[None]]
+
+
+class SearchCoalescer:
+    """并发搜索请求合并器"""
+
+    def __init__(
+        self,
+        namespace: str = "ai_search",
+        lease_ttl: int = 600,
+        result_ttl: int = 60,
+        poll_interval: float = 1.0
+    ):
+        self.namespace = namespace
+        self.lease_ttl = lease_ttl
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+
+        # 进行中的搜索: key -> asyncio.Task
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # 正在等待的请求数: key -> waiter数量
+        self._waiters: Dict[str, int] = {}
+        # 进行中搜索已完成的阶段: key -> [(阶段名, 航班列表)]，后加入的等待者先补发
+        self._stage_events: Dict[str, List[Tuple[str, list]]] = {}
+        # 阶段结果订阅者: key -> [回调]
+        self._stage_subscribers: Dict[str, List[StageCallback]] = {}
+
+        self.stats = {
+            'leader_runs': 0,          # 实际执行搜索的次数
+            'local_waiters': 0,        # 进程内合并的请求累计数
+            'remote_waiters': 0,       # 等待其他worker结果的累计次数
+            'remote_handoffs': 0,      # 成功从其他worker获取结果的次数
+            'remote_fallbacks': 0,     # 等待其他worker失败后自行执行的次数
+            'redis_errors': 0,         # 获取租约时Redis出错、退化为进程内合并的次数
+            'stage_events': 0,         # 转发的阶段结果数（含跨worker收到的）
+            'remote_stage_events': 0,  # 从其他worker收到的阶段结果数
+            'max_concurrent_waiters': 0
+        }
+        logger.info(f"SearchCoalescer初始化成功: namespace={namespace}")
+
+    @staticmethod
+    def build_key(params: Dict[str, Any]) -> str:
+        """根据规范化后的搜索参数生成合并键"""
+        normalized = {}
+        for name, value in params.items():
+            if isinstance(value, str):
+                value = value.strip()
+                if name.endswith('_code') or name in ('seat_class', 'max_stops', 'sort_by', 'currency'):
+                    value = value.upper()
+                elif name == 'language':
+                    value = value.lower()
+            normalized[name] = value
+
+        params_str = json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(params_str.encode('utf-8')).hexdigest()
+
+    async def run(
+        self,
+        params: Dict[str, Any],
+        factory: Callable[[StageCallback], Awaitable[Any]],
+        on_stage: Optional[StageCallback] = None
+    ) -> Any:
+        """
+        执行或加入一个搜索
+
+        Args:
+            params: 搜索参数（用于生成合并键）
+            factory: 实际执行搜索的协程工厂，参数为阶段结果发布函数
+            on_stage: 可选，阶段结果回调；合并到进行中搜索的请求先收到已完成的阶段，之后与执行者同时收到
+
+        Returns:
+            搜索结果（所有合并的请求得到同一个结果）
+        """
+        key = self.build_key(params)
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._waiters[key] = self._waiters.get(key, 0) + 1
+            self.stats['local_waiters'] += 1
+            self.stats['max_concurrent_waiters'] = max(
+                self.stats['max_concurrent_waiters'], self._waiters[key]
+            )
+            logger.info(f"🔗 [请求合并] 加入进行中的搜索 {key[:12]}，当前等待数: {self._waiters[key]}")
+            try:
+                if on_stage is not None:
+                    await self._subscribe(key, on_stage)
+                # shield: 单个调用方取消时不影响共享的搜索任务
+                return await asyncio.shield(task)
+            finally:
+                self._waiters[key] = max(0, self._waiters.get(key, 1) - 1)
+                self._unsubscribe(key, on_stage)
+
+        self._stage_events[key] = []
+        self._stage_subscribers[key] = [on_stage] if on_stage is not None else []
+
+        # 作为执行者启动独立任务，调用方断开连接不会中断其他等待者
+        task = asyncio.create_task(self._execute(key, factory))
+        self._inflight[key] = task
+        self._waiters[key] = 0
+        task.add_done_callback(lambda t, k=key: self._on_task_done(k, t))
+
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._unsubscribe(key, on_stage)
+
+    async def _subscribe(self, key: str, on_stage: StageCallback):
+        """订阅阶段结果，并补发已完成的阶段"""
+        # 先登记再补发快照（两步之间没有await，不会漏掉或重复阶段）
+        completed = list(self._stage_events.get(key, []))
+        self._stage_subscribers.setdefault(key, []).append(on_stage)
+        for stage, flights in completed:
+            await self._invoke_stage_callback(on_stage, stage, flights)
+
+    def _unsubscribe(self, key: str, on_stage: Optional[StageCallback]):
+        subscribers = self._stage_subscribers.get(key)
+        if on_stage is not None and subscribers and on_stage in subscribers:
+            subscribers.remove(on_stage)
+
+    async def _dispatch_stage(self, key: str, stage: str, flights: list) -> bool:
+        """
+        记录阶段结果并转发给所有订阅者
+
+        Returns:
+            是否为新阶段（执行者中途切换时同一阶段只转发一次）
+        """
+        events = self._stage_events.setdefault(key, [])
+        if any(existing == stage for existing, _ in events):
+            return False
+        events.append((stage, flights))
+        self.stats['stage_events'] += 1
+
+        subscribers = list(self._stage_subscribers.get(key, []))
+        await asyncio.gather(*(
+            self._invoke_stage_callback(callback, stage, flights) for callback in subscribers
+        ))
+        return True
+
+    @staticmethod
+    async def _invoke_stage_callback(callback: StageCallback, stage: str, flights: list):
+        """阶段回调失败不影响搜索和其他等待者"""
+        try:
+            await callback(stage, flights)
+        except Exception as e:
+            logger.warning(f"⚠️ [请求合并] {stage}阶段结果回调失败: {e}")
+
+    def _on_task_done(self, key: str, task: asyncio.Task):
+        """任务结束后清理登记信息"""
+        if self._inflight.get(key) is task:
+            self._inflight.pop(key, None)
+            self._waiters.pop(key, None)
+            self._stage_events.pop(key, None)
+            self._stage_subscribers.pop(key, None)
+        # 读取异常，避免所有等待者都已取消时出现"exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    async def _execute(self, key: str, factory: Callable[[StageCallback], Awaitable[Any]]) -> Any:
+        """在Redis租约保护下执行搜索；Redis不可用时退化为进程内合并"""
+
+        async def publish_local(stage: str, flights: list):
+            await self._dispatch_stage(key, stage, flights)
+
+        try:
+            cache_service = await get_cache_service()
+        except Exception as e:
+            logger.warning(f"⚠️ [请求合并] 缓存服务不可用，仅进程内合并: {e}")
+            cache_service = None
+
+        if not cache_service or not cache_service.redis:
+            self.stats['leader_runs'] += 1
+            return await factory(publish_local)
+
+        lease_key = f"{self.namespace}:lease:{key}"
+        result_key = f"{self.namespace}:result:{key}"
+        stages_key = f"{self.namespace}:stages:{key}"
+        lease_token = str(uuid.uuid4())
+
+        acquired = await cache_service.set_if_not_exists(lease_key, lease_token, expire=self.lease_ttl)
+        if acquired is None:
+            return await self._execute_local_on_redis_error(key, factory, publish_local)
+
+        if not acquired:
+            self.stats['remote_waiters'] += 1
+            logger.info(f"🔗 [请求合并] 其他worker正在执行搜索 {key[:12]}，等待结果交接")
+            result = await self._wait_for_remote_result(cache_service, key, lease_key, result_key, stages_key)
+            if result is not None:
+                self.stats['remote_handoffs'] += 1
+                return result
+
+            # 执行者异常退出或超时，自行执行
+            self.stats['remote_fallbacks'] += 1
+            logger.warning(f"⚠️ [请求合并] 未等到其他worker的结果 {key[:12]}，自行执行搜索")
+            acquired = await cache_service.set_if_not_exists(lease_key, lease_token, expire=self.lease_ttl)
+            if acquired is None:
+                return await self._execute_local_on_redis_error(key, factory, publish_local)
+
+        # 阶段结果同时写入Redis，供其他worker上的等待者轮询
+        published: List[list] = []
+
+        async def publish(stage: str, flights: list):
+            if not await self._dispatch_stage(key, stage, flights):
+                return
+            published.append([stage, to_plain_data(flights or [])])
+            try:
+                await cache_service.set(stages_key, {'events': published}, expire=self.lease_ttl)
+            except Exception as e:
+                logger.warning(f"⚠️ [请求合并] 写入阶段结果失败 {key[:12]}: {e}")
+
+        self.stats['leader_runs'] += 1
+        try:
+            # 清除上一次同参数搜索残留的阶段结果
+            await cache_service.delete(stages_key)
+            result = await factory(publish)
+
+            # 只交接成功的结果，失败结果不应被其他worker复用
+            if isinstance(result, dict) and result.get('success'):
+                await cache_service.set(result_key, result, expire=self.result_ttl)
+
+            return result
+        finally:
+            if acquired:
+                current_token = await cache_service.get(lease_key, str)
+                if current_token == lease_token:
+                    await cache_service.delete(lease_key)
+
+    async def _execute_local_on_redis_error(
+        self,
+        key: str,
+        factory: Callable[[StageCallback], Awaitable[Any]],
+        publish_local: StageCallback
+    ) -> Any:
+        """获取租约时Redis出错：不等待、不写入Redis，只做进程内合并"""
+        self.stats['redis_errors'] += 1
+        self.stats['leader_runs'] += 1
+        logger.warning(f"⚠️ [请求合并] 获取租约时Redis出错 {key[:12]}，仅进程内合并")
+        return await factory(publish_local)
+
+    async def _wait_for_remote_result(
+        self,
+        cache_service,
+        key: str,
+        lease_key: str,
+        result_key: str,
+        stages_key: str
+    ) -> Optional[Any]:
+        """轮询等待持有租约的worker写入结果，期间转发其写入的阶段结果"""
+        deadline = time.monotonic() + self.lease_ttl
+        delivered = 0
+
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+
+            stages = await cache_service.get(stages_key, dict)
+            events = (stages or {}).get('events') or []
+            for stage, flights in events[delivered:]:
+                if await self._dispatch_stage(key, stage, flights):
+                    self.stats['remote_stage_events'] += 1
+            delivered = max(delivered, len(events))
+
+            result = await cache_service.get(result_key, dict)
+            if result is not None:
+                return result
+
+            # 租约已释放但没有结果：执行者失败
+            if not await cache_service.exists(lease_key):
+                result = await cache_service.get(result_key, dict)
+                return result
+
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取合并统计信息"""
+        return {
+            **self.stats,
+            'inflight_searches': len(self._inflight),
+            'current_waiters': sum(self._waiters.values())
+        }
+
+
+# 全局合并器实例
+_search_coalescer: Optional[SearchCoalescer] = None
+
+
+def get_search_coalescer() -> SearchCoalescer:
+    """获取AI搜索合并器实例（单例模式）"""
+    global _search_coalescer
+    if _search_coalescer is None:
+        _search_coalescer = SearchCoalescer(
+            namespace="ai_search",
+            lease_ttl=settings.AI_SEARCH_COALESCE_LEASE_TTL,
+            result_ttl=settings.AI_SEARCH_COALESCE_RESULT_TTL,
+            poll_interval=settings.AI_SEARCH_COALESCE_POLL_INTERVAL
+        )
+    return _search_coalescer
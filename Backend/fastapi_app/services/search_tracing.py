@@ -0,0 +1,277 @@
+"""
+AI增强搜索分阶段耗时追踪
+每次实际执行的搜索创建一条trace，各阶段记录为span（开始偏移、耗时、数据量、结果数）：
+1. 当前trace通过contextvars传递，asyncio.gather/create_task创建的子任务自动继承
+2. 不在trace中调用时span为空操作，灵活日期、批量搜索等复用同一段代码不受影响
+3. 最近的trace保存在内存中，并按阶段保留最近的耗时样本，用于定位p95变慢的阶段
+"""
+import asyncio
+import contextvars
+import math
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+from loguru import logger
+
+from fastapi_app.config import settings
+
+
+# 当前协程所属的trace（未追踪时为None）
+_current_trace: contextvars.ContextVar[Optional["SearchTrace"]] = contextvars.ContextVar(
+    'search_trace', default=None
+)
+
+
+class Span:
+    """单个阶段的耗时记录"""
+
+    enabled = True
+
+    def __init__(self, name: str, start_offset: float, attributes: Dict[str, Any]):
+        self.name = name
+        self.start_offset = start_offset
+        self.duration = 0.0
+        self.status = 'ok'
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        """补充数据量、结果数等属性"""
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'start_ms': round(self.start_offset * 1000, 1),
+            'duration_ms': round(self.duration * 1000, 1),
+            'status': self.status,
+            'attributes': self.attributes
+        }
+
+
+class _NoopSpan:
+    """未追踪时返回的空span"""
+
+    enabled = False
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class SearchTrace:
+    """一次搜索的全部span"""
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.started_at = datetime.now().isoformat()
+        self.status = 'running'
+        self.duration: Optional[float] = None
+        self.spans: List[Span] = []
+        self._start = time.perf_counter()
+
+    def offset(self, moment: float) -> float:
+        """perf_counter时刻 → 相对trace开始的秒数"""
+        return max(0.0, moment - self._start)
+
+    def add_span(self, span: Span):
+        self.spans.append(span)
+
+    def finish(self, status: str):
+        self.status = status
+        self.duration = time.perf_counter() - self._start
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'status': self.status,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration * 1000, 1) if self.duration is not None else None,
+            'span_count': len(self.spans),
+            'attributes': self.attributes
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **self.summary(),
+            'spans': [span.to_dict() for span in sorted(self.spans, key=lambda s: s.start_offset)]
+        }
+
+
+class _SpanContext:
+    """with trace_span(...) as span: 记录代码块耗时，异常时标记状态"""
+
+    def __init__(self, trace: Optional[SearchTrace], name: str, attributes: Dict[str, Any]):
+        self._trace = trace
+        self._name = name
+        self._attributes = attributes
+        self._span: Optional[Span] = None
+        self._start = 0.0
+
+    def __enter__(self):
+        if self._trace is None:
+            return _NOOP_SPAN
+        self._start = time.perf_counter()
+        self._span = Span(self._name, self._trace.offset(self._start), self._attributes)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._span is None:
+            return False
+        self._span.duration = time.perf_counter() - self._start
+        if exc_type is not None:
+            if issubclass(exc_type, asyncio.CancelledError):
+                self._span.status = 'cancelled'
+            else:
+                self._span.status = 'error'
+                self._span.attributes['error'] = exc_type.__name__
+        self._trace.add_span(self._span)
+        return False
+
+
+def start_trace(name: str, **attributes) -> Optional[SearchTrace]:
+    """为当前协程（及其创建的子任务）开始一条trace；未启用追踪时返回None"""
+    if not settings.SEARCH_TRACE_ENABLED:
+        return None
+    trace = SearchTrace(name, attributes)
+    _current_trace.set(trace)
+    return trace
+
+
+def finish_trace(trace: Optional[SearchTrace], status: str = 'ok'):
+    """结束trace并保存到追踪记录"""
+    if trace is None:
+        return
+    _current_trace.set(None)
+    get_search_tracer().finish(trace, status)
+
+
+def current_trace() -> Optional[SearchTrace]:
+    return _current_trace.get()
+
+
+def trace_span(name: str, **attributes) -> _SpanContext:
+    """记录一个阶段（当前没有trace时为空操作）"""
+    return _SpanContext(_current_trace.get(), name, attributes)
+
+
+def record_span(name: str, duration: float, start: float, status: str = 'ok', **attributes):
+    """
+    记录已经测量好的阶段（如AI请求的排队、首字节耗时）
+
+    Args:
+        duration: 耗时（秒）
+        start: 阶段开始时的time.perf_counter()
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    span = Span(name, trace.offset(start), attributes)
+    span.duration = max(0.0, duration)
+    span.status = status
+    trace.add_span(span)
+
+
+def _percentile(ordered: List[float], percent: float) -> float:
+    """最近秩法百分位"""
+    index = min(len(ordered) - 1, max(0, math.ceil(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class SearchTracer:
+    """最近的搜索trace和各阶段耗时样本"""
+
+    def __init__(self, history: int = 200, stage_samples: int = 1000):
+        self.history = history
+        self.stage_samples = stage_samples
+        self._traces: "OrderedDict[str, SearchTrace]" = OrderedDict()
+        self._samples: Dict[str, Deque[float]] = {}
+        self.stats = {
+            'traces_finished': 0,
+            'traces_failed': 0,
+            'spans_recorded': 0
+        }
+        logger.info(f"SearchTracer初始化成功: 保留{history}条trace, 每阶段{stage_samples}个样本")
+
+    def _add_sample(self, name: str, duration: float):
+        samples = self._samples.get(name)
+        if samples is None:
+            samples = self._samples[name] = deque(maxlen=self.stage_samples)
+        samples.append(duration)
+
+    def finish(self, trace: SearchTrace, status: str = 'ok'):
+        trace.finish(status)
+        self._traces[trace.trace_id] = trace
+        while len(self._traces) > self.history:
+            self._traces.popitem(last=False)
+
+        self.stats['traces_finished'] += 1
+        if status != 'ok':
+            self.stats['traces_failed'] += 1
+        self.stats['spans_recorded'] += len(trace.spans)
+
+        self._add_sample(trace.name, trace.duration)
+        for span in trace.spans:
+            if span.status == 'ok':
+                self._add_sample(span.name, span.duration)
+
+        if trace.spans:
+            slowest = max(trace.spans, key=lambda s: s.duration)
+            logger.info(
+                f"📊 [搜索追踪] {trace.trace_id[:12]} 总耗时={trace.duration:.2f}秒, "
+                f"{len(trace.spans)}个阶段, 最慢={slowest.name}({slowest.duration:.2f}秒)"
+            )
+
+    def get_trace(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        trace = self._traces.get(trace_id)
+        return trace.to_dict() if trace else None
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """最近完成的trace摘要（新的在前）"""
+        traces = list(self._traces.values())[-limit:]
+        return [trace.summary() for trace in reversed(traces)]
+
+    def get_stage_stats(self) -> Dict[str, Dict[str, Any]]:
+        """各阶段耗时分布（按p95降序）"""
+        stages = {}
+        for name, samples in self._samples.items():
+            if not samples:
+                continue
+            ordered = sorted(samples)
+            stages[name] = {
+                'samples': len(ordered),
+                'avg_ms': round(sum(ordered) / len(ordered) * 1000, 1),
+                'p50_ms': round(_percentile(ordered, 50) * 1000, 1),
+                'p95_ms': round(_percentile(ordered, 95) * 1000, 1),
+                'p99_ms': round(_percentile(ordered, 99) * 1000, 1),
+                'max_ms': round(ordered[-1] * 1000, 1)
+            }
+        return dict(sorted(stages.items(), key=lambda item: -item[1]['p95_ms']))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'traces_kept': len(self._traces),
+            'stages': len(self._samples)
+        }
+
+
+# 全局追踪实例
+_search_tracer: Optional[SearchTracer] = None
+
+
+def get_search_tracer() -> SearchTracer:
+    """获取搜索追踪实例（单例模式）"""
+    global _search_tracer
+    if _search_tracer is None:
+        _search_tracer = SearchTracer(
+            history=settings.SEARCH_TRACE_HISTORY,
+            stage_samples=settings.SEARCH_TRACE_STAGE_SAMPLES
+        )
+    return _search_tracer
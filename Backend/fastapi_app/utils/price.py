@@ -0,0 +1,131 @@
+"""
+航班价格统一解析
+Google Flights对象/字典、Kiwi字典、Trip.com字典的价格字段各不相同，
+这里统一提取为浮点数列表（缺失价格为NaN），价格过滤、排序和最低价共用同一次解析结果
+"""
+import re
+from typing import Any, Iterable, List, Optional, Sequence
+
+
+# 默认按顺序探测的价格字段（Google/Kiwi/AI推荐/Trip.com都有price，放在最前；Trip.com中文字段、其他数据源字段）
+PRICE_FIELDS = ('price', '价格', 'total_price', 'price_numeric', 'Price', 'amount', 'cost')
+
+# 字符串价格中的第一个数字（如 "¥1,234.5" → 1234.5）
+_PRICE_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+
+_NAN = float('nan')
+_INF = float('inf')
+_NUMERIC_TYPES = (int, float)
+
+
+def parse_price(value: Any) -> float:
+    """将单个价格值解析为浮点数，无法解析时返回NaN"""
+    if value is None or isinstance(value, bool):
+        return _NAN
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = _PRICE_PATTERN.search(value.replace(',', ''))
+        return float(match.group()) if match else _NAN
+    if isinstance(value, dict):
+        # smart-flights格式: {'amount': 1234, 'currency': 'CNY'}
+        return parse_price(value.get('amount'))
+    return _NAN
+
+
+def extract_price(flight: Any, fields: Sequence[str] = PRICE_FIELDS) -> float:
+    """
+    按字段顺序提取航班价格（字典键或对象属性），返回第一个可解析且非0的价格
+
+    Returns:
+        价格；没有可用价格时返回NaN
+    """
+    is_dict = isinstance(flight, dict)
+    for field in fields:
+        value = flight.get(field) if is_dict else getattr(flight, field, None)
+        if value is None:
+            continue
+        # 数值价格走快速路径，其余类型交给parse_price
+        price = value if type(value) in _NUMERIC_TYPES else parse_price(value)
+        if price and price == price:
+            return float(price)
+    return _NAN
+
+
+def extract_prices(flights: Iterable[Any], fields: Sequence[str] = PRICE_FIELDS) -> List[float]:
+    """
+    批量提取价格（单次遍历）
+
+    第一个字段是有效价格时直接解析（各数据源的常见情况），其余情况再按字段顺序探测
+
+    Returns:
+        浮点数列表（缺失价格为NaN）
+    """
+    fields = tuple(fields)
+    first = fields[0]
+    search = _PRICE_PATTERN.search
+    prices = []
+    append = prices.append
+    for flight in flights:
+        value = flight.get(first) if type(flight) is dict else getattr(flight, first, None)
+        value_type = type(value)
+        if value_type is float or value_type is int:
+            price = value
+        elif value_type is str:
+            match = search(value.replace(',', ''))
+            price = float(match.group()) if match else 0
+        else:
+            price = 0
+        if price and price == price:
+            append(float(price))
+        else:
+            # 第一个字段缺失或无效，按字段顺序继续探测
+            append(extract_price(flight, fields))
+    return prices
+
+
+def filter_by_price(
+    flights: List[Any],
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    prices: Optional[Sequence[float]] = None,
+    fields: Sequence[str] = PRICE_FIELDS
+) -> List[Any]:
+    """
+    按价格区间过滤航班（min_price不含、max_price包含；缺失价格的航班被过滤掉）
+
+    Args:
+        prices: 已提取的价格列表，未提供时自动提取
+    """
+    if not flights:
+        return []
+    if prices is None:
+        prices = extract_prices(flights, fields)
+
+    # 未指定的边界取无穷；NaN与任何数比较都为False，同时排除缺失价格
+    lower = -_INF if min_price is None else min_price
+    upper = _INF if max_price is None else max_price
+    return [flight for flight, price in zip(flights, prices) if lower < price <= upper]
+
+
+def sort_by_price(
+    flights: List[Any],
+    prices: Optional[Sequence[float]] = None,
+    fields: Sequence[str] = PRICE_FIELDS
+) -> List[Any]:
+    """按价格升序排序（稳定排序，缺失价格的航班排在最后）"""
+    if not flights:
+        return []
+    if prices is None:
+        prices = extract_prices(flights, fields)
+
+    # 缺失价格映射为 (True, 0.0)，每个元素只判断一次NaN
+    keys = [(False, price) if price == price else (True, 0.0) for price in prices]
+    order = sorted(range(len(flights)), key=keys.__getitem__)
+    return [flights[index] for index in order]
+
+
+def min_price(prices: Iterable[float], default: float = 0) -> float:
+    """最低价格（忽略缺失价格）"""
+    valid = [price for price in prices if price == price]
+    return min(valid) if valid else default
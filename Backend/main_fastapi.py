@@ -63,6 +63,13 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.warning(f"⚠️ 缓存服务初始化失败，将不使用缓存: {e}")
 
+        # 初始化AI网关连接池
+        try:
+            from fastapi_app.services.ai_gateway_client import start_ai_gateway_client
+            await start_ai_gateway_client()
+        except Exception as e:
+            logger.warning(f"⚠️ AI网关连接池初始化失败: {e}")
+
         # 自动启动监控系统
         try:
             from fastapi_app.services.monitor_service import get_monitor_service
@@ -96,6 +103,29 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.warning(f"⚠️ 停止监控系统失败: {e}")
 
+        # 关闭AI网关连接池
+        try:
+            from fastapi_app.services.ai_gateway_client import close_ai_gateway_client
+            await close_ai_gateway_client()
+            logger.info("✅ AI网关连接池已关闭")
+        except Exception as e:
+            logger.warning(f"⚠️ AI网关连接池关闭失败: {e}")
+
+        # 保存本地航线图
+        try:
+            from fastapi_app.services.route_graph import save_route_graph
+            save_route_graph()
+        except Exception as e:
+            logger.warning(f"⚠️ 航线图保存失败: {e}")
+
+        # 关闭阻塞调用线程池
+        try:
+            from fastapi_app.services.executor_pools import shutdown_executor_pools
+            shutdown_executor_pools()
+            logger.info("✅ 线程池已关闭")
+        except Exception as e:
+            logger.warning(f"⚠️ 线程池关闭失败: {e}")
+
         # 关闭缓存服务
         try:
             from fastapi_app.services.cache_service import close_cache_service